@@ -1,23 +1,52 @@
 ﻿import os
 import re
+import importlib.util
+import functools
+import threading
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import sqlite3  as sql
 import pandas as pd
 import time
 from contextlib import closing
 import json
+import shutil
+import uuid
 from io import BytesIO
-from collections import defaultdict
+from collections import Counter, OrderedDict, defaultdict
+
+from organigrama import bd, busqueda, diario, fuente, ingesta, pesos, traza
+from organigrama.arbol import calcular_posiciones, construir_arbol_organizacional, obtener_id_nodo
+from organigrama.bd import (
+    bd_abierta,
+    cerrar_conexion_bd,
+    conectar_bd,
+    es_asignacion_ciclica,
+    marcar_raices,
+    obtener_revision_bd,
+    registrar_cambio_bd,
+)
+from organigrama.consultas import consulta
+from organigrama.diario import (
+    actualizar_con_diario,
+    aplicar_inverso_diario,
+    eliminar_con_diario,
+    insertar_con_diario,
+    nuevo_grupo_diario,
+)
+from organigrama.exportar import generar_df_hoja3
+from organigrama.pesos import calcular_rebalanceo_pesos
+from organigrama.texto import (
+    buscar_en_indice,
+    construir_indice_nombres,
+    normalizar_nombre,
+    normalizar_texto,
+)
+from organigrama.traza import tramo, trazado
+from organigrama.validacion import validar_organizacion
 
 st.set_page_config(page_title="Calibración de KPIs", layout="wide", page_icon="⚙️")
 
-try:
-    from langchain_openai import ChatOpenAI
-    from langchain.schema import SystemMessage, HumanMessage
-except Exception:
-    ChatOpenAI = None
-    SystemMessage = HumanMessage = None
-
 st.title("⚙️ Calibración de KPIs")
 st.markdown(
     """
@@ -33,15 +62,27 @@ st.markdown(
 )
 
 # Crear DB
-DB_NAME = "organigrama_kpis.db"
+DB_NAME = bd.DB_NAME
+SNAPSHOT_DIR = "snapshots"
+MAX_SNAPSHOTS = 10
+
+# Cada sesión trabaja sobre su propia BD (las conexiones abiertas se comparten en el LRU de organigrama.bd)
+WORKSPACE_DIR = "workspaces"
+RETENCION_ESPACIOS_S = 7 * 24 * 3600
+
+# Datos derivados de la BD compartidos por el proceso: {ruta: {(consulta, args): (revision, valor)}} en un LRU
+MAX_BD_EN_CACHE = bd.MAX_CONEXIONES_ABIERTAS
+_cache_datos = OrderedDict()
+_cache_lock = threading.Lock()
+_estadisticas_cache = defaultdict(Counter)
+
+# Trazas de rendimiento (organigrama.traza): solo se toman con ?perf=1 en la URL y se guardan en la sesión
+MAX_TRAZAS_SESION = 20
+
+# Peso de cada evidencia al inferir niveles jerárquicos desde la cadena de mando
+PESOS_INFERENCIA_NIVEL = {"hermanos": 3.0, "ancestro": 2.0, "descendientes": 2.0, "profundidad": 1.0}
 
 OPENAI_API_KEY = st.secrets.get("OPENAI_API_KEY")
-llm = None
-if OPENAI_API_KEY and ChatOpenAI is not None:
-    try:
-        llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.15, openai_api_key=OPENAI_API_KEY)
-    except Exception:
-        llm = None
 
 MARIA_SYSTEM_PROMPT = (
     "Eres MARIA, consultora senior en diseño de KPIs y gestión de desempeño. "
@@ -54,29 +95,337 @@ MARIA_SYSTEM_PROMPT = (
     "cómo se calcula el KPI). No incluyas texto fuera del JSON."
 )
 
-def normalizar_texto(valor):
-    """Devuelve un string sin espacios o vacío si el valor es nulo/NaN."""
-    if valor is None:
-        return ""
-    try:
-        if pd.isna(valor):  
-            return ""
-    except Exception:
-        pass
-    return str(valor).strip()
+def ruta_bd_activa():
+    """Ruta de la BD del espacio de trabajo de la sesión actual (DB_NAME fuera de una sesión de Streamlit)."""
+    if get_script_run_ctx() is None:
+        return DB_NAME
+    if "workspace_id" not in st.session_state:
+        st.session_state.workspace_id = uuid.uuid4().hex
+        purgar_espacios_inactivos()
+    return os.path.join(WORKSPACE_DIR, f"{st.session_state.workspace_id}.db")
+
+def purgar_espacios_inactivos():
+    """Borra las BD de espacios de trabajo que no se modifican hace más de RETENCION_ESPACIOS_S y no están abiertas.
+
+    Junto con cada BD se borra su carpeta de respaldos (SNAPSHOT_DIR/<id>/).
+    """
+    if not os.path.isdir(WORKSPACE_DIR):
+        return
+    limite = time.time() - RETENCION_ESPACIOS_S
+    for archivo in os.listdir(WORKSPACE_DIR):
+        ruta = os.path.join(WORKSPACE_DIR, archivo)
+        base = ruta[:-4] if ruta.endswith(("-wal", "-shm")) else ruta
+        if bd_abierta(base):
+            continue
+        try:
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+                if ruta == base:
+                    shutil.rmtree(os.path.join(SNAPSHOT_DIR, os.path.splitext(archivo)[0]), ignore_errors=True)
+        except OSError:
+            pass
+
+def _sesion_diario():
+    return st.session_state.get("workspace_id", "") if get_script_run_ctx() is not None else ""
+
+def cache_por_revision(func):
+    """Cachea `func(*args)` por BD activa mientras su revisión no cambie, y cuenta aciertos y fallos.
+
+    El valor se comparte entre reruns y sesiones de la misma BD, así que quien lo use no debe modificarlo.
+    Los recursos del proceso (cliente de MARIA, pool de conexiones) no pasan por aquí: usan
+    st.cache_resource o viven en organigrama.bd.
+    """
+    @trazado
+    @functools.wraps(func)
+    def envoltura(*args):
+        ruta = ruta_bd_activa()
+        revision = obtener_revision_bd(ruta)
+        clave = (func.__name__, args)
+        with _cache_lock:
+            entrada = _cache_datos.get(ruta, {}).get(clave)
+            if entrada is not None and entrada[0] == revision:
+                _cache_datos.move_to_end(ruta)
+                _estadisticas_cache[func.__name__]["aciertos"] += 1
+                return entrada[1]
+            _estadisticas_cache[func.__name__]["fallos"] += 1
+
+        valor = func(*args)
+        with _cache_lock:
+            _cache_datos.setdefault(ruta, {})[clave] = (revision, valor)
+            _cache_datos.move_to_end(ruta)
+            while len(_cache_datos) > MAX_BD_EN_CACHE:
+                _cache_datos.popitem(last=False)
+        return valor
+
+    return envoltura
+
+def invalidar_cache_bd(ruta):
+    """Descarta los datos cacheados de `ruta` (de todas las BD si es None).
+
+    Se llama desde registrar_cambio_bd en cada escritura y al cerrar una BD; la revisión en cada
+    entrada cubre además los cambios hechos por otros procesos.
+    """
+    with _cache_lock:
+        descartadas = [_cache_datos.pop(ruta, {})] if ruta is not None else list(_cache_datos.values())
+        if ruta is None:
+            _cache_datos.clear()
+        for entradas in descartadas:
+            for nombre, _ in entradas:
+                _estadisticas_cache[nombre]["invalidaciones"] += 1
+
+def estadisticas_cache():
+    """Aciertos, fallos e invalidaciones por consulta cacheada desde que arrancó el proceso."""
+    with _cache_lock:
+        filas = [
+            {
+                "Consulta": nombre,
+                "Aciertos": contadores["aciertos"],
+                "Fallos": contadores["fallos"],
+                "Invalidaciones": contadores["invalidaciones"],
+            }
+            for nombre, contadores in sorted(_estadisticas_cache.items())
+        ]
+    for fila in filas:
+        llamadas = fila["Aciertos"] + fila["Fallos"]
+        fila["% aciertos"] = round(100 * fila["Aciertos"] / llamadas, 1) if llamadas else 0.0
+    return filas
+
+bd.configurar_ruta_bd(ruta_bd_activa)
+bd.al_cambiar_bd(invalidar_cache_bd)
+diario.configurar_sesion_diario(_sesion_diario)
+
+# Avisos encolados en la sesión: se muestran como toast en el siguiente render, aunque haya un st.rerun() de por medio
+ICONOS_NOTIFICACION = {"success": "✅", "info": "ℹ️", "warning": "⚠️", "error": "❌"}
+
+def notificar(mensaje, tipo="success"):
+    """Encola un aviso (success, info, warning o error) para el próximo render de la sesión."""
+    st.session_state.setdefault("notificaciones", []).append((tipo, mensaje))
+
+def mostrar_notificaciones():
+    """Muestra como toast y vacía los avisos pendientes de la sesión."""
+    for tipo, mensaje in st.session_state.pop("notificaciones", []):
+        st.toast(mensaje, icon=ICONOS_NOTIFICACION.get(tipo))
+
+def rendimiento_activo():
+    return st.query_params.get("perf") == "1"
+
+def guardar_traza():
+    """Cierra la traza activa y la agrega a las últimas MAX_TRAZAS_SESION de la sesión."""
+    registro = traza.finalizar_traza()
+    if registro is not None:
+        trazas = st.session_state.setdefault("trazas_rendimiento", [])
+        trazas.append(registro)
+        del trazas[:-MAX_TRAZAS_SESION]
+    return registro
+
+def iniciar_traza_rerun():
+    """Abre la traza del rerun; si la anterior quedó abierta (la cortó un st.rerun()) se guarda como interrumpida."""
+    if not rendimiento_activo():
+        traza.finalizar_traza()
+        return
+    previa = guardar_traza()
+    if previa is not None:
+        previa["etiqueta"] += " (interrumpida)"
+    traza.iniciar_traza("rerun")
+
+def trazar_fragmento(func):
+    """Como `trazado`, pero si el fragmento se ejecuta solo (sin el resto del script) guarda su propia traza."""
+    @functools.wraps(func)
+    def envoltura(*args, **kwargs):
+        ctx = get_script_run_ctx()
+        if rendimiento_activo() and ctx is not None and ctx.fragment_ids_this_run:
+            traza.iniciar_traza(f"fragmento {func.__name__}")
+            try:
+                with tramo(func.__name__):
+                    return func(*args, **kwargs)
+            finally:
+                guardar_traza()
+        with tramo(func.__name__):
+            return func(*args, **kwargs)
+
+    return envoltura
+
+def mostrar_panel_rendimiento():
+    """Panel oculto (solo con ?perf=1): tramos y consultas SQL de los últimos reruns, exportables a JSON."""
+    if not rendimiento_activo():
+        return
+    guardar_traza()
+    trazas = st.session_state.get("trazas_rendimiento", [])
+    with st.expander("⏱️ Rendimiento"):
+        if not trazas:
+            st.caption("Aún no hay trazas en esta sesión.")
+            return
+        indice = st.selectbox(
+            "Ejecución",
+            range(len(trazas) - 1, -1, -1),
+            format_func=lambda i: f"{trazas[i]['inicio']} · {trazas[i]['etiqueta']} · {trazas[i]['duracion_ms']:.0f} ms",
+        )
+        registro = trazas[indice]
+        col_total, col_sql, col_consultas = st.columns(3)
+        col_total.metric("Duración", f"{registro['duracion_ms']:.0f} ms")
+        col_sql.metric("SQL", f"{registro['sql_ms']:.0f} ms")
+        col_consultas.metric("Consultas", len(registro["consultas"]) + registro["consultas_omitidas"])
+
+        if registro["tramos"]:
+            df_tramos = pd.DataFrame(registro["tramos"])
+            df_tramos["nombre"] = ["· " * nivel + nombre for nivel, nombre in zip(df_tramos["nivel"], df_tramos["nombre"])]
+            st.dataframe(
+                df_tramos[["nombre", "inicio_ms", "duracion_ms", "sql_ms", "consultas"]].rename(columns={
+                    "nombre": "Tramo",
+                    "inicio_ms": "Inicio (ms)",
+                    "duracion_ms": "Duración (ms)",
+                    "sql_ms": "SQL propio (ms)",
+                    "consultas": "Consultas",
+                }),
+                hide_index=True,
+                use_container_width=True,
+            )
+        if registro["consultas"]:
+            df_consultas = (
+                pd.DataFrame(registro["consultas"])
+                .groupby("sql", as_index=False)
+                .agg(Veces=("duracion_ms", "size"), Total_ms=("duracion_ms", "sum"), Max_ms=("duracion_ms", "max"), Tramo=("tramo", "first"))
+                .sort_values("Total_ms", ascending=False)
+                .head(15)
+                .rename(columns={"sql": "Consulta", "Total_ms": "Total (ms)", "Max_ms": "Máx (ms)"})
+            )
+            st.caption("Consultas más costosas")
+            st.dataframe(df_consultas, hide_index=True, use_container_width=True)
+
+        st.download_button(
+            "Descargar trazas (JSON)",
+            data=json.dumps(trazas, ensure_ascii=False, indent=2),
+            file_name="trazas_rendimiento.json",
+            mime="application/json",
+        )
 
-def buscar_columna_por_nombre(columnas, nombre_objetivo):
-    """Devuelve el nombre real de la columna que coincide (ignorando mayúsculas/espacios)."""
-    objetivo = nombre_objetivo.strip().lower()
-    for col in columnas:
-        if col.strip().lower() == objetivo:
-            return col
-    return None
+def init_database():
+    """Inicializa la base de datos de la sesión SOLO si no existe"""
+    creada = bd.init_database()
+    if creada:
+        notificar("Estructura de base de datos creada", "info")
+    return creada
+
+def _directorio_snapshots():
+    """Carpeta de respaldos de la BD activa."""
+    return os.path.join(SNAPSHOT_DIR, os.path.splitext(os.path.basename(ruta_bd_activa()))[0])
+
+@trazado
+def crear_snapshot(motivo):
+    """Copia en línea la BD con la API de respaldo de SQLite y conserva solo los MAX_SNAPSHOTS más recientes.
+
+    No hace nada si la BD no existe o todavía no tiene cargos. Devuelve la ruta del respaldo o None.
+    """
+    if not os.path.exists(ruta_bd_activa()):
+        return None
+    with conectar_bd() as origen:
+        try:
+            if not origen.execute(consulta("hay_cargos")).fetchone():
+                return None
+        except sql.OperationalError:
+            return None
+
+        directorio = _directorio_snapshots()
+        os.makedirs(directorio, exist_ok=True)
+        sufijo = re.sub(r"[^a-z0-9]+", "-", normalizar_nombre(motivo)).strip("-") or "manual"
+        ahora = time.time()
+        marca = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(ahora))}-{int(ahora * 10**6) % 10**6:06d}"
+        ruta = os.path.join(directorio, f"{marca}__{sufijo}.db")
+        with closing(sql.connect(ruta)) as destino:
+            origen.backup(destino)
+
+    for antigua in listar_snapshots()[MAX_SNAPSHOTS:]:
+        try:
+            os.remove(antigua["ruta"])
+        except OSError:
+            pass
+    return ruta
+
+def listar_snapshots():
+    """Lista los respaldos disponibles, del más reciente al más antiguo."""
+    directorio = _directorio_snapshots()
+    if not os.path.isdir(directorio):
+        return []
+    respaldos = []
+    for archivo in sorted(os.listdir(directorio), reverse=True):
+        if not archivo.endswith(".db") or "__" not in archivo:
+            continue
+        marca, motivo = archivo[:-3].split("__", 1)
+        ruta = os.path.join(directorio, archivo)
+        respaldos.append({
+            "ruta": ruta,
+            "creado": time.strftime("%Y-%m-%d %H:%M:%S", time.strptime(marca[:15], "%Y%m%d-%H%M%S")),
+            "motivo": motivo.replace("-", " "),
+            "tamano_kb": round(os.path.getsize(ruta) / 1024, 1),
+        })
+    return respaldos
+
+def restaurar_snapshot(ruta):
+    """Restaura un respaldo sobre la BD activa con la API de respaldo (los lectores en WAL no se bloquean).
+
+    Antes se respalda el estado actual, y la BD restaurada recibe un id nuevo para que las
+    cachés por revisión no reutilicen resultados del estado descartado.
+    """
+    crear_snapshot("antes de restaurar")
+    with closing(sql.connect(ruta)) as origen, conectar_bd() as destino:
+        origen.backup(destino)
+        destino.execute("PRAGMA journal_mode=WAL")
+        destino.execute(consulta("renovar_id_bd"), (uuid.uuid4().hex,))
+        registrar_cambio_bd(destino)
+        destino.commit()
+
+def mostrar_snapshots():
+    """Panel para crear y restaurar respaldos de la BD."""
+    with st.expander("🗂️ Respaldos de la base de datos"):
+        respaldos = listar_snapshots()
+        st.caption(
+            f"Se crea un respaldo automático antes de cada carga y de cada guardado masivo; "
+            f"se conservan los {MAX_SNAPSHOTS} más recientes."
+        )
+        if st.button("📸 Crear respaldo ahora", key="crear_snapshot"):
+            if crear_snapshot("manual"):
+                notificar("Respaldo creado")
+                st.rerun()
+            else:
+                st.info("La base de datos todavía no tiene datos para respaldar.")
+        if not respaldos:
+            st.info("Aún no hay respaldos.")
+            return
+
+        st.dataframe(
+            pd.DataFrame(respaldos)[["creado", "motivo", "tamano_kb"]].rename(
+                columns={"creado": "Creado", "motivo": "Motivo", "tamano_kb": "Tamaño (KB)"}
+            ),
+            hide_index=True,
+            use_container_width=True,
+        )
+        etiquetas = {f"{r['creado']} · {r['motivo']}": r["ruta"] for r in respaldos}
+        elegido = st.selectbox("Respaldo a restaurar", list(etiquetas), key="snapshot_elegido")
+        if st.button("⏪ Restaurar respaldo", key="restaurar_snapshot", type="primary"):
+            inicio = time.perf_counter()
+            restaurar_snapshot(etiquetas[elegido])
+            # Los pasos del flujo se vuelven a evaluar contra la BD restaurada
+            for key in [
+                "niveles_guardados",
+                "asignaciones_niveles",
+                "jefes_guardados",
+                "asignaciones_jefes",
+                "indicadores_asignados",
+                "nodo_seleccionado",
+                "diario_deshacer",
+                "diario_rehacer",
+            ]:
+                st.session_state.pop(key, None)
+            notificar(f"Respaldo restaurado en {time.perf_counter() - inicio:.2f} s")
+            st.rerun()
 
 def reset_database_file():
     """Elimina la base de datos y archivos auxiliares para reiniciar el flujo."""
+    crear_snapshot("reinicio")
+    ruta = ruta_bd_activa()
+    cerrar_conexion_bd(ruta)
     for suffix in ("", "-wal", "-shm"):
-        path = f"{DB_NAME}{suffix}"
+        path = f"{ruta}{suffix}"
         if os.path.exists(path):
             try:
                 os.remove(path)
@@ -89,46 +438,36 @@ def reiniciar_estado_por_upload():
     init_database()
     # Limpiar banderas principales para volver a correr el flujo desde cero
     for key in [
-        "df_fuente",
+        "fuente",
         "archivo_procesado",
         "niveles_guardados",
         "asignaciones_niveles",
-        "guardar_niveles_clicked",
+        "niveles_prellenados",
         "jefes_guardados",
         "asignaciones_jefes",
-        "guardar_jefes_clicked",
+        "coincidencias_jefes",
+        "enlaces_jefes",
+        "diario_deshacer",
+        "diario_rehacer",
         "indicadores_asignados",
         "nodo_seleccionado",
         "filtro_cargo",
+        "cargo_resaltado",
+        "busqueda_organigrama",
+        "resultado_busqueda",
         "selectbox_key_counter",
     ]:
         if key in st.session_state:
             del st.session_state[key]
-    st.session_state.df_fuente = None
+    st.session_state.fuente = None
     st.session_state.archivo_procesado = False
 
+@trazado
 def obtener_contexto_cargo_por_nombre(nombre_cargo: str) -> dict:
-    """Extrae datos descriptivos del cargo desde el archivo cargado."""
-    df_fuente = st.session_state.get("df_fuente")
-    if df_fuente is None or not nombre_cargo:
-        return {}
-    columnas = list(df_fuente.columns)
-    col_cargo = buscar_columna_por_nombre(columnas, "Cargo")
-    if not col_cargo:
+    """Extrae datos descriptivos del cargo desde el archivo cargado (guardado en FuenteFilas)."""
+    if st.session_state.get("fuente") is None or not nombre_cargo:
         return {}
-    clean_target = normalizar_texto(nombre_cargo).lower()
-    subset = df_fuente[df_fuente[col_cargo].astype(str).str.strip().str.lower() == clean_target]
-    if subset.empty:
-        return {}
-
-    contexto = {}
-    for etiqueta in ["Área", "Departamento", "Responde al Cargo", "Nivel Jerárquico"]:
-        col = buscar_columna_por_nombre(columnas, etiqueta)
-        if col and col in subset:
-            valores = subset[col].dropna().astype(str).str.strip()
-            if not valores.empty:
-                contexto[etiqueta] = valores.iloc[0]
-    return contexto
+    return fuente.contexto_cargo(nombre_cargo)
 
 def _extraer_json_de_respuesta(texto: str):
     """Intenta extraer un bloque JSON de la respuesta del modelo."""
@@ -146,10 +485,29 @@ def _extraer_json_de_respuesta(texto: str):
     except Exception:
         return None
 
+def maria_configurada():
+    """Indica si MARIA se puede habilitar (clave presente y langchain-openai instalado) sin importar LangChain."""
+    return bool(OPENAI_API_KEY) and importlib.util.find_spec("langchain_openai") is not None
+
+@st.cache_resource(show_spinner=False)
+def obtener_llm():
+    """Cliente de MARIA compartido por todo el proceso; LangChain se importa solo la primera vez que se usa."""
+    if not maria_configurada():
+        return None
+    try:
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(model="gpt-4o-mini", temperature=0.15, openai_api_key=OPENAI_API_KEY)
+    except Exception:
+        return None
+
+@trazado
 def generar_kpis_con_maria(nombre_cargo, prompt_usuario, kpis_actuales, indicadores_disponibles, max_kpis=3):
     """Invoca al agente MARIA para sugerir KPIs."""
-    if llm is None or SystemMessage is None or HumanMessage is None:
+    llm = obtener_llm()
+    if llm is None:
         return ("Configura tu OPENAI_API_KEY en st.secrets para habilitar a MARIA.", None)
+    from langchain.schema import HumanMessage, SystemMessage
 
     contexto_cargo = obtener_contexto_cargo_por_nombre(nombre_cargo)
     area = contexto_cargo.get("Área", "Área no especificada")
@@ -182,7 +540,8 @@ def generar_kpis_con_maria(nombre_cargo, prompt_usuario, kpis_actuales, indicado
         "Siempre responde en JSON conforme a las instrucciones del sistema."
     )
 
-    respuesta = llm([SystemMessage(content=MARIA_SYSTEM_PROMPT), HumanMessage(content=user_payload)])
+    with tramo("llamada_llm"):
+        respuesta = llm([SystemMessage(content=MARIA_SYSTEM_PROMPT), HumanMessage(content=user_payload)])
     contenido = getattr(respuesta, "content", str(respuesta))
 
     data = _extraer_json_de_respuesta(contenido)
@@ -209,222 +568,231 @@ def generar_kpis_con_maria(nombre_cargo, prompt_usuario, kpis_actuales, indicado
                 tabla = tabla[["Nombre KPI", "Fórmula", "Peso sugerido", "Indicador estratégico"]]
     return mensaje, tabla
 
-def init_database():
-    """Inicializa la base de datos SOLO si no existe"""
-    with closing(sql.connect(DB_NAME, timeout=30.0)) as conn:
-        conn.execute("PRAGMA journal_mode=WAL")
-        conn.execute("PRAGMA foreign_keys = ON")
-        
+def registrar_accion_deshacible(grupo, descripcion):
+    """Apila una acción de la sesión para deshacerla; una acción nueva vacía la pila de rehacer."""
+    st.session_state.setdefault("diario_deshacer", []).append((grupo, descripcion))
+    st.session_state.diario_rehacer = []
+
+def deshacer_cambio():
+    """Revierte la última acción de la sesión. Devuelve su descripción o None si no había nada."""
+    pila = st.session_state.get("diario_deshacer") or []
+    if not pila:
+        return None
+    grupo, descripcion = pila[-1]
+    inverso = aplicar_inverso_diario(grupo, f"Deshacer: {descripcion}")
+    pila.pop()
+    st.session_state.setdefault("diario_rehacer", []).append((inverso, descripcion))
+    return descripcion
+
+def rehacer_cambio():
+    """Vuelve a aplicar la última acción deshecha. Devuelve su descripción o None si no había nada."""
+    pila = st.session_state.get("diario_rehacer") or []
+    if not pila:
+        return None
+    grupo, descripcion = pila[-1]
+    inverso = aplicar_inverso_diario(grupo, f"Rehacer: {descripcion}")
+    pila.pop()
+    st.session_state.setdefault("diario_deshacer", []).append((inverso, descripcion))
+    return descripcion
+
+def insert_data():
+    """Inserta los datos del archivo cargado SOLO si es necesario y muestra el resumen de la carga."""
+    resumen = ingesta.insert_data()
+    if resumen["omitido"]:
+        notificar(f"La base de datos ya contiene {resumen['omitido']} cargos. Omitiendo inserción de datos.", "info")
+        return
+
+    enlazados = resumen["enlazados"]
+    if enlazados:
+        notificar(
+            f"Se enlazaron automáticamente {len(enlazados)} nombre(s) de jefe con su cargo más parecido "
+            "(detalle en el paso de jefes).",
+            "info",
+        )
+    st.session_state.enlaces_jefes = enlazados
+    st.session_state.coincidencias_jefes = resumen["ambiguos"]
+    if resumen["ciclos_rechazados"]:
+        notificar(
+            f"Se omitieron {resumen['ciclos_rechazados']} relación(es) jefe-cargo del archivo porque formaban ciclos.",
+            "warning",
+        )
+    notificar("Datos insertados correctamente")
+
+def sincronizar_nuevos_kpis():
+    """Inserta en la BD los KPIs del archivo que aún no existen."""
+    resumen = ingesta.sincronizar_nuevos_kpis()
+    if resumen is None:
+        notificar("No se encontró la columna 'Indicador' en el archivo. No se sincronizaron KPIs.", "warning")
+    elif resumen["kpis"]:
+        mensaje = f"Se sincronizaron {len(resumen['kpis'])} KPI(s) nuevos desde el archivo"
+        if resumen["indicadores"]:
+            mensaje += f" y {len(resumen['indicadores'])} indicador(es) estratégico(s)"
+        notificar(mensaje + ".")
+
+def asignar_indicadores_estrategicos_a_ceo():
+    """Asigna los indicadores estratégicos como KPIs a cada raíz (CEO) con peso distribuido equitativamente"""
+    resultado = ingesta.asignar_indicadores_estrategicos_a_ceo()
+    if not resultado["raices"]:
+        st.error("❌ No hay ningún cargo raíz (CEO) designado en la BD. Desígnalo en el paso de jefes.")
+        return False
+    if not resultado["indicadores"]:
+        st.info("ℹ️ No hay indicadores estratégicos para asignar")
+        return True
+    return resultado["asignados"] > 0
+
+def rebalancear_pesos_kpis(cargo_id, incluir_subarbol=False, descripcion_diario=None):
+    """Rebalancea los pesos del cargo (o su subárbol) y apila la acción para deshacerla en la sesión."""
+    resumen = pesos.rebalancear_pesos_kpis(cargo_id, incluir_subarbol, descripcion_diario)
+    if resumen["grupo"]:
+        registrar_accion_deshacible(resumen["grupo"], descripcion_diario)
+    return resumen
+
+def obtener_subordinados(cargo_id):
+    """Devuelve todos los cargos que reportan directa o indirectamente a `cargo_id`."""
+    with conectar_bd() as conn:
         cursor = conn.cursor()
-        
-        # Verificar si las tablas ya existen
-        cursor.execute("""
-        SELECT name FROM sqlite_master 
-        WHERE type='table' AND name='Cargos'
-        """)
-        
-        if cursor.fetchone() is None:
-            # Las tablas NO existen, crearlas
-            st.info("🔧 Creando estructura de base de datos...")
-            
-            cursor.executescript("""
-            DROP TABLE IF EXISTS CargosKpis;
-            DROP TABLE IF EXISTS Kpis;
-            DROP TABLE IF EXISTS IndicadoresEstrategicos;
-            DROP TABLE IF EXISTS Cargos;
-
-            CREATE TABLE IF NOT EXISTS Cargos (
-                id_cargo INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre_cargo TEXT UNIQUE NOT NULL,
-                nivel_cargo TEXT,
-                fk_jefe INTEGER,
-                CONSTRAINT fk_jefe_fk FOREIGN KEY (fk_jefe)
-                    REFERENCES Cargos(id_cargo)
-                    ON UPDATE CASCADE
-                    ON DELETE SET NULL,
-                CONSTRAINT no_self_ref CHECK (fk_jefe IS NULL OR fk_jefe <> id_cargo)
-            );
-
-            CREATE TABLE IF NOT EXISTS IndicadoresEstrategicos (
-                id_kpiEs INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre_kpiEs TEXT UNIQUE NOT NULL
-            );
-
-            CREATE TABLE IF NOT EXISTS Kpis (
-                id_kpi INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre_kpi TEXT UNIQUE NOT NULL,
-                formula_kpi TEXT,
-                fk_kpiEs INTEGER,
-                CONSTRAINT fk_kpiEs FOREIGN KEY (fk_kpiEs)
-                    REFERENCES IndicadoresEstrategicos(id_kpiEs)
-                    ON UPDATE CASCADE
-                    ON DELETE CASCADE
-            );
-
-            CREATE TABLE IF NOT EXISTS CargosKpis (
-                id_cargoKpi INTEGER PRIMARY KEY AUTOINCREMENT,
-                fk_cargo INTEGER,
-                fk_kpi INTEGER,
-                peso_kpi INTEGER,
-                CONSTRAINT fk_cargo FOREIGN KEY (fk_cargo)
-                    REFERENCES Cargos(id_cargo)
-                    ON UPDATE CASCADE
-                    ON DELETE CASCADE,
-                CONSTRAINT fk_kpi FOREIGN KEY (fk_kpi)
-                    REFERENCES Kpis(id_kpi)
-                    ON UPDATE CASCADE
-                    ON DELETE CASCADE,
-                UNIQUE(fk_cargo, fk_kpi)
-            );
-            """)
-            conn.commit()
-            return True  # Base de datos recién creada
-        else:
-            # Las tablas ya existen
-            return False  # Base de datos ya existía
+        cursor.execute(consulta("subordinados"), (int(cargo_id),))
+        return cursor.fetchall()
 
-def insert_data(df):
-    """Inserta los datos desde el DataFrame SOLO si es necesario"""
-    with closing(sql.connect(DB_NAME, timeout=30.0)) as conn:
-        conn.execute("PRAGMA foreign_keys = ON")
+def obtener_cadena_de_mando(cargo_id):
+    """Devuelve los jefes de `cargo_id` desde el inmediato hasta la raíz."""
+    with conectar_bd() as conn:
         cursor = conn.cursor()
-        
-        # Verificar si ya hay datos
-        cursor.execute("SELECT COUNT(*) FROM Cargos")
-        count = cursor.fetchone()[0]
-        
-        if count > 0:
-            st.info(f"ℹ️ La base de datos ya contiene {count} cargos. Omitiendo inserción de datos.")
-            return
-        
-        st.info("📥 Insertando datos en la base de datos...")
-        
-        # Preparar DataFrames
-        df_cargos = pd.DataFrame({
-            "Cargo": pd.concat([df["Cargo"], df["Responde al Cargo"]]).unique(),
-        })
-        
-        tmp = df[["Cargo", "Nivel Jerárquico"]].drop_duplicates(subset="Cargo", keep="first")
-        df_cargos = df_cargos.merge(tmp, on="Cargo", how="left")
-        df_cargos["Nivel Jerárquico"] = df_cargos["Nivel Jerárquico"].fillna("N/A").astype(str)
-        
-        df_kpis = pd.DataFrame({
-            "Kpis": df["Indicador"],
-            "Fórmula": df["Fórmula"]
-        })
-        
-        df_kpisEs = pd.DataFrame({
-            "IndicadoresEstrategicos": df["Alineado (archivo)"].unique()
-        })
-        
-        # Insertar datos base
-        for _, row in df_cargos.iterrows():
-            cursor.execute("""
-            INSERT OR IGNORE INTO Cargos (nombre_cargo, nivel_cargo)
-            VALUES (?, ?);
-            """, (row["Cargo"], row["Nivel Jerárquico"]))
-        
-        for _, row in df_kpisEs.iterrows():
-            cursor.execute("""
-            INSERT OR IGNORE INTO IndicadoresEstrategicos (nombre_kpiEs)
-            VALUES (?);
-            """, (row["IndicadoresEstrategicos"],))
-        
-        for _, row in df_kpis.iterrows():
-            cursor.execute("""
-            INSERT OR IGNORE INTO Kpis (nombre_kpi, formula_kpi)
-            VALUES (?, ?);
-            """, (row["Kpis"], row["Fórmula"]))
-        
-        conn.commit()
-        
-        #Insertar fks
-        # Actualizar FK
-        for _, row in df.iterrows():
-            if pd.notna(row["Responde al Cargo"]) and row["Cargo"] != row["Responde al Cargo"]:
-                try:
-                    cursor.execute("""
-                    UPDATE Cargos
-                    SET fk_jefe = (SELECT id_cargo FROM Cargos WHERE nombre_cargo = ?)
-                    WHERE nombre_cargo = ?;
-                    """, (row["Responde al Cargo"], row["Cargo"]))
-                except sql.IntegrityError:
-                    pass
-        
-        conn.commit()
-        
-        for _, row in df.iterrows():
-            if pd.notna(row["Alineado (archivo)"]) and pd.notna(row["Indicador"]):
-                cursor.execute("""
-                UPDATE Kpis
-                SET fk_kpiEs = (SELECT id_kpiEs FROM IndicadoresEstrategicos WHERE nombre_kpiEs = ?)
-                WHERE nombre_kpi = ?;
-                """, (row["Alineado (archivo)"], row["Indicador"]))
-        conn.commit()
-        
-        for _, row in df.iterrows():
-            if pd.notna(row["Cargo"]) and pd.notna(row["Indicador"]):
-            # Obtener peso si existe en tu Excel
-                peso = row.get("Peso", None)  # Ajusta el nombre de columna según tu Excel
-
-                cursor.execute("""
-                INSERT OR IGNORE INTO CargosKpis (fk_cargo, fk_kpi, peso_kpi)
-                SELECT 
-                    (SELECT id_cargo FROM Cargos WHERE nombre_cargo = ?),
-                    (SELECT id_kpi FROM Kpis WHERE nombre_kpi = ?),
-                    ?;
-                """, (row["Cargo"], row["Indicador"], peso))
-        conn.commit()
-        st.success("✅ Datos insertados correctamente")
+        cursor.execute(consulta("cadena_de_mando"), (int(cargo_id),))
+        return cursor.fetchall()
 
-def construir_arbol_organizacional():
-    """Construye el árbol jerárquico de la organización desde la BD"""
-    with closing(sql.connect(DB_NAME, timeout=30.0)) as conn:
+@trazado
+def calcular_rollup_kpis():
+    """Agrega KPIs, pesos e indicadores estratégicos del subárbol de cada cargo en una consulta."""
+    with conectar_bd() as conn:
         cursor = conn.cursor()
-        
-        # Obtener todos los cargos con sus jefes
-        cursor.execute("""
-        SELECT id_cargo, nombre_cargo, fk_jefe, nivel_cargo
-        FROM Cargos
-        ORDER BY id_cargo
-        """)
-        cargos = cursor.fetchall()
-    
-    # Crear diccionario de cargos por ID
-    cargo_map = {}
-    for id_cargo, nombre_cargo, fk_jefe, nivel_cargo in cargos:
-        cargo_map[id_cargo] = {
-            "name": nombre_cargo,
-            "id": id_cargo,
-            "fk_jefe": fk_jefe,
-            "nivel": nivel_cargo,
-            "children": []
+        cursor.execute(consulta("rollup_kpis"))
+        filas = cursor.fetchall()
+
+    return {
+        ancestro: {
+            "cargos": cargos,
+            "kpis": kpis,
+            "peso_total": peso,
+            "indicadores": tuple(sorted(int(valor) for valor in lista.split(","))) if lista else (),
         }
-    
-    # Encontrar la raíz (CEO) y construir el árbol
-    root = None
-    orfanos = []  # Cargos sin jefe que no son CEO
-    
-    for id_cargo, node in cargo_map.items():
-        if node["fk_jefe"] is None:
-            # Si no tiene jefe
-            if root is None:
-                root = node  # El primero sin jefe es la raíz
-            else:
-                orfanos.append(node)  # Los demás son huérfanos
-        else:
-            # Agregar como hijo al jefe
-            if node["fk_jefe"] in cargo_map:
-                cargo_map[node["fk_jefe"]]["children"].append(node)
-            else:
-                # Si el jefe no existe, agregar como huérfano
-                orfanos.append(node)
-    
-    # Si hay huérfanos, agregarlos como hijos de la raíz
-    if root and orfanos:
-        root["children"].extend(orfanos)
-    
-    return root if root else {"name": "Organización", "children": list(cargo_map.values())}
+        for ancestro, cargos, kpis, peso, lista in filas
+    }
+
+@cache_por_revision
+def obtener_rollup_kpis():
+    """Devuelve el roll-up de KPIs por subárbol de todos los cargos, recalculándolo solo si la BD cambió."""
+    return calcular_rollup_kpis()
+
+@cache_por_revision
+def obtener_arbol_organizacional():
+    """Árbol jerárquico de la organización, reconstruido solo si la BD cambió."""
+    return construir_arbol_organizacional()
+
+@cache_por_revision
+def obtener_cargos_con_hijos():
+    """Cargos que tienen al menos un subordinado directo, ordenados por nombre."""
+    with conectar_bd() as conn:
+        return conn.execute(consulta("cargos_con_hijos")).fetchall()
+
+@cache_por_revision
+def obtener_indicadores_estrategicos():
+    """Indicadores estratégicos (id, nombre) ordenados por nombre."""
+    with conectar_bd() as conn:
+        return conn.execute(consulta("indicadores_estrategicos")).fetchall()
+
+@cache_por_revision
+def obtener_kpis_por_cargo():
+    """Resumen de los KPIs de cada cargo ({id_cargo: [kpi, ...]}) para los nodos del organigrama."""
+    kpis_por_cargo = defaultdict(list)
+    with conectar_bd() as conn:
+        cursor = conn.cursor()
+        cursor.execute(consulta("kpis_por_cargo"))
+        for kpi_id, fk_cargo, nombre, peso, formula, indicador in cursor.fetchall():
+            descripcion = normalizar_texto(formula) or normalizar_texto(indicador) or "Sin descripción"
+            try:
+                peso_val = int(peso) if peso is not None else 0
+            except (TypeError, ValueError):
+                peso_val = 0
+            kpis_por_cargo[fk_cargo].append(
+                {
+                    "id": kpi_id,
+                    "nombre": normalizar_texto(nombre),
+                    "peso": peso_val,
+                    "descripcion": descripcion,
+                }
+            )
+    return dict(kpis_por_cargo)
+
+@cache_por_revision
+def obtener_df_hoja3():
+    """Archivo actualizado (columnas de texto como category), regenerado solo si la BD cambió."""
+    return generar_df_hoja3()
+
+@cache_por_revision
+def obtener_excel_hoja3():
+    """Archivo actualizado en .xlsx, generado una sola vez por revisión de la BD."""
+    output = BytesIO()
+    with tramo("exportar_excel"), pd.ExcelWriter(output, engine="openpyxl") as writer:
+        obtener_df_hoja3().to_excel(writer, index=False, sheet_name="KPIs")
+    return output.getvalue()
+
+@cache_por_revision
+def obtener_kpis_cargo(cargo_id):
+    """KPIs asignados a un cargo con su indicador estratégico y bloqueo de peso."""
+    with conectar_bd() as conn:
+        return conn.execute(consulta("kpis_cargo"), (int(cargo_id),)).fetchall()
+
+@cache_por_revision
+def obtener_resultados_busqueda(texto):
+    """Resultados de la búsqueda FTS5 de `texto` (cargo, KPI, fórmula o indicador), recalculados solo si la BD cambió."""
+    return busqueda.buscar_en_organizacion(texto)
+
+def ir_a_resultado_busqueda(resultados):
+    """Filtra el organigrama al equipo del cargo elegido en la búsqueda, lo resalta y abre su panel de KPIs."""
+    posicion = st.session_state.get("resultado_busqueda")
+    if posicion is None:
+        return
+    id_cargo, nombre_cargo = resultados[posicion][:2]
+    with conectar_bd() as conn:
+        fila = conn.execute(consulta("jefe_de_cargo"), (id_cargo,)).fetchone()
+    # Se muestra el subárbol del jefe para ver al cargo junto a sus pares; una raíz se ve en "Ver Todo"
+    st.session_state.filtro_cargo = fila[0] if fila else None
+    st.session_state.selectbox_key_counter = st.session_state.get("selectbox_key_counter", 0) + 1
+    st.session_state.cargo_resaltado = id_cargo
+    st.session_state.nodo_seleccionado = {"cargo_id": id_cargo, "nombre_cargo": nombre_cargo}
+
+def mostrar_busqueda_organigrama():
+    """Caja de búsqueda de cargos, KPIs, fórmulas e indicadores; elegir un resultado salta a su cargo."""
+    texto = st.text_input(
+        "Buscar cargo, KPI, fórmula o indicador estratégico:",
+        key="busqueda_organigrama",
+        placeholder="p.ej. tasa de conversión, cartera, nómina",
+    ).strip()
+    if not texto:
+        return
+    resultados = obtener_resultados_busqueda(texto)
+    if not resultados:
+        st.caption("Sin coincidencias.")
+        return
+
+    etiqueta = f"{len(resultados)} coincidencia(s)"
+    if len(resultados) == busqueda.LIMITE_RESULTADOS:
+        etiqueta += " (se muestran las más relevantes; precisa la búsqueda para ver otras)"
+    etiquetas = [
+        coincidencia if tipo == "Cargo" else f"{nombre_cargo} · {tipo}: {coincidencia}"
+        for _, nombre_cargo, tipo, coincidencia in resultados
+    ]
+    st.selectbox(
+        etiqueta,
+        range(len(resultados)),
+        index=None,
+        format_func=etiquetas.__getitem__,
+        placeholder="Elige un resultado para ir al cargo en el organigrama",
+        key="resultado_busqueda",
+        on_change=ir_a_resultado_busqueda,
+        args=(resultados,),
+    )
 
 def renderizar_organigrama():
     """Renderiza el organigrama interactivo con streamlit-agraph y permite editar KPIs"""
@@ -444,25 +812,16 @@ def renderizar_organigrama():
         from streamlit_agraph import agraph, Node, Edge, Config
         
         # Construir árbol completo
-        arbol_completo = construir_arbol_organizacional()
+        arbol_completo = obtener_arbol_organizacional()
         
         # Filtro de búsqueda
         st.write("## 🔍 Filtrar Organigrama")
+        mostrar_busqueda_organigrama()
         col1, col2 = st.columns([3, 1])
         
         with col1:
             # Obtener todos los cargos que tienen hijos
-            with closing(sql.connect(DB_NAME, timeout=30.0)) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                SELECT DISTINCT c1.id_cargo, c1.nombre_cargo
-                FROM Cargos c1
-                WHERE EXISTS (
-                    SELECT 1 FROM Cargos c2 WHERE c2.fk_jefe = c1.id_cargo
-                )
-                ORDER BY c1.nombre_cargo
-                """)
-                cargos_con_hijos = cursor.fetchall()
+            cargos_con_hijos = obtener_cargos_con_hijos()
             
             opciones = ["📊 Ver Todo"] + [f"{nombre}" for _, nombre in cargos_con_hijos]
             
@@ -512,84 +871,25 @@ def renderizar_organigrama():
             # CAMBIO AQUÍ: Incrementar el counter para forzar recreación del selectbox
             if st.button("🔄 Limpiar", use_container_width=True):
                 st.session_state.filtro_cargo = None
+                st.session_state.cargo_resaltado = None
                 st.session_state.selectbox_key_counter += 1  # AGREGAR ESTO
                 st.rerun()
         
         st.divider()
         
-        # Cargar KPIs por cargo para mostrarlos como nodos independientes
-        kpis_por_cargo = defaultdict(list)
-        with closing(sql.connect(DB_NAME, timeout=30.0)) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT ck.id_cargoKpi,
-                       ck.fk_cargo,
-                       k.nombre_kpi,
-                       ck.peso_kpi,
-                       COALESCE(k.formula_kpi, ''),
-                       COALESCE(ies.nombre_kpiEs, '')
-                FROM CargosKpis ck
-                JOIN Kpis k ON ck.fk_kpi = k.id_kpi
-                LEFT JOIN IndicadoresEstrategicos ies ON k.fk_kpiEs = ies.id_kpiEs
-                ORDER BY ck.fk_cargo, k.nombre_kpi
-                """
-            )
-            for kpi_id, fk_cargo, nombre, peso, formula, indicador in cursor.fetchall():
-                descripcion = normalizar_texto(formula) or normalizar_texto(indicador) or "Sin descripción"
-                try:
-                    peso_val = int(peso) if peso is not None else 0
-                except (TypeError, ValueError):
-                    peso_val = 0
-                kpis_por_cargo[fk_cargo].append(
-                    {
-                        "id": kpi_id,
-                        "nombre": normalizar_texto(nombre),
-                        "peso": peso_val,
-                        "descripcion": descripcion,
-                    }
-                )
+        # KPIs por cargo para mostrarlos como nodos independientes (cacheados por revisión)
+        kpis_por_cargo = obtener_kpis_por_cargo()
+        nombres_indicadores = dict(obtener_indicadores_estrategicos())
+
+        # Cobertura acumulada por subárbol (cacheada por revisión de la BD)
+        rollup_kpis = obtener_rollup_kpis()
 
         # Calcular posiciones manuales para lograr una distribución uniforme
         H_SPACING = 280
         LEVEL_HEIGHT = 220
         SUMMARY_OFFSET = 110
 
-        posiciones = {}
-        contador_hojas = {"value": 0}
-
-        def obtener_id_nodo(nodo_obj):
-            return nodo_obj.get("id") if nodo_obj.get("id") is not None else nodo_obj["name"]
-
-        def asignar_posiciones(nodo, depth=0):
-            hijos = nodo.get("children", [])
-            if not hijos:
-                contador_hojas["value"] += 1
-                centro = contador_hojas["value"]
-            else:
-                centros_hijos = [asignar_posiciones(hijo, depth + 1) for hijo in hijos]
-                centro = sum(centros_hijos) / len(centros_hijos)
-
-            nodo_key = obtener_id_nodo(nodo)
-            cargo_node_id = f"cargo_{nodo_key}"
-            x_pos = centro * H_SPACING
-            posiciones[cargo_node_id] = (x_pos, depth * LEVEL_HEIGHT)
-
-            summary_id = f"{cargo_node_id}_kpis"
-            posiciones[summary_id] = (x_pos, depth * LEVEL_HEIGHT + SUMMARY_OFFSET)
-
-            return centro
-
-        asignar_posiciones(arbol)
-
-        # Ajustar para centrar el organigrama en pantalla
-        min_x = min(pos[0] for pos in posiciones.values())
-        shift = -(min_x - H_SPACING)
-        for key in list(posiciones.keys()):
-            x, y = posiciones[key]
-            posiciones[key] = (x + shift, y)
-        max_x = max(pos[0] for pos in posiciones.values())
-        canvas_width = int(max_x + H_SPACING)
+        posiciones, canvas_width = calcular_posiciones(arbol, H_SPACING, LEVEL_HEIGHT, SUMMARY_OFFSET)
 
         # Crear nodos y edges desde el árbol filtrado
         nodos = []
@@ -599,6 +899,8 @@ def renderizar_organigrama():
             cargo_id_real = obtener_id_nodo(nodo)
             nodo_id = f"cargo_{cargo_id_real}"
             x_cargo, y_cargo = posiciones.get(nodo_id, (0, 0))
+            # El cargo elegido en la búsqueda se resalta con otro color y borde grueso
+            resaltado = nodo.get("id") is not None and nodo.get("id") == st.session_state.get("cargo_resaltado")
             nodos.append(
                 Node(
                     id=nodo_id,
@@ -606,7 +908,8 @@ def renderizar_organigrama():
                     size=40,
                     title=nodo["name"],
                     shape="box",
-                    color="#d7e3fc",
+                    color="#ffd166" if resaltado else "#d7e3fc",
+                    borderWidth=4 if resaltado else 1,
                     x=x_cargo,
                     y=y_cargo,
                     fixed=True,
@@ -629,6 +932,19 @@ def renderizar_organigrama():
                 resumen_html = "Sin KPIs registrados"
                 resumen_title = "Aún no hay KPIs asignados a este cargo."
 
+            cobertura = rollup_kpis.get(nodo.get("id"))
+            if cobertura and nodo.get("children"):
+                resumen_html += (
+                    f"\nSubárbol: {cobertura['kpis']} KPIs · {len(cobertura['indicadores'])} indicadores"
+                )
+                indicadores_subarbol = ", ".join(
+                    nombres_indicadores.get(id_kpiEs, str(id_kpiEs)) for id_kpiEs in cobertura["indicadores"]
+                ) or "ninguno"
+                resumen_title += (
+                    f"\n\nSubárbol ({cobertura['cargos']} cargos): {cobertura['kpis']} KPIs, "
+                    f"peso acumulado {cobertura['peso_total']}%. Indicadores cubiertos: {indicadores_subarbol}"
+                )
+
             nodos.append(
                 Node(
                     id=summary_id,
@@ -668,7 +984,10 @@ def renderizar_organigrama():
                 edges.append(Edge(source=connector_id, target=child_node_id))
                 agregar_nodos_y_edges(hijo)
 
-        agregar_nodos_y_edges(arbol)
+        with tramo("nodos_y_aristas"):
+            # En un bosque (varias raíces) el nodo virtual que las agrupa no se dibuja
+            for raiz in arbol["children"] if arbol.get("bosque") else [arbol]:
+                agregar_nodos_y_edges(raiz)
         
         # Configuración del grafo
         config = Config(
@@ -683,23 +1002,22 @@ def renderizar_organigrama():
         )
         
         # Renderizar grafo y capturar click
-        selected_node = agraph(
-            nodes=nodos,
-            edges=edges,
-            config=config
-        )
+        with tramo("agraph"):
+            selected_node = agraph(
+                nodes=nodos,
+                edges=edges,
+                config=config
+            )
         
         # Si se hace clic en un nodo, guardar en session state
         if selected_node and selected_node.startswith("cargo_"):
             try:
                 cargo_id = int(selected_node.replace("cargo_", ""))
 
-                with closing(sql.connect(DB_NAME, timeout=30.0)) as conn:
+                with conectar_bd() as conn:
                     cursor = conn.cursor()
                     cursor.execute(
-                        """
-                        SELECT nombre_cargo FROM Cargos WHERE id_cargo = ?
-                        """,
+                        consulta("nombre_cargo_por_id"),
                         (cargo_id,),
                     )
                     resultado = cursor.fetchone()
@@ -722,9 +1040,93 @@ def renderizar_organigrama():
         nombre_cargo = st.session_state.nodo_seleccionado["nombre_cargo"]
         mostrar_panel_kpis(cargo_id, nombre_cargo)
 
+@trazado
+def guardar_cambios_kpis(df_base, df_editado, indicadores_dict, descripcion="Edición de KPIs"):
+    """Persiste en la BD las diferencias entre la tabla original de KPIs y la editada.
+
+    Cada cambio se anota en el diario en la misma transacción y la acción queda disponible para deshacer.
+    """
+    cambios = 0
+    grupo = nuevo_grupo_diario()
+
+    with conectar_bd() as conn:
+        conn.execute("PRAGMA foreign_keys = ON")
+        cursor = conn.cursor()
+
+        base_por_id = {
+            int(row["id_cargoKpi"]): row
+            for _, row in df_base.iterrows()
+            if row["id_cargoKpi"] is not None
+        }
+
+        # Recorrer cada fila del DataFrame editado
+        for _, row in df_editado.iterrows():
+            id_cargoKpi = int(row["id_cargoKpi"])
+            nuevo_peso = int(row["Peso (%)"])
+            nuevo_bloqueo = bool(row["Bloquear"])
+            marcar_eliminar = bool(row["Eliminar"])
+            indicador_seleccionado = row["Alineado a"]
+            nuevo_fk = indicadores_dict.get(indicador_seleccionado)
+            formula_actualizada = normalizar_texto(row["Fórmula"])
+
+            base_row = base_por_id.get(id_cargoKpi, {})
+            peso_original = int(base_row.get("Peso (%)", 0))
+            bloqueo_original = bool(base_row.get("Bloquear", False))
+            indicador_original_fk = base_row.get("fk_kpiEs")
+            formula_original = normalizar_texto(base_row.get("Fórmula"))
+
+            if marcar_eliminar:
+                cambios += eliminar_con_diario(cursor, grupo, descripcion, "CargosKpis", id_cargoKpi)
+            elif nuevo_peso != peso_original or nuevo_bloqueo != bloqueo_original:
+                cambios += actualizar_con_diario(
+                    cursor, grupo, descripcion, "CargosKpis", id_cargoKpi,
+                    {"peso_kpi": nuevo_peso, "peso_bloqueado": int(nuevo_bloqueo)},
+                )
+
+            if nuevo_fk != indicador_original_fk:
+                cambios += actualizar_con_diario(
+                    cursor, grupo, descripcion, "Kpis", int(base_row.get("id_kpi")), {"fk_kpiEs": nuevo_fk}
+                )
+
+            if formula_actualizada != formula_original:
+                cambios += actualizar_con_diario(
+                    cursor, grupo, descripcion, "Kpis", int(base_row.get("id_kpi")),
+                    {"formula_kpi": formula_actualizada or None},
+                )
+
+        if cambios:
+            registrar_cambio_bd(conn)
+            conn.commit()
+
+    if cambios:
+        registrar_accion_deshacible(grupo, descripcion)
+    return cambios
+
+def _kpis_para_contexto(cargo_id):
+    """KPIs del cargo como diccionarios (tabla del panel y contexto de MARIA)."""
+    return [
+        {
+            "id_cargoKpi": id_cargoKpi,
+            "nombre": nombre_kpi,
+            "formula": formula_kpi,
+            "peso": peso_kpi,
+            "id_kpi": id_kpi,
+            "indicador": indicador_nombre,
+            "fk_kpiEs": fk_indicador,
+            "bloqueado": bool(bloqueado),
+        }
+        for id_cargoKpi, nombre_kpi, formula_kpi, peso_kpi, id_kpi, indicador_nombre, fk_indicador, bloqueado
+        in obtener_kpis_cargo(cargo_id)
+    ]
+
+@trazado
 def mostrar_panel_kpis(cargo_id, nombre_cargo):
-    """Muestra panel editable de KPIs para un cargo en el sidebar"""
-    
+    """Muestra panel editable de KPIs para un cargo en el sidebar.
+
+    La tabla de KPIs, el chat con MARIA y el formulario de creación son fragmentos: interactuar con
+    ellos solo vuelve a ejecutar su parte del panel, no el organigrama. Las escrituras sí piden un
+    rerun completo para que el organigrama refleje los cambios.
+    """
     with st.sidebar:
         st.markdown(f"### 📊 KPIs de {nombre_cargo}")
         
@@ -732,629 +1134,687 @@ def mostrar_panel_kpis(cargo_id, nombre_cargo):
         if st.button("✕ Cerrar Panel", key=f"close_panel_{cargo_id}"):
             st.session_state.nodo_seleccionado = None
             st.rerun()
-        
-        st.divider()
-        
-        with closing(sql.connect(DB_NAME, timeout=30.0)) as conn:
-            cursor = conn.cursor()
-            
-            # Obtener KPIs asignados al cargo
-            cursor.execute("""
-            SELECT ck.id_cargoKpi,
-                   k.nombre_kpi,
-                   k.formula_kpi,
-                   ck.peso_kpi,
-                   k.id_kpi,
-                   ies.nombre_kpiEs,
-                   k.fk_kpiEs
-            FROM CargosKpis ck
-            JOIN Kpis k ON ck.fk_kpi = k.id_kpi
-            LEFT JOIN IndicadoresEstrategicos ies ON k.fk_kpiEs = ies.id_kpiEs
-            WHERE ck.fk_cargo = ?
-            ORDER BY k.nombre_kpi
-            """, (cargo_id,))
-            kpis_cargo = cursor.fetchall()
-            kpis_para_contexto = [
-                {
-                    "id_cargoKpi": id_cargoKpi,
-                    "nombre": nombre_kpi,
-                    "formula": formula_kpi,
-                    "peso": peso_kpi,
-                    "id_kpi": id_kpi,
-                    "indicador": indicador_nombre,
-                    "fk_kpiEs": fk_indicador
-                }
-                for id_cargoKpi, nombre_kpi, formula_kpi, peso_kpi, id_kpi, indicador_nombre, fk_indicador in kpis_cargo
-            ]
-            
-            # Obtener indicadores estrategicos disponibles
-            cursor.execute("""
-            SELECT id_kpiEs, nombre_kpiEs
-            FROM IndicadoresEstrategicos
-            ORDER BY nombre_kpiEs
-            """)
-            indicadores_estrategicos = cursor.fetchall()
-        
-        indicadores_opciones = ["-- Sin indicador --"] + [nombre for _, nombre in indicadores_estrategicos]
-        indicadores_dict = {"-- Sin indicador --": None}
-        indicadores_dict.update({nombre: id_kpiEs for id_kpiEs, nombre in indicadores_estrategicos})
-
-        # Crear DataFrame editable con opcion de eliminar
-        if kpis_para_contexto:
-            datos = []
-            for item in kpis_para_contexto:
-                indicador_display = item["indicador"] if item["indicador"] else "-- Sin indicador --"
-                datos.append({
-                    "KPI": item["nombre"],
-                    "Alineado a": indicador_display,
-                    "Fórmula": normalizar_texto(item.get("formula")),
-                    "Peso (%)": int(item["peso"]) if item["peso"] else 0,
-                    "Eliminar": False,
-                    "id_cargoKpi": item["id_cargoKpi"],
-                    "id_kpi": item["id_kpi"],
-                    "fk_kpiEs": item["fk_kpiEs"],
-                    "es_total": False,
-                })
-
-            df_kpis = pd.DataFrame(datos)
-
-            st.markdown("**KPIs Asignados:**")
-            st.caption(f"KPIs cargados: {len(df_kpis)}")
 
-            df_editado = st.data_editor(
-                df_kpis,
-                use_container_width=True,
-                height=min(400, 35 * (len(df_kpis) + 1)),
-                key=f"editor_kpis_{cargo_id}",
-                hide_index=True,
-                column_order=[
-                    "KPI",
-                    "Fórmula",
-                    "Alineado a",
-                    "Peso (%)",
-                    "Eliminar",
-                ],
-                column_config={
-                    "Alineado a": st.column_config.SelectboxColumn(
-                        "Alineado a",
-                        options=indicadores_opciones,
-                        default="-- Sin indicador --"
+        # Cadena de mando hasta la raíz y subárbol del cargo, leídos de la tabla de clausura
+        cadena = obtener_cadena_de_mando(cargo_id)
+        if cadena:
+            st.caption("Reporta a: " + " → ".join(nombre for _, nombre, _ in cadena))
+        subordinados = obtener_subordinados(cargo_id)
+        if subordinados:
+            with st.expander(f"Subordinados ({len(subordinados)})"):
+                st.dataframe(
+                    pd.DataFrame(
+                        [(nombre, profundidad) for _, nombre, profundidad in subordinados],
+                        columns=["Cargo", "Nivel bajo el cargo"],
                     ),
-                    "Fórmula": st.column_config.TextColumn(
-                        "Fórmula",
-                        width="medium",
-                        help="Describe cómo se calcula este KPI."
-                    ),
-                    # Ocultar columnas de control que no deben ser visibles
-                    "id_cargoKpi": None,
-                    "id_kpi": None,
-                    "fk_kpiEs": None,
-                    "es_total": None,
-                },
-            )
-
-            # Crear y mostrar la fila de total por separado (no editable)
-            pesos = pd.to_numeric(df_editado["Peso (%)"], errors="coerce").fillna(0)
-            total_peso = float(pesos.sum())
-            
-            # Usar st.columns para crear una fila de total sin encabezados
-            # Esto es más robusto que usar CSS.
-            st.markdown(
-                """<hr style="margin-top: -0.5rem; margin-bottom: 0.5rem;">""",
-                unsafe_allow_html=True,
-            )
-            total_cols = st.columns([0.28, 0.23, 0.23, 0.16, 0.1])
-            with total_cols[0]:
-                st.markdown("**Total de los Pesos**")
-            with total_cols[3]:
-                st.markdown(f"**{total_peso:.0f}%**")
-            
+                    hide_index=True,
+                    use_container_width=True,
+                )
 
-            # La validación y el botón de guardar ahora usan el df_editado directamente
-            df_editable = df_editado
-            pesos_validos = abs(total_peso - 100.0) < 1e-6
+        _fragmento_tabla_kpis(cargo_id, nombre_cargo)
+        _fragmento_maria(cargo_id, nombre_cargo)
+        _fragmento_crear_kpi(cargo_id, nombre_cargo)
+
+@st.fragment
+@trazar_fragmento
+def _fragmento_tabla_kpis(cargo_id, nombre_cargo):
+    """Deshacer/rehacer, cobertura del subárbol, tabla editable de KPIs y rebalanceo."""
+    # Deshacer / rehacer las ediciones de KPIs de esta sesión
+    pila_deshacer = st.session_state.get("diario_deshacer") or []
+    pila_rehacer = st.session_state.get("diario_rehacer") or []
+    col_deshacer, col_rehacer = st.columns(2)
+    with col_deshacer:
+        deshacer = st.button(
+            "↩️ Deshacer",
+            key=f"deshacer_kpis_{cargo_id}",
+            use_container_width=True,
+            disabled=not pila_deshacer,
+            help=pila_deshacer[-1][1] if pila_deshacer else None,
+        )
+    with col_rehacer:
+        rehacer = st.button(
+            "↪️ Rehacer",
+            key=f"rehacer_kpis_{cargo_id}",
+            use_container_width=True,
+            disabled=not pila_rehacer,
+            help=pila_rehacer[-1][1] if pila_rehacer else None,
+        )
+    if deshacer or rehacer:
+        try:
+            descripcion = deshacer_cambio() if deshacer else rehacer_cambio()
+            st.session_state.pop(f"editor_kpis_{cargo_id}", None)
+            notificar(f"{'Deshecho' if deshacer else 'Rehecho'}: {descripcion}")
+            st.rerun()
+        except ValueError as e:
+            st.error(str(e))
 
-            st.caption(f"Total de pesos asignados: {total_peso:.0f}% (debe sumar 100%)")
-            if not pesos_validos:
-                st.warning("Ajusta los pesos hasta alcanzar exactamente el 100% para poder guardar.")
+    st.divider()
 
-            # Boton para guardar cambios
-            if st.button(
-                "Guardar Cambios",
-                key=f"save_kpis_{cargo_id}",
-                use_container_width=True,
-                disabled=not pesos_validos,
-            ):
-                try:
-                    cambios = 0
+    # KPIs asignados al cargo e indicadores estratégicos disponibles (cacheados por revisión)
+    kpis_para_contexto = _kpis_para_contexto(cargo_id)
+    indicadores_estrategicos = obtener_indicadores_estrategicos()
 
-                    with closing(sql.connect(DB_NAME, timeout=30.0)) as conn:
-                        conn.execute("PRAGMA foreign_keys = ON")
-                        cursor = conn.cursor()
+    cobertura = obtener_rollup_kpis().get(cargo_id)
+    if cobertura and cobertura["cargos"] > 1:
+        nombres_por_id = dict(indicadores_estrategicos)
+        st.caption(
+            f"Subárbol: {cobertura['cargos']} cargos · {cobertura['kpis']} KPIs · "
+            f"{len(cobertura['indicadores'])} de {len(indicadores_estrategicos)} indicadores estratégicos cubiertos"
+        )
+        if cobertura["indicadores"]:
+            with st.expander("Indicadores cubiertos por el subárbol"):
+                for id_kpiEs in cobertura["indicadores"]:
+                    st.write(f"• {nombres_por_id.get(id_kpiEs, id_kpiEs)}")
+
+    indicadores_opciones = ["-- Sin indicador --"] + [nombre for _, nombre in indicadores_estrategicos]
+    indicadores_dict = {"-- Sin indicador --": None}
+    indicadores_dict.update({nombre: id_kpiEs for id_kpiEs, nombre in indicadores_estrategicos})
+
+    # Crear DataFrame editable con opcion de eliminar
+    if kpis_para_contexto:
+        datos = []
+        for item in kpis_para_contexto:
+            indicador_display = item["indicador"] if item["indicador"] else "-- Sin indicador --"
+            datos.append({
+                "KPI": item["nombre"],
+                "Alineado a": indicador_display,
+                "Fórmula": normalizar_texto(item.get("formula")),
+                "Peso (%)": int(item["peso"]) if item["peso"] else 0,
+                "Bloquear": item["bloqueado"],
+                "Eliminar": False,
+                "id_cargoKpi": item["id_cargoKpi"],
+                "id_kpi": item["id_kpi"],
+                "fk_kpiEs": item["fk_kpiEs"],
+                "es_total": False,
+            })
+
+        df_kpis = pd.DataFrame(datos)
+
+        st.markdown("**KPIs Asignados:**")
+        st.caption(f"KPIs cargados: {len(df_kpis)}")
+
+        df_editado = st.data_editor(
+            df_kpis,
+            use_container_width=True,
+            height=min(400, 35 * (len(df_kpis) + 1)),
+            key=f"editor_kpis_{cargo_id}",
+            hide_index=True,
+            column_order=[
+                "KPI",
+                "Fórmula",
+                "Alineado a",
+                "Peso (%)",
+                "Bloquear",
+                "Eliminar",
+            ],
+            column_config={
+                "Alineado a": st.column_config.SelectboxColumn(
+                    "Alineado a",
+                    options=indicadores_opciones,
+                    default="-- Sin indicador --"
+                ),
+                "Fórmula": st.column_config.TextColumn(
+                    "Fórmula",
+                    width="medium",
+                    help="Describe cómo se calcula este KPI."
+                ),
+                "Bloquear": st.column_config.CheckboxColumn(
+                    "Bloquear",
+                    help="El rebalanceo automático no modifica el peso de las filas bloqueadas."
+                ),
+                # Ocultar columnas de control que no deben ser visibles
+                "id_cargoKpi": None,
+                "id_kpi": None,
+                "fk_kpiEs": None,
+                "es_total": None,
+            },
+        )
 
-                        base_por_id = {
-                            int(row["id_cargoKpi"]): row
-                            for _, row in df_kpis.iterrows()
-                            if row["id_cargoKpi"] is not None
-                        }
+        # Crear y mostrar la fila de total por separado (no editable)
+        pesos = pd.to_numeric(df_editado["Peso (%)"], errors="coerce").fillna(0)
+        total_peso = float(pesos.sum())
 
-                        # Recorrer cada fila del DataFrame editado
-                        for _, row in df_editable.iterrows():
-                            id_cargoKpi = int(row["id_cargoKpi"])
-                            nuevo_peso = int(row["Peso (%)"])
-                            marcar_eliminar = bool(row["Eliminar"])
-                            indicador_seleccionado = row["Alineado a"]
-                            nuevo_fk = indicadores_dict.get(indicador_seleccionado)
-                            formula_actualizada = normalizar_texto(row["Fórmula"])
-
-                            base_row = base_por_id.get(id_cargoKpi, {})
-                            peso_original = int(base_row.get("Peso (%)", 0))
-                            indicador_original_fk = base_row.get("fk_kpiEs")
-                            formula_original = normalizar_texto(base_row.get("Fórmula"))
-
-                            if marcar_eliminar:
-                                cursor.execute("""
-                                DELETE FROM CargosKpis
-                                WHERE id_cargoKpi = ?
-                                """, (id_cargoKpi,))
-                                cambios += cursor.rowcount
-                            elif nuevo_peso != peso_original:
-                                cursor.execute("""
-                                UPDATE CargosKpis
-                                SET peso_kpi = ?
-                                WHERE id_cargoKpi = ?
-                                """, (nuevo_peso, id_cargoKpi))
-                                cambios += cursor.rowcount
-
-                            if nuevo_fk != indicador_original_fk:
-                                cursor.execute("""
-                                UPDATE Kpis
-                                SET fk_kpiEs = ?
-                                WHERE id_kpi = ?
-                                """, (nuevo_fk, int(base_row.get("id_kpi"))))
-                                cambios += cursor.rowcount
-
-                            if formula_actualizada != formula_original:
-                                cursor.execute("""
-                                UPDATE Kpis
-                                SET formula_kpi = ?
-                                WHERE id_kpi = ?
-                                """, (formula_actualizada or None, int(base_row.get("id_kpi"))))
-                                cambios += cursor.rowcount
+        # Usar st.columns para crear una fila de total sin encabezados
+        # Esto es más robusto que usar CSS.
+        st.markdown(
+            """<hr style="margin-top: -0.5rem; margin-bottom: 0.5rem;">""",
+            unsafe_allow_html=True,
+        )
+        total_cols = st.columns([0.28, 0.23, 0.23, 0.16, 0.1])
+        with total_cols[0]:
+            st.markdown("**Total de los Pesos**")
+        with total_cols[3]:
+            st.markdown(f"**{total_peso:.0f}%**")
+
+
+        # La validación y el botón de guardar ahora usan el df_editado directamente
+        df_editable = df_editado
+        pesos_validos = abs(total_peso - 100.0) < 1e-6
+
+        st.caption(f"Total de pesos asignados: {total_peso:.0f}% (debe sumar 100%)")
+        if not pesos_validos:
+            st.warning("Ajusta los pesos hasta alcanzar exactamente el 100% para poder guardar.")
+
+        # Boton para guardar cambios
+        if st.button(
+            "Guardar Cambios",
+            key=f"save_kpis_{cargo_id}",
+            use_container_width=True,
+            disabled=not pesos_validos,
+        ):
+            try:
+                cambios = guardar_cambios_kpis(
+                    df_kpis, df_editable, indicadores_dict, descripcion=f"Edición de KPIs de {nombre_cargo}"
+                )
+                notificar(f"{cambios} cambio(s) guardado(s)")
+                st.rerun()
 
-                        conn.commit()
+            except Exception as e:
+                st.error(f"Error: {str(e)}")
+                import traceback
+                st.code(traceback.format_exc())
+
+        # Rebalanceo automático de pesos a 100%
+        col_reb1, col_reb2 = st.columns(2)
+        with col_reb1:
+            rebalancear_cargo = st.button(
+                "⚖️ Rebalancear y guardar",
+                key=f"rebalance_kpis_{cargo_id}",
+                use_container_width=True,
+                help="Ajusta proporcionalmente los pesos no bloqueados de la tabla para sumar 100% y guarda los cambios.",
+            )
+        with col_reb2:
+            rebalancear_subarbol = st.button(
+                "⚖️ Rebalancear subárbol",
+                key=f"rebalance_subtree_{cargo_id}",
+                use_container_width=True,
+                help="Aplica el rebalanceo a los pesos guardados de este cargo y de todos sus subordinados.",
+            )
 
-                    st.success(f"{cambios} cambio(s) guardado(s)")
-                    time.sleep(1)
+        if rebalancear_cargo:
+            activos = df_editable[~df_editable["Eliminar"].astype(bool)]
+            nuevos, conflictos = calcular_rebalanceo_pesos(
+                pd.DataFrame({
+                    "fk_cargo": cargo_id,
+                    "peso": activos["Peso (%)"],
+                    "bloqueado": activos["Bloquear"],
+                })
+            )
+            if conflictos:
+                st.error("Los pesos bloqueados impiden sumar 100%. Desbloquea alguna fila e inténtalo de nuevo.")
+            else:
+                try:
+                    df_rebalanceado = df_editable.copy()
+                    df_rebalanceado.loc[nuevos.index, "Peso (%)"] = nuevos
+                    cambios = guardar_cambios_kpis(
+                        df_kpis, df_rebalanceado, indicadores_dict, descripcion=f"Rebalanceo de {nombre_cargo}"
+                    )
+                    st.session_state.pop(f"editor_kpis_{cargo_id}", None)
+                    notificar(f"Pesos rebalanceados: {cambios} cambio(s) guardado(s)")
                     st.rerun()
-
                 except Exception as e:
                     st.error(f"Error: {str(e)}")
-                    import traceback
-                    st.code(traceback.format_exc())
 
-        else:
-            st.info("Este cargo aún no tiene KPIs asignados. Puedes crearlos a continuación.")
-
-        st.divider()
-        st.markdown("### 🤖 MARIA · Agente IA de KPIs")
+        if rebalancear_subarbol:
+            try:
+                crear_snapshot("rebalanceo subarbol")
+                resumen = rebalancear_pesos_kpis(
+                    cargo_id, incluir_subarbol=True, descripcion_diario=f"Rebalanceo del subárbol de {nombre_cargo}"
+                )
+                st.session_state.pop(f"editor_kpis_{cargo_id}", None)
+                notificar(f"{resumen['actualizados']} peso(s) ajustado(s) en {resumen['cargos']} cargo(s) con KPIs")
+                if resumen["conflictos"]:
+                    notificar(
+                        f"{len(resumen['conflictos'])} cargo(s) no se pudieron cuadrar por sus pesos bloqueados.",
+                        "warning",
+                    )
+                st.rerun()
+            except Exception as e:
+                st.error(f"Error: {str(e)}")
 
-        history_key = f"maria_history_{cargo_id}"
-        if history_key not in st.session_state:
-            st.session_state[history_key] = [
-                {
-                    "role": "assistant",
-                    "content": f"Hola, soy MARIA. Dime qué KPIs necesitas para {nombre_cargo} y te sugeriré opciones alineadas a la estrategia.",
-                }
-            ]
+    else:
+        st.info("Este cargo aún no tiene KPIs asignados. Puedes crearlos a continuación.")
 
-        for msg in st.session_state[history_key]:
-            with st.chat_message("assistant" if msg["role"] == "assistant" else "user"):
-                st.markdown(msg["content"])
-                if msg.get("table"):
-                    st.table(pd.DataFrame(msg["table"]))
+@st.fragment
+@trazar_fragmento
+def _fragmento_maria(cargo_id, nombre_cargo):
+    """Chat con MARIA; escribir o preguntar solo vuelve a ejecutar este fragmento."""
+    kpis_para_contexto = _kpis_para_contexto(cargo_id)
+    indicadores_estrategicos = obtener_indicadores_estrategicos()
 
-        if llm is None:
-            st.info("Configura tu `OPENAI_API_KEY` en `st.secrets` e instala `langchain-openai` para habilitar a MARIA.")
-        else:
-            prompt_key = f"maria_prompt_{cargo_id}"
-            clear_flag_key = f"{prompt_key}_clear"
-            if prompt_key not in st.session_state:
-                st.session_state[prompt_key] = ""
-            if st.session_state.get(clear_flag_key):
-                st.session_state[prompt_key] = ""
-                st.session_state[clear_flag_key] = False
-            user_prompt = st.text_area(
-                "Descríbele a MARIA qué necesitas (contexto adicional, metas, dudas, etc.)",
-                key=prompt_key,
-                height=100,
-            )
-            cantidad_key = f"maria_kpi_count_{cargo_id}"
-            num_kpis = st.slider(
-                "Cantidad de KPIs que deseas que MARIA sugiera",
-                min_value=1,
-                max_value=10,
-                value=3,
-                key=cantidad_key,
-                help="MARIA intentará no superar este número, manteniendo coherencia estratégica."
-            )
-            if st.button("Preguntar a MARIA", key=f"maria_ask_{cargo_id}", use_container_width=True):
-                if not user_prompt.strip():
-                    st.warning("Escribe una solicitud para MARIA.")
-                else:
-                    st.session_state[history_key].append({"role": "user", "content": user_prompt})
-                    mensaje, tabla = generar_kpis_con_maria(
-                        nombre_cargo,
-                        user_prompt,
-                        [
-                            {
-                                "nombre": item["nombre"],
-                                "peso": item["peso"],
-                                "indicador": item["indicador"],
-                            }
-                            for item in kpis_para_contexto
-                        ],
-                        [nombre for _, nombre in indicadores_estrategicos],
-                        max_kpis=num_kpis,
-                    )
-                    registro = {"role": "assistant", "content": mensaje}
-                    if tabla is not None and not tabla.empty:
-                        registro["table"] = tabla.to_dict("records")
-                    st.session_state[history_key].append(registro)
-                    st.session_state[clear_flag_key] = True
-                    st.rerun()
-        nuevo_nombre = st.text_input(
-            "Nombre o Descripcion",
-            placeholder="Ej: Tasa de conversion",
-            key=f"nuevo_kpi_nombre_{cargo_id}"
-        )
-        
-        nuevo_peso = st.number_input(
-            "Peso (%)",
-            min_value=0,
-            max_value=100,
-            value=0,
-            key=f"nuevo_kpi_peso_{cargo_id}"
-        )
-        nuevo_formula = st.text_area(
-            "Fórmula (opcional)",
-            placeholder="Ej: (Ventas nuevas / Ventas totales)",
-            key=f"nuevo_kpi_formula_{cargo_id}",
-            height=80,
+    st.divider()
+    st.markdown("### 🤖 MARIA · Agente IA de KPIs")
+
+    history_key = f"maria_history_{cargo_id}"
+    if history_key not in st.session_state:
+        st.session_state[history_key] = [
+            {
+                "role": "assistant",
+                "content": f"Hola, soy MARIA. Dime qué KPIs necesitas para {nombre_cargo} y te sugeriré opciones alineadas a la estrategia.",
+            }
+        ]
+
+    for msg in st.session_state[history_key]:
+        with st.chat_message("assistant" if msg["role"] == "assistant" else "user"):
+            st.markdown(msg["content"])
+            if msg.get("table"):
+                st.table(pd.DataFrame(msg["table"]))
+
+    if not maria_configurada():
+        st.info("Configura tu `OPENAI_API_KEY` en `st.secrets` e instala `langchain-openai` para habilitar a MARIA.")
+    else:
+        prompt_key = f"maria_prompt_{cargo_id}"
+        clear_flag_key = f"{prompt_key}_clear"
+        if prompt_key not in st.session_state:
+            st.session_state[prompt_key] = ""
+        if st.session_state.get(clear_flag_key):
+            st.session_state[prompt_key] = ""
+            st.session_state[clear_flag_key] = False
+        user_prompt = st.text_area(
+            "Descríbele a MARIA qué necesitas (contexto adicional, metas, dudas, etc.)",
+            key=prompt_key,
+            height=100,
         )
-        
-        opciones_indicadores = ["-- Seleccionar --"] + [nombre for _, nombre in indicadores_estrategicos]
-        indicador_seleccionado = st.selectbox(
-            "Alineado a (Indicador Estrategico)",
-            options=opciones_indicadores,
-            key=f"indicador_kpi_{cargo_id}"
+        cantidad_key = f"maria_kpi_count_{cargo_id}"
+        num_kpis = st.slider(
+            "Cantidad de KPIs que deseas que MARIA sugiera",
+            min_value=1,
+            max_value=10,
+            value=3,
+            key=cantidad_key,
+            help="MARIA intentará no superar este número, manteniendo coherencia estratégica."
         )
-        
-        if st.button("[+] Crear KPI", key=f"add_kpi_{cargo_id}", use_container_width=True):
-            nombre_limpio = nuevo_nombre.strip()
-            formula_limpia = nuevo_formula.strip()
-            if not nombre_limpio:
-                st.error("Ingresa un nombre para el KPI")
-            elif indicador_seleccionado == "-- Seleccionar --":
-                st.error("Selecciona el indicador estrategico al que se alinea")
+        if st.button("Preguntar a MARIA", key=f"maria_ask_{cargo_id}", use_container_width=True):
+            if not user_prompt.strip():
+                st.warning("Escribe una solicitud para MARIA.")
             else:
-                try:
-                    with closing(sql.connect(DB_NAME, timeout=30.0)) as conn:
-                        conn.execute("PRAGMA foreign_keys = ON")
-                        cursor = conn.cursor()
-                        
-                        id_indicador = next(
-                            (id_kpiEs for id_kpiEs, nombre in indicadores_estrategicos if nombre == indicador_seleccionado),
-                            None
-                        )
-                        
-                        if id_indicador is None:
-                            st.error("No se encontro el indicador seleccionado")
-                        else:
-                            try:
-                                cursor.execute("""
-                                INSERT INTO Kpis (nombre_kpi, formula_kpi, fk_kpiEs)
-                                VALUES (?, ?, ?)
-                                """, (nombre_limpio, formula_limpia or None, id_indicador))
-                                id_kpi = cursor.lastrowid
-                            except sql.IntegrityError:
-                                cursor.execute("""
-                                SELECT id_kpi FROM Kpis WHERE nombre_kpi = ?
-                                """, (nombre_limpio,))
-                                registro = cursor.fetchone()
-                                if not registro:
-                                    raise
-                                id_kpi = registro[0]
-                                if formula_limpia:
-                                    cursor.execute("""
-                                    UPDATE Kpis
-                                    SET formula_kpi = ?
-                                    WHERE id_kpi = ?
-                                    """, (formula_limpia, id_kpi))
-                            
-                            cursor.execute("""
-                            INSERT INTO CargosKpis (fk_cargo, fk_kpi, peso_kpi)
-                            VALUES (?, ?, ?)
-                            """, (cargo_id, id_kpi, int(nuevo_peso)))
-                            
-                            conn.commit()
-                    
-                    st.success("KPI creado y asignado!")
-                    time.sleep(1)
-                    st.rerun()
-                
-                except Exception as e:
-                    st.error(f"Error al crear KPI: {str(e)}")
-
-def sincronizar_nuevos_kpis(df):
-    """Inserta en la BD los KPIs del archivo que aún no existen."""
-    columnas_fuente = list(df.columns)
-    col_indicador = buscar_columna_por_nombre(columnas_fuente, "Indicador")
+                st.session_state[history_key].append({"role": "user", "content": user_prompt})
+                mensaje, tabla = generar_kpis_con_maria(
+                    nombre_cargo,
+                    user_prompt,
+                    [
+                        {
+                            "nombre": item["nombre"],
+                            "peso": item["peso"],
+                            "indicador": item["indicador"],
+                        }
+                        for item in kpis_para_contexto
+                    ],
+                    [nombre for _, nombre in indicadores_estrategicos],
+                    max_kpis=num_kpis,
+                )
+                registro = {"role": "assistant", "content": mensaje}
+                if tabla is not None and not tabla.empty:
+                    registro["table"] = tabla.to_dict("records")
+                st.session_state[history_key].append(registro)
+                st.session_state[clear_flag_key] = True
+                st.rerun(scope="fragment")
+
+@st.fragment
+@trazar_fragmento
+def _fragmento_crear_kpi(cargo_id, nombre_cargo):
+    """Formulario para crear un KPI y asignarlo al cargo."""
+    indicadores_estrategicos = obtener_indicadores_estrategicos()
+
+    nuevo_nombre = st.text_input(
+        "Nombre o Descripcion",
+        placeholder="Ej: Tasa de conversion",
+        key=f"nuevo_kpi_nombre_{cargo_id}"
+    )
 
-    if not col_indicador:
-        st.warning("No se encontró la columna 'Indicador' en el archivo. No se sincronizaron KPIs.")
-        return
+    nuevo_peso = st.number_input(
+        "Peso (%)",
+        min_value=0,
+        max_value=100,
+        value=0,
+        key=f"nuevo_kpi_peso_{cargo_id}"
+    )
+    nuevo_formula = st.text_area(
+        "Fórmula (opcional)",
+        placeholder="Ej: (Ventas nuevas / Ventas totales)",
+        key=f"nuevo_kpi_formula_{cargo_id}",
+        height=80,
+    )
 
-    col_formula = buscar_columna_por_nombre(columnas_fuente, "Fórmula")
-    col_alineado_archivo = buscar_columna_por_nombre(columnas_fuente, "Alineado (archivo)")
+    opciones_indicadores = ["-- Seleccionar --"] + [nombre for _, nombre in indicadores_estrategicos]
+    indicador_seleccionado = st.selectbox(
+        "Alineado a (Indicador Estrategico)",
+        options=opciones_indicadores,
+        key=f"indicador_kpi_{cargo_id}"
+    )
 
-    with closing(sql.connect(DB_NAME, timeout=30.0)) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT nombre_kpi FROM Kpis")
-        existentes = {normalizar_texto(row[0]).lower() for row in cursor.fetchall() if row[0]}
-        nuevos = 0
+    if st.button("[+] Crear KPI", key=f"add_kpi_{cargo_id}", use_container_width=True):
+        nombre_limpio = nuevo_nombre.strip()
+        formula_limpia = nuevo_formula.strip()
+        if not nombre_limpio:
+            st.error("Ingresa un nombre para el KPI")
+        elif indicador_seleccionado == "-- Seleccionar --":
+            st.error("Selecciona el indicador estrategico al que se alinea")
+        else:
+            try:
+                with conectar_bd() as conn:
+                    conn.execute("PRAGMA foreign_keys = ON")
+                    cursor = conn.cursor()
 
-        for _, row in df.iterrows():
-            indicador = normalizar_texto(row.get(col_indicador, "")) if col_indicador else ""
-            if not indicador or indicador.lower() in existentes:
-                continue
+                    id_indicador = next(
+                        (id_kpiEs for id_kpiEs, nombre in indicadores_estrategicos if nombre == indicador_seleccionado),
+                        None
+                    )
 
-            formula_val = normalizar_texto(row.get(col_formula, "")) if col_formula else ""
-            formula_db = formula_val or None
+                    if id_indicador is None:
+                        st.error("No se encontro el indicador seleccionado")
+                    else:
+                        grupo = nuevo_grupo_diario()
+                        descripcion = f"Crear KPI {nombre_limpio} en {nombre_cargo}"
+                        try:
+                            id_kpi = insertar_con_diario(cursor, grupo, descripcion, "Kpis", {
+                                "nombre_kpi": nombre_limpio,
+                                "formula_kpi": formula_limpia or None,
+                                "fk_kpiEs": id_indicador,
+                            })
+                        except sql.IntegrityError:
+                            cursor.execute(consulta("id_kpi_por_nombre"), (nombre_limpio,))
+                            registro = cursor.fetchone()
+                            if not registro:
+                                raise
+                            id_kpi = registro[0]
+                            if formula_limpia:
+                                actualizar_con_diario(
+                                    cursor, grupo, descripcion, "Kpis", id_kpi, {"formula_kpi": formula_limpia}
+                                )
+
+                        insertar_con_diario(cursor, grupo, descripcion, "CargosKpis", {
+                            "fk_cargo": int(cargo_id),
+                            "fk_kpi": id_kpi,
+                            "peso_kpi": int(nuevo_peso),
+                        })
+
+                        registrar_cambio_bd(conn)
+                        conn.commit()
+                        registrar_accion_deshacible(grupo, descripcion)
 
-            fk_kpiEs = None
-            if col_alineado_archivo:
-                alineado = normalizar_texto(row.get(col_alineado_archivo, ""))
-                if alineado:
-                    cursor.execute(
-                        "INSERT OR IGNORE INTO IndicadoresEstrategicos (nombre_kpiEs) VALUES (?)",
-                        (alineado,),
-                    )
-                    cursor.execute(
-                        "SELECT id_kpiEs FROM IndicadoresEstrategicos WHERE nombre_kpiEs = ?",
-                        (alineado,),
-                    )
-                    resultado = cursor.fetchone()
-                    if resultado:
-                        fk_kpiEs = resultado[0]
-
-            cursor.execute(
-                """
-                INSERT INTO Kpis (nombre_kpi, formula_kpi, fk_kpiEs)
-                VALUES (?, ?, ?)
-                """,
-                (indicador, formula_db, fk_kpiEs),
-            )
-            existentes.add(indicador.lower())
-            nuevos += 1
+                notificar("KPI creado y asignado")
+                st.rerun()
 
-        conn.commit()
+            except Exception as e:
+                st.error(f"Error al crear KPI: {str(e)}")
+
+@trazado
+def construir_mapa_cascada():
+    """Construye el índice de alineación de cada indicador estratégico con sus KPIs y cargos en una sola consulta."""
+    with conectar_bd() as conn:
+        df = pd.read_sql_query(
+            consulta("mapa_cascada"),
+            conn,
+        )
 
-    if nuevos:
-        st.success(f"Se sincronizaron {nuevos} KPI(s) nuevos desde el archivo.")
-
-
-def generar_df_hoja3(df_fuente=None):
-    """Genera el DataFrame requerido para la Archivo Actualizado a partir de la base de datos."""
-
-    columnas = [
-        "Indicador",
-        "Fórmula",
-        "Frecuencia",
-        "Fuente",
-        "Responsable",
-        "Meta",
-        "Sentido",
-        "Área",
-        "Departamento",
-        "Cargo",
-        "Responde al Cargo",
-        "Nivel Jerárquico",
-        "Alineado a",
-        "Observaciones",
-        "Alineado (archivo)",
-        "Peso",
-    ]
+    indicadores = {}
+    for (id_kpiEs, nombre), grupo in df.groupby(["id_kpiEs", "nombre_kpiEs"], sort=False):
+        asignados = grupo.dropna(subset=["id_cargo"])
+        profundidades = asignados.drop_duplicates("id_cargo")["profundidad"].dropna().astype(int)
+        indicadores[int(id_kpiEs)] = {
+            "id_kpiEs": int(id_kpiEs),
+            "nombre": nombre,
+            "kpis": int(grupo["id_kpi"].nunique()),
+            "cargos": int(asignados["id_cargo"].nunique()),
+            "cargos_en_cascada": int((profundidades > 0).sum()),
+            "profundidad_min": int(profundidades.min()) if not profundidades.empty else None,
+            "profundidad_max": int(profundidades.max()) if not profundidades.empty else None,
+            "profundidad_media": round(float(profundidades.mean()), 2) if not profundidades.empty else None,
+            "cargos_por_nivel": {int(nivel): int(total) for nivel, total in profundidades.value_counts().sort_index().items()},
+            "detalle": asignados[["id_cargo", "nombre_cargo", "nombre_kpi", "profundidad"]]
+            .rename(columns={"nombre_cargo": "Cargo", "nombre_kpi": "KPI", "profundidad": "Profundidad"})
+            .reset_index(drop=True),
+        }
 
-    extra_campos = [
-        "Frecuencia",
-        "Fuente",
-        "Responsable",
-        "Meta",
-        "Sentido",
-        "Área",
-        "Departamento",
-        "Alineado a",
-        "Observaciones",
+    # Huérfanos: indicadores sin KPIs alineados por debajo de la raíz
+    huerfanos = [
+        {"id_kpiEs": item["id_kpiEs"], "nombre": item["nombre"], "kpis": item["kpis"]}
+        for item in indicadores.values()
+        if item["cargos_en_cascada"] == 0
     ]
+    return {"indicadores": indicadores, "huerfanos": huerfanos}
+
+@cache_por_revision
+def obtener_mapa_cascada():
+    """Devuelve el mapa de cascada de indicadores estratégicos, recalculándolo solo si la BD cambió."""
+    return construir_mapa_cascada()
+
+@trazado
+def mostrar_cascada_estrategica():
+    """Muestra cómo se despliega cada indicador estratégico a través de los KPIs y cargos de la organización."""
+    mapa = obtener_mapa_cascada()
+    indicadores = mapa["indicadores"]
+    if not indicadores:
+        st.info("No hay indicadores estratégicos registrados en la base de datos.")
+        return
 
-    extra_map = {}
-    if df_fuente is not None and not df_fuente.empty:
-        columnas_fuente = list(df_fuente.columns)
-        col_indicador = buscar_columna_por_nombre(columnas_fuente, "Indicador")
-        col_cargo = buscar_columna_por_nombre(columnas_fuente, "Cargo")
-        columnas_extra_renombradas = {
-            campo: buscar_columna_por_nombre(columnas_fuente, campo) for campo in extra_campos
+    if mapa["huerfanos"]:
+        st.warning(f"⚠️ {len(mapa['huerfanos'])} indicador(es) no se despliegan por debajo de la raíz.")
+        with st.expander("Indicadores huérfanos"):
+            st.dataframe(
+                pd.DataFrame(mapa["huerfanos"]).rename(columns={"nombre": "Indicador", "kpis": "KPIs alineados"}),
+                use_container_width=True,
+                hide_index=True,
+                column_config={"id_kpiEs": None},
+            )
+    else:
+        st.success("✅ Todos los indicadores estratégicos se despliegan en la organización.")
+
+    resumen = pd.DataFrame([
+        {
+            "Indicador": item["nombre"],
+            "KPIs": item["kpis"],
+            "Cargos": item["cargos"],
+            "Cargos bajo la raíz": item["cargos_en_cascada"],
+            "Prof. mín.": item["profundidad_min"],
+            "Prof. máx.": item["profundidad_max"],
+            "Prof. media": item["profundidad_media"],
         }
+        for item in indicadores.values()
+    ])
+    st.dataframe(resumen, use_container_width=True, hide_index=True)
+
+    opciones = {item["nombre"]: id_kpiEs for id_kpiEs, item in indicadores.items()}
+    seleccion = st.selectbox("Ver el despliegue de un indicador:", list(opciones.keys()), key="cascada_indicador")
+    detalle = indicadores[opciones[seleccion]]
+    if detalle["detalle"].empty:
+        st.info("Este indicador no tiene KPIs asignados a ningún cargo.")
+        return
 
-        if col_indicador:
-            for _, row in df_fuente.iterrows():
-                indicador_val = normalizar_texto(row.get(col_indicador, "")) if col_indicador else ""
-                if not indicador_val:
-                    continue
-
-                cargo_val = normalizar_texto(row.get(col_cargo, "")) if col_cargo else ""
-                key = (indicador_val, cargo_val)
-
-                if key not in extra_map:
-                    valores_extra = {}
-                    for campo, col_real in columnas_extra_renombradas.items():
-                        valor = ""
-                        if col_real:
-                            valor = normalizar_texto(row.get(col_real, ""))
-                        valores_extra[campo] = valor
-                    extra_map[key] = valores_extra
-
-                # Guardar versión sin cargo para fallback
-                key_simple = (indicador_val, "")
-                if key_simple not in extra_map:
-                    extra_map[key_simple] = extra_map[key].copy()
-
-    with closing(sql.connect(DB_NAME, timeout=30.0)) as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT
-                k.nombre_kpi,
-                k.formula_kpi,
-                ck.peso_kpi,
-                c.nombre_cargo,
-                jefe.nombre_cargo,
-                c.nivel_cargo,
-                ies.nombre_kpiEs
-            FROM Kpis k
-            LEFT JOIN CargosKpis ck ON ck.fk_kpi = k.id_kpi
-            LEFT JOIN Cargos c ON ck.fk_cargo = c.id_cargo
-            LEFT JOIN Cargos jefe ON c.fk_jefe = jefe.id_cargo
-            LEFT JOIN IndicadoresEstrategicos ies ON k.fk_kpiEs = ies.id_kpiEs
-            ORDER BY k.nombre_kpi, c.nombre_cargo
-            """
+    col_niveles, col_detalle = st.columns([1, 2])
+    with col_niveles:
+        st.markdown("**Cargos por nivel de profundidad**")
+        st.bar_chart(pd.Series(detalle["cargos_por_nivel"], name="Cargos"))
+    with col_detalle:
+        st.dataframe(
+            detalle["detalle"],
+            use_container_width=True,
+            hide_index=True,
+            column_config={"id_cargo": None},
         )
-        registros = cursor.fetchall()
-
-    data = []
-    for (
-        indicador,
-        formula,
-        peso,
-        cargo,
-        responde,
-        nivel,
-        alineado_archivo,
-    ) in registros:
-        indicador_norm = normalizar_texto(indicador)
-        cargo_norm = normalizar_texto(cargo)
-        extra_valores = extra_map.get((indicador_norm, cargo_norm)) or extra_map.get(
-            (indicador_norm, "")
-        ) or {}
-
-        fila = {
-            "Indicador": indicador_norm,
-            "Fórmula": normalizar_texto(formula),
-            "Frecuencia": extra_valores.get("Frecuencia", ""),
-            "Fuente": extra_valores.get("Fuente", ""),
-            "Responsable": extra_valores.get("Responsable", ""),
-            "Meta": extra_valores.get("Meta", ""),
-            "Sentido": extra_valores.get("Sentido", ""),
-            "Área": extra_valores.get("Área", ""),
-            "Departamento": extra_valores.get("Departamento", ""),
-            "Cargo": cargo_norm,
-            "Responde al Cargo": normalizar_texto(responde),
-            "Nivel Jerárquico": normalizar_texto(nivel),
-            "Alineado a": extra_valores.get("Alineado a", ""),
-            "Observaciones": extra_valores.get("Observaciones", ""),
-            "Alineado (archivo)": normalizar_texto(alineado_archivo),
-            "Peso": peso if peso is not None else "",
-        }
-        data.append(fila)
 
-    if not data:
-        return pd.DataFrame(columns=columnas)
+@cache_por_revision
+def obtener_reporte_validacion():
+    """Reporte de validación de la organización, recalculado solo si la BD cambió."""
+    return validar_organizacion()
 
-    return pd.DataFrame(data, columns=columnas)
+@trazado
+def mostrar_reporte_validacion():
+    """Muestra el reporte de validación de la organización con opción de descarga en JSON."""
+    reporte = obtener_reporte_validacion()
+    totales = reporte["totales"]
 
+    if not totales["cargos"]:
+        st.info("No hay cargos registrados en la base de datos.")
+        return
 
-def asignar_indicadores_estrategicos_a_ceo():
-    """Asigna los indicadores estratégicos como KPIs al CEO con peso distribuido equitativamente"""
-    with closing(sql.connect(DB_NAME, timeout=30.0)) as conn:
-        cursor = conn.cursor()
-        
-        # Obtener el ID del CEO
-        cursor.execute("""
-        SELECT id_cargo FROM Cargos
-        WHERE UPPER(nombre_cargo) LIKE '%CEO%'
-           OR UPPER(nivel_cargo) = 'PRESIDENCIA'
-        LIMIT 1
-        """)
-        resultado_ceo = cursor.fetchone()
-        
-        if not resultado_ceo:
-            st.error("❌ No se encontró el CEO en la BD")
-            return False
-        
-        id_ceo = resultado_ceo[0]
-        
-        # Obtener todos los indicadores estratégicos
-        cursor.execute("""
-        SELECT id_kpiEs, nombre_kpiEs
-        FROM IndicadoresEstrategicos
-        ORDER BY nombre_kpiEs
-        """)
-        indicadores = cursor.fetchall()
-        
-        if not indicadores:
-            st.info("ℹ️ No hay indicadores estratégicos para asignar")
-            return True
-        
-        # Calcular peso equitativo
-        peso_unitario = 100 // len(indicadores)
-        peso_sobrante = 100 % len(indicadores)
-        
-        # Obtener KPIs asignados al CEO
-        cursor.execute("""
-        SELECT fk_kpi FROM CargosKpis
-        WHERE fk_cargo = ?
-        """, (id_ceo,))
-        kpis_actuales = {row[0] for row in cursor.fetchall()}
-        
-        # Para cada indicador estratégico, crear un KPI que lo represente
-        asignados = 0
-        for idx, (id_kpiEs, nombre_indicador) in enumerate(indicadores):
-            # Buscar si ya existe un KPI con este nombre
-            cursor.execute("""
-            SELECT id_kpi FROM Kpis
-            WHERE nombre_kpi = ?
-            """, (nombre_indicador,))
-            resultado = cursor.fetchone()
-            
-            if resultado:
-                id_kpi = resultado[0]
+    problemas = sum(valor for clave, valor in totales.items() if clave != "cargos")
+    if problemas:
+        st.warning(f"⚠️ Se encontraron {problemas} observación(es) en {totales['cargos']} cargo(s).")
+    else:
+        st.success(f"✅ Los {totales['cargos']} cargos pasan todas las validaciones.")
+
+    cols = st.columns(6)
+    cols[0].metric("Pesos ≠ 100%", totales["pesos_invalidos"])
+    cols[1].metric("Cargos sin KPIs", totales["cargos_sin_kpis"])
+    cols[2].metric("Jefes inexistentes", totales["jefes_inexistentes"])
+    cols[3].metric("Ciclos", totales["ciclos"])
+    cols[4].metric("Fuera del árbol", totales["cargos_fuera_del_arbol"])
+    cols[5].metric("KPIs sin indicador", totales["kpis_sin_indicador"])
+
+    secciones = [
+        ("pesos_invalidos", "Cargos cuyos pesos no suman 100%"),
+        ("cargos_sin_kpis", "Cargos sin KPIs"),
+        ("jefes_inexistentes", "Cargos con jefe inexistente"),
+        ("cargos_fuera_del_arbol", "Cargos fuera del árbol (en un ciclo o bajo uno)"),
+        ("kpis_sin_indicador", "KPIs sin indicador estratégico"),
+    ]
+    for clave, titulo in secciones:
+        if reporte[clave]:
+            with st.expander(f"{titulo} ({len(reporte[clave])})"):
+                st.dataframe(pd.DataFrame(reporte[clave]), use_container_width=True, hide_index=True)
+
+    if reporte["ciclos"]:
+        with st.expander(f"Ciclos en la cadena de mando ({len(reporte['ciclos'])})"):
+            for ciclo in reporte["ciclos"]:
+                st.write(" → ".join(item["nombre_cargo"] for item in ciclo + ciclo[:1]))
+
+    st.caption(f"Validación calculada en {reporte['duracion_ms']} ms · {reporte['generado']}")
+    st.download_button(
+        "Descargar reporte (.json)",
+        data=json.dumps(reporte, ensure_ascii=False, indent=2),
+        file_name="reporte_validacion.json",
+        mime="application/json",
+        use_container_width=True,
+    )
+
+@trazado
+def inferir_niveles_cargos():
+    """Propone un nivel jerárquico para cada cargo sin nivel a partir de la cadena de mando.
+
+    En un solo recorrido del árbol (pre-orden hacia abajo y acumulación inversa hacia arriba)
+    se combinan cuatro evidencias: el nivel de los hermanos ya etiquetados, el ancestro
+    etiquetado más cercano, los descendientes etiquetados más cercanos y la distribución de
+    niveles por profundidad. Devuelve {id_cargo: (nivel, confianza)} con confianza en [0, 1].
+    """
+    with conectar_bd() as conn:
+        filas = conn.execute(consulta("cargos_jefes_niveles")).fetchall()
+
+    nivel_por_id = {
+        id_cargo: (nivel if isinstance(nivel, str) and nivel.strip() and nivel not in ('NULL', 'N/A') else None)
+        for id_cargo, _, nivel in filas
+    }
+    jefe_de = {}
+    hijos = defaultdict(list)
+    raices = []
+    for id_cargo, fk_jefe, _ in filas:
+        if fk_jefe is None or fk_jefe not in nivel_por_id or fk_jefe == id_cargo:
+            raices.append(id_cargo)
+        else:
+            jefe_de[id_cargo] = fk_jefe
+            hijos[fk_jefe].append(id_cargo)
+
+    # Pre-orden: profundidad y ancestro etiquetado más cercano (nivel, distancia)
+    profundidad = {}
+    ancestro = {}
+    orden = []
+    pila = [(raiz, 0, None) for raiz in raices]
+    while pila:
+        nodo, prof, anc = pila.pop()
+        if nodo in profundidad:
+            continue
+        profundidad[nodo] = prof
+        ancestro[nodo] = anc
+        orden.append(nodo)
+        nivel = nivel_por_id[nodo]
+        siguiente = (nivel, 1) if nivel else (anc[0], anc[1] + 1) if anc else None
+        pila.extend((hijo, prof + 1, siguiente) for hijo in hijos.get(nodo, ()))
+
+    # Orden inverso: descendientes etiquetados más cercanos (distancia, conteo por nivel)
+    descendientes = {}
+    for nodo in reversed(orden):
+        mejor = None
+        for hijo in hijos.get(nodo, ()):
+            if nivel_por_id[hijo]:
+                candidato = (1, Counter({nivel_por_id[hijo]: 1}))
+            elif hijo in descendientes:
+                distancia, conteo = descendientes[hijo]
+                candidato = (distancia + 1, conteo)
             else:
-                # Crear un KPI nuevo con el nombre del indicador estratégico
-                cursor.execute("""
-                INSERT INTO Kpis (nombre_kpi, fk_kpiEs)
-                VALUES (?, ?)
-                """, (nombre_indicador, id_kpiEs))
-                id_kpi = cursor.lastrowid
-            
-            # Calcular peso
-            peso = peso_unitario
-            if idx < peso_sobrante:
-                peso += 1
-            
-            # Insertar en CargosKpis si no existe
-            try:
-                cursor.execute("""
-                INSERT OR IGNORE INTO CargosKpis (fk_cargo, fk_kpi, peso_kpi)
-                VALUES (?, ?, ?)
-                """, (id_ceo, id_kpi, peso))
-                asignados += cursor.rowcount
-            except:
-                pass
-        
-        conn.commit()
-        return asignados > 0
+                continue
+            if mejor is None or candidato[0] < mejor[0]:
+                mejor = (candidato[0], Counter(candidato[1]))
+            elif candidato[0] == mejor[0]:
+                mejor[1].update(candidato[1])
+        if mejor is not None:
+            descendientes[nodo] = mejor
+
+    # Distribución de niveles por profundidad y profundidad media de cada nivel
+    por_profundidad = defaultdict(Counter)
+    suma_profundidad = Counter()
+    total_nivel = Counter()
+    for nodo in orden:
+        nivel = nivel_por_id[nodo]
+        if nivel:
+            por_profundidad[profundidad[nodo]][nivel] += 1
+            suma_profundidad[nivel] += profundidad[nodo]
+            total_nivel[nivel] += 1
+    if not total_nivel:
+        return {}
+    profundidad_media = {nivel: suma_profundidad[nivel] / total_nivel[nivel] for nivel in total_nivel}
 
+    def nivel_a_profundidad(objetivo):
+        return min(profundidad_media, key=lambda nivel: (abs(profundidad_media[nivel] - objetivo), nivel))
+
+    def votar(votos, conteo, peso):
+        total = sum(conteo.values())
+        for nivel, cantidad in conteo.items():
+            votos[nivel] += peso * cantidad / total
+
+    sugerencias = {}
+    for nodo in orden:
+        if nivel_por_id[nodo]:
+            continue
+        votos = Counter()
+        prof = profundidad[nodo]
+
+        hermanos = Counter(
+            nivel_por_id[h] for h in hijos.get(jefe_de.get(nodo), ()) if nivel_por_id[h]
+        )
+        if hermanos:
+            votar(votos, hermanos, PESOS_INFERENCIA_NIVEL["hermanos"])
+
+        if ancestro[nodo]:
+            nivel_anc, distancia = ancestro[nodo]
+            objetivo = nivel_a_profundidad(profundidad_media[nivel_anc] + distancia)
+            votos[objetivo] += PESOS_INFERENCIA_NIVEL["ancestro"] / distancia
+
+        if nodo in descendientes:
+            distancia, conteo = descendientes[nodo]
+            nivel_desc = conteo.most_common(1)[0][0]
+            objetivo = nivel_a_profundidad(profundidad_media[nivel_desc] - distancia)
+            votos[objetivo] += PESOS_INFERENCIA_NIVEL["descendientes"] / distancia
+
+        if por_profundidad.get(prof):
+            votar(votos, por_profundidad[prof], PESOS_INFERENCIA_NIVEL["profundidad"])
+
+        if not votos:
+            continue
+        evidencia = sum(votos.values())
+        nivel, puntaje = max(votos.items(), key=lambda item: (item[1], item[0]))
+        # La confianza es la cuota del voto ganador, atenuada cuando hay poca evidencia
+        confianza = (puntaje / evidencia) * min(1.0, evidencia / PESOS_INFERENCIA_NIVEL["hermanos"])
+        sugerencias[nodo] = (nivel, round(confianza, 2))
+
+    return sugerencias
+
+@cache_por_revision
+def obtener_niveles_inferidos():
+    """Sugerencias de nivel cacheadas por revisión de la BD."""
+    return inferir_niveles_cargos()
+
+@trazado
 def asignar_niveles_jerarquicos():
     """Permite al usuario asignar niveles jerárquicos a los cargos usando niveles existentes en la BD"""
     
@@ -1362,66 +1822,35 @@ def asignar_niveles_jerarquicos():
     if 'niveles_guardados' not in st.session_state:
         st.session_state.niveles_guardados = False
     
-    with closing(sql.connect(DB_NAME, timeout=30.0)) as conn:
+    with conectar_bd() as conn:
         cursor = conn.cursor()
         
-        # Identificar y asignar nivel al CEO automáticamente
-        cursor.execute("""
-        SELECT id_cargo, nombre_cargo 
-        FROM Cargos 
-        WHERE UPPER(nombre_cargo) LIKE '%CEO%'
-        LIMIT 1
-        """)
-        ceo = cursor.fetchone()
-        
-        if ceo:
-            cursor.execute("""
-            SELECT nivel_cargo FROM Cargos WHERE id_cargo = ?
-            """, (ceo[0],))
-            nivel_actual = cursor.fetchone()[0]
-            
-            if nivel_actual != 'Presidencia':
-                cursor.execute("""
-                UPDATE Cargos 
-                SET nivel_cargo = 'Presidencia'
-                WHERE id_cargo = ?
-                """, (ceo[0],))
-                conn.commit()
+        # Las raíces designadas (CEO) reciben el nivel Presidencia automáticamente
+        cursor.execute(consulta("asignar_nivel_presidencia"))
+        if cursor.rowcount:
+            registrar_cambio_bd(conn)
+            conn.commit()
         
         # Obtener niveles existentes
-        cursor.execute("""
-        SELECT DISTINCT nivel_cargo 
-        FROM Cargos 
-        WHERE nivel_cargo IS NOT NULL 
-          AND nivel_cargo != 'NULL' 
-          AND nivel_cargo != 'N/A'
-          AND TRIM(nivel_cargo) != ''
-        ORDER BY nivel_cargo
-        """)
+        cursor.execute(consulta("niveles_existentes"))
         niveles_existentes = [row[0] for row in cursor.fetchall()]
         
         if not niveles_existentes:
             st.error("❌ No hay niveles jerárquicos definidos en la base de datos.")
             return False
         
-        # Obtener cargos sin nivel (EXCLUYENDO al CEO)
-        cursor.execute("""
-        SELECT id_cargo, nombre_cargo, nivel_cargo 
-        FROM Cargos 
-        WHERE (nivel_cargo IS NULL 
-           OR nivel_cargo = 'NULL' 
-           OR nivel_cargo = 'N/A'
-           OR TRIM(nivel_cargo) = '')
-          AND id_cargo != ?
-        ORDER BY nombre_cargo
-        """, (ceo[0] if ceo else -1,))
+        # Obtener cargos sin nivel (EXCLUYENDO las raíces)
+        cursor.execute(consulta("cargos_sin_nivel"))
         cargos_sin_nivel = cursor.fetchall()
         
         if not cargos_sin_nivel:
             st.success("✅ Todos los cargos tienen un nivel jerárquico asignado")
             st.session_state.niveles_guardados = True
             return True
-    
+
+
+    sugerencias = obtener_niveles_inferidos()
+
     st.warning(f"⚠️ Hay {len(cargos_sin_nivel)} cargo(s) sin nivel jerárquico (excluyendo CEO)")
     
     # Mostrar niveles disponibles
@@ -1433,112 +1862,278 @@ def asignar_niveles_jerarquicos():
     
     st.write("### 🎯 Asigna un nivel jerárquico a cada cargo:")
     
-    # Preparar opciones
-    niveles_disponibles = ["-- Seleccionar --"] + niveles_existentes
-    
     # Inicializar session_state para asignaciones
     if 'asignaciones_niveles' not in st.session_state:
         st.session_state.asignaciones_niveles = {}
-    
-    # Crear selectbox para CADA cargo
-    for idx, cargo in enumerate(cargos_sin_nivel, 1):
-        id_cargo, nombre_cargo, nivel_actual = cargo
-        
-        st.divider()
-        
-        col1, col2 = st.columns([1, 2])
-        
-        with col1:
-            st.markdown(f"**{idx}. {nombre_cargo}**")
-            nivel_display = nivel_actual if nivel_actual and nivel_actual not in ['NULL', 'N/A', ''] else 'Sin nivel'
-            st.caption(f"Nivel actual: {nivel_display}")
-        
-        with col2:
-            nivel_seleccionado = st.selectbox(
-                "Selecciona el nivel jerárquico:",
-                options=niveles_disponibles,
-                key=f"nivel_{id_cargo}",
-                label_visibility="collapsed"
-            )
-            
-            # Guardar como INTEGER
-            if nivel_seleccionado != "-- Seleccionar --":
-                st.session_state.asignaciones_niveles[int(id_cargo)] = nivel_seleccionado
-            elif int(id_cargo) in st.session_state.asignaciones_niveles:
-                del st.session_state.asignaciones_niveles[int(id_cargo)]
-    
-    st.divider()
+    asignaciones = st.session_state.asignaciones_niveles
+
+    df_niveles = pd.DataFrame(cargos_sin_nivel, columns=["id_cargo", "Cargo", "Responde a", "fk_jefe"])
+    df_niveles["Sugerencia"] = df_niveles["id_cargo"].map(lambda id_cargo: sugerencias.get(id_cargo, (None, None))[0])
+    df_niveles["Confianza"] = df_niveles["id_cargo"].map(
+        lambda id_cargo: round(100 * sugerencias[id_cargo][1]) if id_cargo in sugerencias else None
+    )
+
+    umbral = st.slider(
+        "Confianza mínima para pre-llenar sugerencias",
+        min_value=0,
+        max_value=100,
+        value=60,
+        step=5,
+        format="%d%%",
+        key="umbral_sugerencias_niveles",
+    )
+    sugeridos = df_niveles[df_niveles["Sugerencia"].notna() & (df_niveles["Confianza"] >= umbral)]
+
+    # Pre-llenar en bloque una sola vez por carga; "Limpiar" no las vuelve a aplicar
+    if not st.session_state.get("niveles_prellenados"):
+        for id_cargo, sugerencia in zip(sugeridos["id_cargo"], sugeridos["Sugerencia"]):
+            asignaciones.setdefault(int(id_cargo), sugerencia)
+        st.session_state.niveles_prellenados = True
+        if not sugeridos.empty:
+            st.info(f"✨ Se pre-llenaron {len(sugeridos)} nivel(es) inferidos de la cadena de mando; revísalos antes de guardar.")
+
+    # Búsqueda y paginación: solo la página visible se envía al navegador
+    col_busqueda, col_tamano = st.columns([3, 1])
+    with col_busqueda:
+        busqueda = st.text_input("Buscar cargo", key="buscar_niveles", placeholder="Filtra por nombre del cargo o del jefe")
+    with col_tamano:
+        tamano_pagina = st.selectbox("Filas por página", [50, 100, 250, 500], key="tamano_pagina_niveles")
+
+    filtrado = df_niveles
+    if busqueda.strip():
+        patron = busqueda.strip().lower()
+        filtrado = df_niveles[
+            df_niveles["Cargo"].str.lower().str.contains(patron, regex=False)
+            | df_niveles["Responde a"].str.lower().str.contains(patron, regex=False)
+        ]
+
+    total_paginas = max(1, -(-len(filtrado) // tamano_pagina))
+    pagina = st.number_input("Página", min_value=1, max_value=total_paginas, value=1, key="pagina_niveles")
+    pagina_df = filtrado.iloc[(pagina - 1) * tamano_pagina: pagina * tamano_pagina].copy()
+    pagina_df["Nivel"] = pagina_df["id_cargo"].map(asignaciones)
+    st.caption(f"{len(filtrado)} cargo(s) coinciden · página {pagina} de {total_paginas}")
+
+    contador_editor = st.session_state.get("editor_niveles_version", 0)
+    editado = st.data_editor(
+        pagina_df,
+        key=f"editor_niveles_{pagina}_{busqueda.strip().lower()}_{tamano_pagina}_{contador_editor}",
+        hide_index=True,
+        use_container_width=True,
+        disabled=["Cargo", "Responde a", "Sugerencia", "Confianza"],
+        column_order=["Cargo", "Responde a", "Sugerencia", "Confianza", "Nivel"],
+        column_config={
+            "Nivel": st.column_config.SelectboxColumn("Nivel", options=niveles_existentes),
+            "Confianza": st.column_config.ProgressColumn("Confianza", min_value=0, max_value=100, format="%d%%"),
+            "id_cargo": None,
+            "fk_jefe": None,
+        },
+    )
+
+    # Reflejar en las asignaciones de sesión los cambios de la página visible
+    for id_cargo, nivel in zip(editado["id_cargo"], editado["Nivel"]):
+        if isinstance(nivel, str) and nivel:
+            asignaciones[int(id_cargo)] = nivel
+        else:
+            asignaciones.pop(int(id_cargo), None)
     
     # Controles
-    col1, col2, col3 = st.columns([1, 1, 1])
+    col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
     
     with col1:
         if st.button("🔄 Limpiar", use_container_width=True, key="clear_niveles"):
             st.session_state.asignaciones_niveles = {}
+            st.session_state.editor_niveles_version = contador_editor + 1
             st.rerun()
-    
+
     with col2:
-        st.metric("Progreso", f"{len(st.session_state.asignaciones_niveles)}/{len(cargos_sin_nivel)}")
+        if st.button(
+            f"✨ Usar sugerencias ({len(sugeridos)})",
+            use_container_width=True,
+            key="sugerencias_niveles",
+            disabled=sugeridos.empty,
+        ):
+            for id_cargo, sugerencia in zip(sugeridos["id_cargo"], sugeridos["Sugerencia"]):
+                asignaciones.setdefault(int(id_cargo), sugerencia)
+            st.session_state.editor_niveles_version = contador_editor + 1
+            st.rerun()
     
     with col3:
+        st.metric("Progreso", f"{len(asignaciones)}/{len(cargos_sin_nivel)}")
+    
+    with col4:
         if st.button("💾 Guardar Niveles", 
                      use_container_width=True, 
                      type="primary",
-                     disabled=(len(st.session_state.asignaciones_niveles) < len(cargos_sin_nivel)),
+                     disabled=not asignaciones,
                      key="save_niveles"):
-            st.session_state.guardar_niveles_clicked = True
-    
-    # Procesar guardado SI el botón fue clickeado
-    if st.session_state.get('guardar_niveles_clicked', False):
-        
-        if len(st.session_state.asignaciones_niveles) >= len(cargos_sin_nivel):
-            with st.spinner("Guardando niveles..."):
-                try:
-                    # Usar una nueva conexión FUERA del context manager anterior
-                    conn_save = sql.connect(DB_NAME, timeout=30.0)
+            try:
+                crear_snapshot("niveles")
+                with conectar_bd() as conn_save:
                     cursor_save = conn_save.cursor()
-                    
-                    actualizados = 0
-                    for id_cargo, nivel in st.session_state.asignaciones_niveles.items():
-                        cursor_save.execute("""
-                        UPDATE Cargos 
-                        SET nivel_cargo = ?
-                        WHERE id_cargo = ?
-                        """, (nivel, int(id_cargo)))
-                        
-                        actualizados += cursor_save.rowcount
-                    
+                    cursor_save.executemany(
+                        consulta("actualizar_nivel_cargo"),
+                        [(nivel, int(id_cargo)) for id_cargo, nivel in asignaciones.items()],
+                    )
+                    actualizados = cursor_save.rowcount
+                    registrar_cambio_bd(conn_save)
                     conn_save.commit()
-                    conn_save.close()
-                    
-                    st.success(f"✅ ¡{actualizados} nivel(es) guardado(s) correctamente!")
-                    
-                    # Esperar antes de limpiar
-                    time.sleep(3)
-                    
-                    # Limpiar flags y asignaciones
-                    st.session_state.asignaciones_niveles = {}
-                    st.session_state.guardar_niveles_clicked = False
-                    st.session_state.niveles_guardados = True
-                    
-                    st.rerun()
-                    
-                except Exception as e:
-                    st.error(f"❌ Error al guardar: {str(e)}")
-                    import traceback
-                    st.code(traceback.format_exc())
-                    st.session_state.guardar_niveles_clicked = False
-                    if 'conn_save' in locals():
-                        conn_save.close()
-        else:
-            st.error("❌ Completa todas las asignaciones antes de guardar")
-            st.session_state.guardar_niveles_clicked = False
+
+                notificar(f"¡{actualizados} nivel(es) guardado(s) correctamente!")
+                st.session_state.asignaciones_niveles = {}
+                st.session_state.editor_niveles_version = contador_editor + 1
+                st.rerun()
+
+            except Exception as e:
+                st.error(f"❌ Error al guardar: {str(e)}")
+                import traceback
+                st.code(traceback.format_exc())
     
-    if len(st.session_state.asignaciones_niveles) < len(cargos_sin_nivel):
-        st.info(f"⏸️ Asigna niveles a todos los cargos para continuar ({len(cargos_sin_nivel) - len(st.session_state.asignaciones_niveles)} pendientes)")
+    if len(asignaciones) < len(cargos_sin_nivel):
+        st.info(f"⏸️ Asigna niveles a todos los cargos para continuar ({len(cargos_sin_nivel) - len(asignaciones)} pendientes)")
     
     return False
 
+def calcular_rango_niveles():
+    """Ordena los niveles jerárquicos por la profundidad media de sus cargos (un valor menor es un nivel más alto)."""
+    with conectar_bd() as conn:
+        filas = conn.execute(consulta("rango_niveles")).fetchall()
+    rango = dict(filas)
+    if "Presidencia" in rango:
+        rango["Presidencia"] = -1.0
+    return rango
+
+@cache_por_revision
+def obtener_candidatos_jefe():
+    """Índice de búsqueda de cargos, nivel de cada cargo y rango de niveles, cacheados por revisión de la BD."""
+    with conectar_bd() as conn:
+        filas = conn.execute(consulta("candidatos_jefe")).fetchall()
+    indice = construir_indice_nombres((id_cargo, nombre) for id_cargo, nombre, _ in filas)
+    nivel_por_id = {id_cargo: nivel for id_cargo, _, nivel in filas}
+    return indice, nivel_por_id, calcular_rango_niveles()
+
+def fusionar_cargo_duplicado(nombre, nombre_destino):
+    """Reasigna los subordinados del cargo `nombre` a `nombre_destino` y elimina el duplicado si queda vacío.
+
+    Devuelve la cantidad de subordinados reasignados.
+    """
+    with conectar_bd() as conn:
+        conn.execute("PRAGMA foreign_keys = ON")
+        cursor = conn.cursor()
+        cursor.execute(consulta("id_cargo_por_nombre"), (nombre,))
+        origen = cursor.fetchone()
+        cursor.execute(consulta("id_cargo_por_nombre"), (nombre_destino,))
+        destino = cursor.fetchone()
+        if not origen or not destino or origen[0] == destino[0]:
+            return 0
+
+        cursor.execute(consulta("subordinados_directos"), (origen[0],))
+        reasignados = 0
+        for (id_cargo,) in cursor.fetchall():
+            try:
+                cursor.execute(consulta("actualizar_jefe_cargo"), (destino[0], id_cargo))
+                reasignados += cursor.rowcount
+            except sql.IntegrityError:
+                pass
+
+        cursor.execute(consulta("eliminar_cargo_sin_dependencias"), (origen[0], origen[0], origen[0]))
+        registrar_cambio_bd(conn)
+        conn.commit()
+    return reasignados
+
+def revisar_coincidencias_jefes():
+    """Muestra los enlaces automáticos y los nombres de jefe con coincidencia ambigua detectados al cargar el archivo."""
+    enlazados = st.session_state.get("enlaces_jefes") or {}
+    if enlazados:
+        with st.expander(f"🔗 Enlaces automáticos de nombres de jefe ({len(enlazados)})"):
+            st.dataframe(
+                pd.DataFrame(
+                    [(nombre, cargo, similitud) for nombre, (cargo, similitud) in enlazados.items()],
+                    columns=["Responde al Cargo", "Cargo enlazado", "Similitud"],
+                ),
+                hide_index=True,
+                use_container_width=True,
+            )
+
+    pendientes = st.session_state.get("coincidencias_jefes") or []
+    if not pendientes:
+        return
+
+    with st.expander(f"🔍 Coincidencias de nombres por revisar ({len(pendientes)})", expanded=True):
+        st.caption(
+            "Estos nombres de «Responde al Cargo» no coinciden exactamente con ningún cargo. "
+            "Elige el cargo correcto para unir sus subordinados o mantenlo como cargo nuevo."
+        )
+        sin_revisar = "-- Sin revisar --"
+        mantener = "-- Mantener como cargo nuevo --"
+        elecciones = {}
+        mantenidos = set()
+        # Las claves usan el nombre normalizado: al aplicar, los pendientes que siguen en pantalla
+        # conservan su elección aunque cambie su posición en la lista. Dos nombres que normalizan
+        # igual compartirían clave, así que el segundo espera a la siguiente tanda
+        claves = set()
+        for item in pendientes[:50]:
+            clave = f"coincidencia_jefe_{normalizar_nombre(item['nombre'])}"
+            if clave in claves:
+                continue
+            claves.add(clave)
+            opciones = [sin_revisar, mantener] + [f"{cargo} ({similitud:.0%})" for cargo, similitud in item["candidatos"]]
+            eleccion = st.selectbox(item["nombre"], opciones, key=clave)
+            if eleccion == mantener:
+                mantenidos.add(item["nombre"])
+            elif eleccion != sin_revisar:
+                elecciones[item["nombre"]] = item["candidatos"][opciones.index(eleccion) - 2][0]
+
+        revisados = len(elecciones) + len(mantenidos)
+        if st.button(
+            f"✅ Aplicar coincidencias ({revisados})",
+            key="aplicar_coincidencias_jefes",
+            type="primary",
+            disabled=not revisados,
+        ):
+            if elecciones:
+                crear_snapshot("coincidencias jefes")
+            reasignados = sum(
+                fusionar_cargo_duplicado(nombre, destino) for nombre, destino in elecciones.items()
+            )
+            # Solo salen de la cola los nombres unidos o mantenidos; los no revisados siguen pendientes
+            st.session_state.coincidencias_jefes = [
+                item for item in pendientes if item["nombre"] not in elecciones and item["nombre"] not in mantenidos
+            ]
+            notificar(
+                f"{len(elecciones)} nombre(s) unidos · {len(mantenidos)} mantenido(s) como cargo nuevo · "
+                f"{reasignados} subordinado(s) reasignados"
+            )
+            st.rerun()
+
+def designar_raices_cargos(ids_cargos, es_raiz=True):
+    """Designa (o deja de designar) como raíces de la organización a `ids_cargos`."""
+    with conectar_bd() as conn:
+        marcar_raices(conn, ids_cargos, es_raiz)
+        registrar_cambio_bd(conn)
+        conn.commit()
+
+def mostrar_raices(raices):
+    """Lista las raíces designadas y permite quitarles la designación para asignarles un jefe."""
+    if not raices:
+        st.error(
+            "❌ No hay ningún cargo raíz (CEO) designado. Selecciona el cargo que encabeza la organización "
+            "y pulsa \"🏛️ Designar como raíz\"."
+        )
+        return
+    with st.expander(f"🏛️ Raíces de la organización ({len(raices)})"):
+        nombres = {id_cargo: nombre for id_cargo, nombre in raices}
+        quitar = st.multiselect(
+            "Quitar la designación de raíz a:",
+            options=list(nombres),
+            format_func=nombres.get,
+            key="raices_a_quitar",
+        )
+        if st.button("Quitar designación", key="quitar_raices", disabled=not quitar):
+            designar_raices_cargos(quitar, es_raiz=False)
+            notificar(f"{len(quitar)} cargo(s) ya no son raíz; asígnales un jefe")
+            st.rerun()
+
+@trazado
 def asignar_jefes_faltantes():
     """Permite al usuario asignar jefes a cargos que no los tienen"""
     
@@ -1546,100 +2141,166 @@ def asignar_jefes_faltantes():
     if 'jefes_guardados' not in st.session_state:
         st.session_state.jefes_guardados = False
     
-    with closing(sql.connect(DB_NAME, timeout=30.0)) as conn:
+    with conectar_bd() as conn:
         cursor = conn.cursor()
         
-        # Identificar al CEO
-        cursor.execute("""
-        SELECT id_cargo, nombre_cargo 
-        FROM Cargos 
-        WHERE UPPER(nombre_cargo) LIKE '%CEO%'
-           OR UPPER(nivel_cargo) = 'PRESIDENCIA'
-        LIMIT 1
-        """)
-        ceo = cursor.fetchone()
-        
-        if ceo:
-            cursor.execute("""
-            UPDATE Cargos 
-            SET fk_jefe = NULL
-            WHERE id_cargo = ?
-            """, (ceo[0],))
+        # Las raíces designadas (CEO) no tienen jefe
+        cursor.execute(consulta("quitar_jefe_raices"))
+        if cursor.rowcount:
+            registrar_cambio_bd(conn)
             conn.commit()
+        cursor.execute(consulta("raices"))
+        raices = cursor.fetchall()
         
-        # Obtener cargos sin jefe (EXCLUYENDO el CEO)
-        cursor.execute("""
-        SELECT id_cargo, nombre_cargo, nivel_cargo 
-        FROM Cargos 
-        WHERE fk_jefe IS NULL 
-          AND (
-            NOT (UPPER(nombre_cargo) LIKE '%CEO%' 
-              OR UPPER(nivel_cargo) = 'PRESIDENCIA')
-          )
-        ORDER BY nombre_cargo
-        """)
+        # Obtener cargos sin jefe (EXCLUYENDO las raíces)
+        cursor.execute(consulta("cargos_sin_jefe"))
         cargos_sin_jefe = cursor.fetchall()
         
         if not cargos_sin_jefe:
             st.success("✅ Todos los cargos tienen un jefe asignado")
             st.session_state.jefes_guardados = True
             return True
-        
-        # Obtener todos los cargos disponibles
-        cursor.execute("""
-        SELECT id_cargo, nombre_cargo, nivel_cargo 
-        FROM Cargos
-        ORDER BY 
-            CASE WHEN nivel_cargo = 'Presidencia' THEN 0 ELSE 1 END,
-            nombre_cargo
-        """)
-        todos_cargos = cursor.fetchall()
     
-    st.warning(f"⚠️ Hay {len(cargos_sin_jefe)} cargo(s) sin jefe asignado (excluyendo CEO)")
+    st.warning(f"⚠️ Hay {len(cargos_sin_jefe)} cargo(s) sin jefe asignado (excluyendo las raíces)")
+    mostrar_raices(raices)
+    revisar_coincidencias_jefes()
     st.write("### 📝 Asigna un jefe a cada cargo:")
     
     # Inicializar session_state
     if 'asignaciones_jefes' not in st.session_state:
         st.session_state.asignaciones_jefes = {}
-    
-    # Crear selectbox para CADA cargo
-    for idx, cargo in enumerate(cargos_sin_jefe, 1):
-        id_cargo, nombre_cargo, nivel_cargo = cargo
-        
-        st.divider()
-        
-        col1, col2 = st.columns([1, 2])
-        
-        with col1:
-            st.markdown(f"**{idx}. {nombre_cargo}**")
-            nivel_display = nivel_cargo if nivel_cargo and nivel_cargo != 'NULL' else 'Sin nivel'
-            st.caption(f"Nivel: {nivel_display}")
-        
-        with col2:
-            opciones = ["-- Seleccionar --"]
-            opciones_map = {}
-            
-            for cargo_disponible in todos_cargos:
-                id_disp, nombre_disp, nivel_disp = cargo_disponible
-                
-                if id_disp != id_cargo:
-                    nivel_text = nivel_disp if nivel_disp and nivel_disp != 'NULL' else 'Sin nivel'
-                    etiqueta = f"{nombre_disp} ({nivel_text})"
-                    opciones.append(etiqueta)
-                    opciones_map[etiqueta] = id_disp
-            
-            seleccion = st.selectbox(
-                "Selecciona el jefe:",
-                options=opciones,
-                key=f"jefe_{id_cargo}",
-                label_visibility="collapsed"
-            )
-            
-            if seleccion != "-- Seleccionar --":
-                st.session_state.asignaciones_jefes[int(id_cargo)] = opciones_map[seleccion]
-            elif int(id_cargo) in st.session_state.asignaciones_jefes:
-                del st.session_state.asignaciones_jefes[int(id_cargo)]
-    
+    asignaciones = st.session_state.asignaciones_jefes
+
+    indice, nivel_por_id, rango_niveles = obtener_candidatos_jefe()
+    nombre_por_id = dict(zip(indice["ids"], indice["nombres"]))
+
+    def etiqueta_cargo(id_cargo):
+        nivel = nivel_por_id.get(id_cargo)
+        nivel_text = nivel if nivel and nivel not in ('NULL', 'N/A') else 'Sin nivel'
+        return f"{nombre_por_id.get(id_cargo, id_cargo)} ({nivel_text})"
+
+    df_sin_jefe = pd.DataFrame(cargos_sin_jefe, columns=["id_cargo", "Cargo", "Nivel"])
+    df_sin_jefe["Nivel"] = df_sin_jefe["Nivel"].where(
+        ~df_sin_jefe["Nivel"].isin(["NULL", "N/A"]) & df_sin_jefe["Nivel"].notna(), "Sin nivel"
+    )
+
+    # Búsqueda y paginación de los cargos pendientes
+    col_busqueda, col_tamano = st.columns([3, 1])
+    with col_busqueda:
+        busqueda = st.text_input("Buscar cargo sin jefe", key="buscar_sin_jefe", placeholder="Filtra por nombre del cargo")
+    with col_tamano:
+        tamano_pagina = st.selectbox("Filas por página", [50, 100, 250, 500], key="tamano_pagina_jefes")
+
+    filtrado = df_sin_jefe
+    if busqueda.strip():
+        patron = normalizar_nombre(busqueda)
+        filtrado = df_sin_jefe[df_sin_jefe["Cargo"].map(normalizar_nombre).str.contains(patron, regex=False)]
+
+    total_paginas = max(1, -(-len(filtrado) // tamano_pagina))
+    pagina = st.number_input("Página", min_value=1, max_value=total_paginas, value=1, key="pagina_jefes")
+    pagina_df = filtrado.iloc[(pagina - 1) * tamano_pagina: pagina * tamano_pagina].copy()
+    pagina_df["Jefe asignado"] = pagina_df["id_cargo"].map(
+        lambda id_cargo: etiqueta_cargo(asignaciones[id_cargo]) if id_cargo in asignaciones else ""
+    )
+    pagina_df["Seleccionar"] = False
+    st.caption(f"{len(filtrado)} cargo(s) coinciden · página {pagina} de {total_paginas}")
+
+    contador_editor = st.session_state.get("editor_jefes_version", 0)
+    editado = st.data_editor(
+        pagina_df,
+        key=f"editor_jefes_{pagina}_{busqueda.strip().lower()}_{tamano_pagina}_{contador_editor}",
+        hide_index=True,
+        use_container_width=True,
+        disabled=["Cargo", "Nivel", "Jefe asignado"],
+        column_order=["Seleccionar", "Cargo", "Nivel", "Jefe asignado"],
+        column_config={"id_cargo": None},
+    )
+    seleccionados = [int(id_cargo) for id_cargo in editado.loc[editado["Seleccionar"].astype(bool), "id_cargo"]]
+
+    # Candidatos a jefe: solo se envían al navegador los que coinciden con la búsqueda
+    st.markdown(f"#### 🔎 Jefe para {len(seleccionados)} cargo(s) seleccionado(s)")
+    col_consulta, col_filtro = st.columns([3, 1])
+    with col_consulta:
+        texto_busqueda = st.text_input("Buscar jefe", key="buscar_jefe", placeholder="Escribe parte del nombre del jefe")
+    with col_filtro:
+        solo_compatibles = st.checkbox(
+            "Solo niveles compatibles",
+            value=True,
+            key="jefes_compatibles",
+            help="Oculta candidatos cuyo nivel suele estar por debajo del de los cargos seleccionados.",
+        )
+
+    # Un cargo no puede reportar a alguien de su propio subárbol
+    excluidos = set(seleccionados)
+    if seleccionados:
+        with conectar_bd() as conn:
+            cursor = conn.cursor()
+            cursor.execute(consulta("descendientes_de_cargos"), (json.dumps([int(id_cargo) for id_cargo in seleccionados]),))
+            excluidos.update(row[0] for row in cursor.fetchall())
+
+    rangos_seleccionados = [
+        rango_niveles[nivel_por_id[id_cargo]]
+        for id_cargo in seleccionados
+        if nivel_por_id.get(id_cargo) in rango_niveles
+    ]
+    rango_limite = min(rangos_seleccionados) if rangos_seleccionados else None
+
+    def es_candidato(id_cargo):
+        if id_cargo in excluidos:
+            return False
+        if solo_compatibles and rango_limite is not None:
+            rango = rango_niveles.get(nivel_por_id.get(id_cargo))
+            if rango is not None and rango > rango_limite:
+                return False
+        return True
+
+    candidatos = buscar_en_indice(indice, texto_busqueda, limite=50, permitido=es_candidato)
+    opciones = {etiqueta_cargo(id_cargo): id_cargo for id_cargo, _, _ in candidatos}
+    jefe_elegido = st.selectbox(
+        "Selecciona el jefe:",
+        options=list(opciones) or ["-- Sin coincidencias --"],
+        key="jefe_candidato",
+        disabled=not opciones,
+    )
+
+    col_asignar, col_quitar, col_raiz = st.columns(3)
+    with col_asignar:
+        if st.button(
+            "➡️ Asignar a seleccionados",
+            use_container_width=True,
+            key="asignar_jefe_seleccionados",
+            disabled=not (seleccionados and opciones),
+        ):
+            for id_cargo in seleccionados:
+                asignaciones[id_cargo] = opciones[jefe_elegido]
+            st.session_state.editor_jefes_version = contador_editor + 1
+            st.rerun()
+    with col_quitar:
+        if st.button(
+            "↩️ Quitar asignación",
+            use_container_width=True,
+            key="quitar_jefe_seleccionados",
+            disabled=not seleccionados,
+        ):
+            for id_cargo in seleccionados:
+                asignaciones.pop(id_cargo, None)
+            st.session_state.editor_jefes_version = contador_editor + 1
+            st.rerun()
+    with col_raiz:
+        if st.button(
+            "🏛️ Designar como raíz",
+            use_container_width=True,
+            key="designar_raiz_seleccionados",
+            disabled=not seleccionados,
+            help="Para el CEO o para cada empresa de un holding: no necesitan jefe y encabezan su propio árbol.",
+        ):
+            designar_raices_cargos(seleccionados)
+            for id_cargo in seleccionados:
+                asignaciones.pop(id_cargo, None)
+            st.session_state.editor_jefes_version = contador_editor + 1
+            notificar(f"{len(seleccionados)} cargo(s) designado(s) como raíz")
+            st.rerun()
+
     st.divider()
     
     # Controles
@@ -1648,72 +2309,64 @@ def asignar_jefes_faltantes():
     with col1:
         if st.button("🔄 Limpiar", use_container_width=True, key="clear_jefes"):
             st.session_state.asignaciones_jefes = {}
+            st.session_state.editor_jefes_version = contador_editor + 1
             st.rerun()
     
     with col2:
-        st.metric("Progreso", f"{len(st.session_state.asignaciones_jefes)}/{len(cargos_sin_jefe)}")
+        st.metric("Progreso", f"{len(asignaciones)}/{len(cargos_sin_jefe)}")
     
     with col3:
         if st.button("💾 Guardar Cambios", 
                      use_container_width=True, 
                      type="primary",
-                     disabled=(len(st.session_state.asignaciones_jefes) < len(cargos_sin_jefe)),
+                     disabled=not asignaciones,
                      key="save_jefes"):
-            st.session_state.guardar_jefes_clicked = True
-    
-    # Procesar guardado
-    if st.session_state.get('guardar_jefes_clicked', False):
-        
-        if len(st.session_state.asignaciones_jefes) >= len(cargos_sin_jefe):
-            with st.spinner("Guardando asignaciones..."):
-                try:
-                    conn_save = sql.connect(DB_NAME, timeout=30.0)
+            try:
+                crear_snapshot("jefes")
+                # Todas las asignaciones en una sola transacción; los triggers rechazan las que cierran ciclos
+                with conectar_bd() as conn_save:
                     conn_save.execute("PRAGMA foreign_keys = ON")
                     cursor_save = conn_save.cursor()
-                    
+
                     actualizados = 0
-                    for id_cargo, id_jefe in st.session_state.asignaciones_jefes.items():
-                        cursor_save.execute("""
-                        UPDATE Cargos 
-                        SET fk_jefe = ?
-                        WHERE id_cargo = ?
-                        """, (id_jefe, int(id_cargo)))
-                        
-                        actualizados += cursor_save.rowcount
-                    
+                    rechazados = []
+                    for id_cargo, id_jefe in asignaciones.items():
+                        if es_asignacion_ciclica(cursor_save, id_cargo, id_jefe):
+                            rechazados.append(int(id_cargo))
+                            continue
+                        try:
+                            cursor_save.execute(consulta("actualizar_jefe_cargo"), (int(id_jefe), int(id_cargo)))
+                            actualizados += cursor_save.rowcount
+                        except sql.IntegrityError:
+                            rechazados.append(int(id_cargo))
+
+                    registrar_cambio_bd(conn_save)
                     conn_save.commit()
-                    conn_save.close()
-                    
-                    st.success(f"✅ ¡{actualizados} asignación(es) guardada(s) correctamente!")
-                    
-                    time.sleep(3)
-                    
-                    # Limpiar
-                    st.session_state.asignaciones_jefes = {}
-                    st.session_state.guardar_jefes_clicked = False
-                    st.session_state.jefes_guardados = True
-                    
-                    st.rerun()
-                    
-                except Exception as e:
-                    st.error(f"❌ Error: {str(e)}")
-                    import traceback
-                    st.code(traceback.format_exc())
-                    st.session_state.guardar_jefes_clicked = False
-                    if 'conn_save' in locals():
-                        conn_save.rollback()
-                        conn_save.close()
-        else:
-            st.error("❌ Completa todas las asignaciones")
-            st.session_state.guardar_jefes_clicked = False
+
+                notificar(f"¡{actualizados} asignación(es) guardada(s) correctamente!")
+                if rechazados:
+                    notificar(
+                        f"{len(rechazados)} asignación(es) se rechazaron porque formaban un ciclo en la cadena de mando.",
+                        "error",
+                    )
+                st.session_state.asignaciones_jefes = {}
+                st.session_state.editor_jefes_version = contador_editor + 1
+                st.rerun()
+
+            except Exception as e:
+                st.error(f"❌ Error: {str(e)}")
+                import traceback
+                st.code(traceback.format_exc())
     
-    if len(st.session_state.asignaciones_jefes) < len(cargos_sin_jefe):
-        st.info(f"⏸️ Completa todas las asignaciones para continuar ({len(cargos_sin_jefe) - len(st.session_state.asignaciones_jefes)} pendientes)")
+    if len(asignaciones) < len(cargos_sin_jefe):
+        st.info(f"⏸️ Completa todas las asignaciones para continuar ({len(cargos_sin_jefe) - len(asignaciones)} pendientes)")
     
     return False
 
 
 # Ejecutar (con pestañas)
+iniciar_traza_rerun()
+
 # Inicializar base de datos (solo si no existe)
 init_database()
 
@@ -1727,8 +2380,9 @@ uploaded_file = st.file_uploader(
     on_change=reiniciar_estado_por_upload,
 )
 
-if 'df_fuente' not in st.session_state:
-    st.session_state.df_fuente = None
+# Solo se guarda el resumen del archivo ({nombre, filas, columnas}); sus filas quedan en FuenteFilas
+if 'fuente' not in st.session_state:
+    st.session_state.fuente = None
 if 'archivo_procesado' not in st.session_state:
     st.session_state.archivo_procesado = False
 
@@ -1737,41 +2391,39 @@ if uploaded_file is not None:
         try:
             reset_database_file()
             init_database()
-            nombre = uploaded_file.name.lower()
-            if nombre.endswith('.csv'):
-                df = pd.read_csv(uploaded_file)
-            else:
-                try:
-                    df = pd.read_excel(uploaded_file)
-                except Exception as e:
-                    st.error("Error al leer XLSX. Asegurate de tener 'openpyxl' instalado.")
-                    raise
-            st.session_state.df_fuente = df
-            msg_block = st.empty()
-            with msg_block.container():
-                insert_data(df)
-                sincronizar_nuevos_kpis(df)
-                st.success("Archivo cargado y datos insertados (si aplicaba)")
-            time.sleep(3)
-            msg_block.empty()
+            lotes = fuente.leer_archivo_por_lotes(uploaded_file, uploaded_file.name)
+            try:
+                st.session_state.fuente = fuente.guardar_fuente(lotes, uploaded_file.name)
+            except ImportError:
+                st.error("Error al leer XLSX. Asegurate de tener 'openpyxl' instalado.")
+                raise
+            insert_data()
+            sincronizar_nuevos_kpis()
+            notificar("Archivo cargado y datos insertados (si aplicaba)")
             st.session_state.archivo_procesado = True
         except Exception as e:
             st.error(f"No se pudo procesar el archivo: {e}")
 else:
     # Si antes habia archivo cargado y ahora no, reiniciar todo
-    if st.session_state.df_fuente is not None:
+    if st.session_state.fuente is not None:
         reset_database_file()
         for key in list(st.session_state.keys()):
-            del st.session_state[key]
+            if key != "workspace_id":
+                del st.session_state[key]
         st.rerun()
     else:
         st.info("Sube un archivo CSV/XLSX para continuar con el ajuste de datos")
 
+mostrar_notificaciones()
+mostrar_snapshots()
+
 # Pestañas principales
-tab_ajuste, tab_organigrama, tab_hoja3 = st.tabs(["Ajuste de datos", "Organigrama", "Archivo Actualizado"])
+tab_ajuste, tab_organigrama, tab_cascada, tab_hoja3, tab_validacion = st.tabs(
+    ["Ajuste de datos", "Organigrama", "Cascada estratégica", "Archivo Actualizado", "Validación"]
+)
 
-with tab_ajuste:
-    if st.session_state.df_fuente is None:
+with tab_ajuste, tramo("pestaña_ajuste"):
+    if st.session_state.fuente is None:
         st.warning("Sube un archivo en la parte superior para comenzar.")
     else:
         # Paso 1
@@ -1811,7 +2463,7 @@ with tab_ajuste:
         else:
             st.info("Completa los Pasos 1 y 2 antes de asignar indicadores")
 
-with tab_organigrama:
+with tab_organigrama, tramo("pestaña_organigrama"):
     if (
         st.session_state.get('niveles_guardados', False)
         and st.session_state.get('jefes_guardados', False)
@@ -1821,27 +2473,46 @@ with tab_organigrama:
     else:
         st.warning("Termina el ajuste de datos en la pestaña 'Ajuste de datos' para ver el organigrama")
 
-with tab_hoja3:
+with tab_cascada, tramo("pestaña_cascada"):
+    st.write("## Cascada de indicadores estratégicos")
+    if st.session_state.get('indicadores_asignados', False):
+        mostrar_cascada_estrategica()
+    else:
+        st.warning("Termina el ajuste de datos en la pestaña 'Ajuste de datos' para ver la cascada de indicadores")
+
+with tab_hoja3, tramo("pestaña_archivo_actualizado"):
     st.write("## Archivo Actualizado")
-    if st.session_state.df_fuente is None:
+    if st.session_state.fuente is None:
         st.info("Sube un archivo en la parte superior para ver el detalle de KPIs.")
     else:
-        df_hoja3 = generar_df_hoja3(st.session_state.df_fuente)
+        # DataFrame y .xlsx compartidos entre reruns mientras la BD no cambie: no se modifican aquí
+        df_hoja3 = obtener_df_hoja3()
         if df_hoja3.empty:
             st.warning("No hay KPIs registrados en la base de datos.")
         else:
             st.dataframe(df_hoja3, use_container_width=True, height=400)
             st.caption("Este resumen se actualiza automáticamente al modificar los KPIs en el organigrama.")
 
-            # Build Excel payload so the download button serves an .xlsx file
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine="openpyxl") as writer:
-                df_hoja3.to_excel(writer, index=False, sheet_name="KPIs")
-            output.seek(0)
             st.download_button(
                 "Descargar archivo actualizado (.xlsx)",
-                data=output.getvalue(),
+                data=obtener_excel_hoja3(),
                 file_name="archivo_actualizado.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 use_container_width=True,
             )
+
+with tab_validacion, tramo("pestaña_validacion"):
+    st.write("## Validación de la organización")
+    if st.session_state.fuente is None:
+        st.info("Sube un archivo en la parte superior para validar la organización.")
+    else:
+        mostrar_reporte_validacion()
+
+    with st.expander("📈 Caché de datos"):
+        filas_cache = estadisticas_cache()
+        if filas_cache:
+            st.dataframe(pd.DataFrame(filas_cache), hide_index=True, use_container_width=True)
+        else:
+            st.caption("Aún no se han consultado datos cacheados.")
+
+mostrar_panel_rendimiento()
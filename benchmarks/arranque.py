@@ -0,0 +1,91 @@
+"""Mide el costo de arranque en frío de la app y del núcleo `organigrama`.
+
+Cada medición corre en un proceso nuevo con `python -X importtime`, así que no hay módulos
+precargados. Reporta la mediana del tiempo total de importación, los módulos más costosos y
+falla si LangChain se carga al importar la app (MARIA debe importarse solo al usarse).
+
+Uso: python benchmarks/arranque.py [--repeticiones 5] [--top 10]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que no deben importarse en el arranque
+DIFERIDOS = ("langchain", "langchain_openai", "streamlit_agraph")
+
+OBJETIVOS = {
+    "organigrama": "import organigrama",
+    "app": "import app",
+}
+
+def medir_importacion(codigo):
+    """Importa en un proceso nuevo y devuelve el tiempo total (s), {dependencia directa: acumulado_us}
+    y los módulos diferidos que se cargaron.
+
+    Corre en una carpeta temporal (con una copia de `.streamlit/`) para que la BD que crea la app al
+    importarse no quede en el repositorio.
+    """
+    sonda = f"{codigo}\nimport sys\nprint('|'.join(m for m in {DIFERIDOS!r} if m in sys.modules))"
+    with tempfile.TemporaryDirectory() as carpeta:
+        config = os.path.join(RAIZ, ".streamlit")
+        if os.path.isdir(config):
+            shutil.copytree(config, os.path.join(carpeta, ".streamlit"))
+        else:
+            os.makedirs(os.path.join(carpeta, ".streamlit"))
+            open(os.path.join(carpeta, ".streamlit", "secrets.toml"), "w").close()
+        resultado = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", sonda],
+            cwd=carpeta,
+            capture_output=True,
+            text=True,
+            env={**os.environ, "PYTHONPATH": RAIZ},
+        )
+    if resultado.returncode != 0:
+        raise RuntimeError(resultado.stderr.strip().splitlines()[-1])
+
+    # La sangría del nombre indica quién importó a quién: nivel 0 son las importaciones del proceso
+    # (su acumulado incluye todo lo demás) y nivel 1 lo que importó directamente el objetivo
+    total = 0
+    dependencias = {}
+    for linea in resultado.stderr.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        _, acumulado, modulo = linea[len("import time:"):].split("|")
+        nivel = (len(modulo) - len(modulo.lstrip()) - 1) // 2
+        if nivel == 0:
+            total += int(acumulado)
+        elif nivel == 1:
+            dependencias[modulo.strip()] = int(acumulado)
+    lineas = resultado.stdout.strip().splitlines()
+    cargados = [modulo for modulo in lineas[-1].split("|") if modulo] if lineas else []
+    return total / 1e6, dependencias, cargados
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    codigo_salida = 0
+    for nombre, codigo in OBJETIVOS.items():
+        totales = []
+        for _ in range(args.repeticiones):
+            total, dependencias, cargados = medir_importacion(codigo)
+            totales.append(total)
+        print(f"{nombre}: mediana {statistics.median(totales):.3f} s (mín {min(totales):.3f} s, {args.repeticiones} corridas)")
+
+        for modulo, acumulado in sorted(dependencias.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"    {acumulado / 1e6:7.3f} s  {modulo}")
+        if cargados:
+            print(f"    ERROR: se importaron en el arranque: {', '.join(cargados)}")
+            codigo_salida = 1
+    return codigo_salida
+
+if __name__ == "__main__":
+    sys.exit(main())
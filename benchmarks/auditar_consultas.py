@@ -0,0 +1,121 @@
+"""Audita con EXPLAIN QUERY PLAN todas las consultas de `organigrama.consultas` sobre una BD grande.
+
+Carga una organización sintética (`datos_sinteticos.generar_organizacion`) en una BD temporal, o usa
+una existente con `--bd`, y pide a SQLite el plan de cada consulta registrada con parámetros NULL.
+Una consulta `caliente` que recorre completa (SCAN) una tabla fuera de sus `escaneos_permitidos`
+es un fallo; en las demás el escaneo solo se informa. Las subconsultas correlacionadas se anotan
+porque corren una vez por fila.
+
+Uso: python benchmarks/auditar_consultas.py [--cargos 10000] [--bd organizacion.db] [--detalle]
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from datos_sinteticos import generar_organizacion  # noqa: E402
+from organigrama.bd import cerrar_conexion_bd, configurar_ruta_bd, init_database  # noqa: E402
+from organigrama.consultas import CONSULTAS  # noqa: E402
+from organigrama.ingesta import insert_data  # noqa: E402
+
+# "SCAN Cargos", "SCAN c" (alias) o "SCAN TABLE Cargos AS c" según la versión de SQLite. Recorrer
+# completo un índice ("SCAN c USING INDEX ...") también cuesta O(filas), así que cuenta igual.
+_ESCANEO = re.compile(r"^SCAN (?:TABLE )?(\w+)\b(?: AS (\w+))?")
+# Las tablas FTS5 siempre aparecen como "SCAN CargosFts VIRTUAL TABLE INDEX 0:M1"; con MATCH (la "M"
+# del índice) es una búsqueda en el índice invertido, no un recorrido
+_BUSQUEDA_FTS = re.compile(r"VIRTUAL TABLE INDEX \d+:\S*M")
+_ALIAS = r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?"
+
+def alias_de_tablas(sql, tablas):
+    """{alias o nombre: tabla} de las tablas reales que aparecen en FROM/JOIN."""
+    alias = {}
+    for tabla, nombre in re.findall(_ALIAS, sql, flags=re.IGNORECASE):
+        if tabla in tablas:
+            alias[tabla] = tabla
+            if nombre and nombre.upper() not in {"WHERE", "JOIN", "LEFT", "INNER", "ON", "GROUP", "ORDER", "LIMIT"}:
+                alias[nombre] = tabla
+    return alias
+
+def plan_de_consulta(conn, sql):
+    parametros = (None,) * sql.count("?")
+    return [fila[3] for fila in conn.execute(f"EXPLAIN QUERY PLAN {sql}", parametros)]
+
+def auditar(conn):
+    """Devuelve [(nombre, caliente, escaneos, permitidos, notas, plan)] de todas las consultas."""
+    tablas = {fila[0] for fila in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    resultados = []
+    for nombre, registro in CONSULTAS.items():
+        plan = plan_de_consulta(conn, registro["sql"])
+        alias = alias_de_tablas(registro["sql"], tablas)
+        escaneos, notas = [], []
+        for paso in plan:
+            coincidencia = _ESCANEO.match(paso)
+            if coincidencia and not _BUSQUEDA_FTS.search(paso):
+                tabla = alias.get(coincidencia.group(2) or coincidencia.group(1), coincidencia.group(1))
+                # Los SCAN de subconsultas, CTE o json_each no son tablas de la BD
+                if tabla in tablas:
+                    escaneos.append(tabla)
+            if "CORRELATED" in paso:
+                notas.append(paso.strip())
+        resultados.append((nombre, registro["caliente"], list(dict.fromkeys(escaneos)), registro["escaneos_permitidos"], notas, plan))
+    return resultados
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cargos", type=int, default=10000, help="tamaño de la organización sintética")
+    parser.add_argument("--bd", help="audita sobre esta BD existente en lugar de generar una")
+    parser.add_argument("--detalle", action="store_true", help="imprime el plan completo de cada consulta")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = args.bd
+        if ruta is None:
+            ruta = os.path.join(carpeta, "auditoria.db")
+            configurar_ruta_bd(lambda: ruta)
+            try:
+                init_database()
+                insert_data(generar_organizacion(args.cargos))
+            finally:
+                cerrar_conexion_bd(ruta)
+                configurar_ruta_bd(None)
+        conn = sqlite3.connect(ruta)
+        try:
+            conn.execute("ANALYZE")
+            resultados = auditar(conn)
+        finally:
+            conn.close()
+
+    fallos = []
+    for nombre, caliente, escaneos, permitidos, notas, plan in resultados:
+        prohibidos = [tabla for tabla in escaneos if tabla not in permitidos]
+        if caliente and prohibidos:
+            estado = "FALLO"
+            fallos.append(nombre)
+        elif prohibidos:
+            estado = "escaneo"
+        elif escaneos:
+            estado = "permitido"
+        else:
+            estado = "ok"
+        marca = "*" if caliente else " "
+        detalle = f"SCAN {', '.join(escaneos)}" if escaneos else ""
+        print(f"{marca} {nombre:<34} {estado:<10} {detalle}")
+        for nota in notas:
+            print(f"      nota: {nota}")
+        if args.detalle:
+            for paso in plan:
+                print(f"      | {paso}")
+
+    print(f"{len(resultados)} consultas auditadas (* = caliente)")
+    if fallos:
+        print(f"ERROR: consultas calientes con escaneo completo: {', '.join(fallos)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
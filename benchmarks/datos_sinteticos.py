@@ -0,0 +1,191 @@
+"""Genera archivos fuente sintéticos con las mismas columnas que `data/tst.xlsx`, de cualquier tamaño.
+
+La organización parte de un CEO (que, como en los archivos reales, solo aparece en "Responde al
+Cargo") y se llena por niveles hasta `cargos` cargos, con `ramificacion` subordinados promedio por
+jefe y a lo sumo `profundidad` niveles bajo el CEO. Cada cargo tiene `kpis_por_cargo` filas cuyos
+pesos suman 100; los nombres de KPI se repiten entre cargos como en los archivos reales. Con la
+misma semilla el resultado es idéntico.
+
+Uso: python benchmarks/datos_sinteticos.py --cargos 10000 [--profundidad 6] [--ramificacion 8] [--salida sintetico.xlsx]
+"""
+import argparse
+import math
+import random
+import sys
+
+import pandas as pd
+
+COLUMNAS = [
+    "Indicador",
+    "Fórmula",
+    "Frecuencia",
+    "Fuente",
+    "Responsable",
+    "Meta",
+    "Sentido",
+    "Área",
+    "Departamento",
+    "Cargo",
+    "Responde al Cargo",
+    "Nivel Jerárquico",
+    "Alineado a",
+    "Observaciones",
+    "Alineado (archivo)",
+    "Peso",
+]
+
+RAIZ = "CEO"
+NIVELES = [
+    "Vicepresidente",
+    "Director",
+    "Gerente",
+    "Jefe / Coordinador",
+    "Profesional / Analista",
+    "Asistente / Auxiliar",
+    "Operativo",
+]
+AREAS = {
+    "Finanzas": ["Tesorería", "Contabilidad", "Presupuesto"],
+    "Operaciones": ["Logística", "Mantenimiento", "Producción"],
+    "Comercial": ["Ventas", "Cartera", "Servicio al Cliente"],
+    "Tecnología": ["Infraestructura", "Desarrollo", "Datos"],
+    "Recursos Humanos": ["Selección", "Nómina", "Bienestar"],
+    "Riesgo": ["Crédito", "Cumplimiento", "Seguridad"],
+    "Mercadeo": ["Marca", "Canales Digitales", "Investigación de Mercados"],
+    "Jurídica": ["Contratos", "Litigios", "Regulación"],
+}
+INDICADORES = [
+    "EBITDA",
+    "Incremento en Ventas",
+    "Satisfacción del cliente",
+    "Tasa de Adaptación a Nuevo Mercado",
+    "Eficiencia Operativa",
+    "Gestión del Talento",
+    "Rentabilidad de la Cartera",
+    "Transformación Digital",
+]
+TEMAS = [
+    "Conversión",
+    "Cartera Vencida",
+    "Rotación de Personal",
+    "Satisfacción del Cliente",
+    "Entregas a Tiempo",
+    "Ejecución Presupuestal",
+    "Incidentes Reportados",
+    "Recaudo",
+    "Productividad",
+    "Capacitación",
+    "Calidad de Datos",
+    "Disponibilidad de Sistemas",
+]
+METRICAS = {
+    "Tasa de": ("(N° de {tema} / Total de casos) * 100", ">= 90%", "ASC"),
+    "Índice de": ("{tema} del periodo / {tema} del periodo anterior", ">= 1", "ASC"),
+    "Tiempo Promedio de": ("Suma de días de {tema} / N° de casos", "≤ 3 días", "DESC"),
+    "Costo de": ("Costo total de {tema} / N° de casos", "≤ presupuesto", "DESC"),
+    "Cumplimiento de": ("(Metas de {tema} cumplidas / Metas de {tema} planeadas) * 100", "100%", "ASC"),
+}
+FRECUENCIAS = ["Mensual", "Trimestral", "Semestral", "Anual"]
+FUENTES = ["Sistema de CRM", "ERP", "Sistema de RRHH", "Sistema de Gestión de Calidad", "Bodega de Datos"]
+
+def generar_organizacion(cargos=1000, profundidad=6, ramificacion=None, kpis_por_cargo=4, semilla=0):
+    """Devuelve un DataFrame con una fila por KPI de cada uno de los `cargos` cargos bajo el CEO.
+
+    El nivel d tiene unos ramificacion**d cargos y cada uno responde a un jefe al azar del nivel
+    anterior. Sin `ramificacion` se usa la que llena justo `profundidad` niveles.
+    """
+    if ramificacion is None:
+        bajo, alto = 1.0, float(cargos)
+        for _ in range(60):
+            medio = (bajo + alto) / 2
+            bajo, alto = (medio, alto) if sum(medio ** d for d in range(1, profundidad + 1)) < cargos else (bajo, medio)
+        ramificacion = alto
+    if sum(math.ceil(ramificacion ** d) for d in range(1, profundidad + 1)) < cargos:
+        raise ValueError(
+            f"Con profundidad {profundidad} y ramificación {ramificacion} no caben {cargos} cargos; "
+            "aumenta alguna de las dos."
+        )
+    rng = random.Random(semilla)
+
+    jefes = [(RAIZ, None, None)]  # (cargo, área, departamento)
+    organizacion = []
+    contador_nombres = {}
+    for nivel in range(profundidad):
+        cantidad = min(math.ceil(ramificacion ** (nivel + 1)), cargos - len(organizacion))
+        puesto = NIVELES[min(nivel, len(NIVELES) - 1)]
+        siguientes = []
+        for _ in range(cantidad):
+            jefe, area, departamento = rng.choice(jefes)
+            area = area or rng.choice(list(AREAS))
+            # Los vicepresidentes abren un área y los directores un departamento; el resto los hereda
+            if nivel == 1:
+                departamento = rng.choice(AREAS[area])
+            base = f"{puesto} de {departamento or area}"
+            contador_nombres[base] = contador_nombres.get(base, 0) + 1
+            nombre = f"{base} {contador_nombres[base]}"
+            organizacion.append((nombre, jefe, puesto, area, departamento or area))
+            siguientes.append((nombre, area, departamento))
+        jefes = siguientes
+        if len(organizacion) >= cargos:
+            break
+
+    # Catálogo de KPIs: crece con el tamaño para que cada nombre lo compartan unos pocos cargos
+    combinaciones = [(metrica, tema) for metrica in METRICAS for tema in TEMAS]
+    variantes = max(1, math.ceil(cargos * kpis_por_cargo / (5 * len(combinaciones))))
+    catalogo = []
+    for variante in range(variantes):
+        for metrica, tema in combinaciones:
+            formula, meta, sentido = METRICAS[metrica]
+            sufijo = f" {variante + 1}" if variante else ""
+            catalogo.append((f"{metrica} {tema}{sufijo}", formula.format(tema=tema.lower()), meta, sentido))
+
+    pesos = [100 // kpis_por_cargo] * kpis_por_cargo
+    pesos[-1] += 100 - sum(pesos)
+    filas = []
+    for nombre, jefe, puesto, area, departamento in organizacion:
+        for (indicador, formula, meta, sentido), peso in zip(rng.sample(catalogo, kpis_por_cargo), pesos):
+            alineado = rng.choice(INDICADORES)
+            filas.append((
+                indicador,
+                formula,
+                rng.choice(FRECUENCIAS),
+                rng.choice(FUENTES),
+                nombre,
+                meta,
+                sentido,
+                area,
+                departamento,
+                nombre,
+                jefe,
+                puesto,
+                alineado,
+                f"Mide {indicador.lower()} del cargo.",
+                alineado,
+                peso,
+            ))
+    return pd.DataFrame(filas, columns=COLUMNAS)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cargos", type=int, default=1000)
+    parser.add_argument("--profundidad", type=int, default=6)
+    parser.add_argument("--ramificacion", type=float, help="subordinados promedio por jefe")
+    parser.add_argument("--kpis-por-cargo", type=int, default=4)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", default="sintetico.xlsx", help="archivo .xlsx o .csv")
+    args = parser.parse_args(argv)
+
+    try:
+        df = generar_organizacion(args.cargos, args.profundidad, args.ramificacion, args.kpis_por_cargo, args.semilla)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if args.salida.lower().endswith(".csv"):
+        df.to_csv(args.salida, index=False)
+    else:
+        df.to_excel(args.salida, index=False)
+    print(f"{df['Cargo'].nunique()} cargos y {len(df)} filas en {args.salida}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""Mide los pasos costosos de la app sobre organizaciones sintéticas y los compara con una línea base.
+
+Para cada tamaño genera un archivo con `datos_sinteticos.generar_organizacion`, lo carga en una BD
+temporal y mide la mediana de `insert_data`, `construir_arbol_organizacional`, el layout del
+organigrama (`calcular_posiciones`), `generar_df_hoja3` y la exportación a Excel. Aparte mide
+`emparejar_nombres_jefe` con nombres de jefe con una errata contra una organización de 50k cargos,
+que además debe quedar por debajo de `LIMITE_EMPAREJAMIENTO` segundos. Los tiempos se comparan con
+`benchmarks/baselines.json` y el comando falla si algún paso es más lento que la línea base por
+encima de la tolerancia. Las líneas base dependen de la máquina: regenéralas con `--guardar` al
+cambiar de equipo o tras una mejora intencional.
+
+Uso: python benchmarks/suite.py [--tamanos 1k 10k 100k] [--repeticiones 3] [--tolerancia 1.5] [--guardar]
+                                [--sin-emparejamiento]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from datos_sinteticos import generar_organizacion  # noqa: E402
+from organigrama.arbol import calcular_posiciones, construir_arbol_organizacional  # noqa: E402
+from organigrama.bd import configurar_ruta_bd, init_database  # noqa: E402
+from organigrama.cli import borrar_bd  # noqa: E402
+from organigrama.exportar import generar_df_hoja3  # noqa: E402
+from organigrama.ingesta import insert_data  # noqa: E402
+from organigrama.texto import emparejar_nombres_jefe  # noqa: E402
+
+ARCHIVO_BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+PASOS = ["insert_data", "construir_arbol_organizacional", "layout", "generar_df_hoja3", "exportar_excel"]
+CARGOS_EMPAREJAMIENTO = 50_000
+NOMBRES_EMPAREJAMIENTO = 5_000
+LIMITE_EMPAREJAMIENTO = 10.0
+
+def leer_tamano(texto):
+    """'10k' -> 10000, '2500' -> 2500."""
+    texto = texto.strip().lower()
+    return int(float(texto[:-1]) * 1000) if texto.endswith("k") else int(texto)
+
+def medir(func, repeticiones, preparar=None):
+    """Mediana en segundos de `repeticiones` llamadas a `func` (con `preparar()` antes de cada una, sin medir).
+
+    Como `timeit`, apaga el recolector de basura durante cada llamada: si no, sus pasadas dependen de
+    cuántos objetos dejaron vivos los pasos y tamaños anteriores, no del paso medido.
+    """
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        if preparar is not None:
+            preparar()
+        gc.collect()
+        gc.disable()
+        try:
+            inicio = time.perf_counter()
+            resultado = func()
+            tiempos.append(time.perf_counter() - inicio)
+        finally:
+            gc.enable()
+    return statistics.median(tiempos), resultado
+
+def medir_tamano(cargos, profundidad, ramificacion, repeticiones):
+    """Corre todos los pasos sobre una organización de `cargos` cargos; los tiempos quedan en "pasos"."""
+    df = generar_organizacion(cargos, profundidad, ramificacion)
+    tiempos = {}
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, "benchmark.db")
+        configurar_ruta_bd(lambda: ruta)
+
+        def bd_vacia():
+            borrar_bd(ruta)
+            init_database()
+
+        try:
+            tiempos["insert_data"], _ = medir(lambda: insert_data(df), repeticiones, bd_vacia)
+            tiempos["construir_arbol_organizacional"], arbol = medir(construir_arbol_organizacional, repeticiones)
+            tiempos["layout"], _ = medir(lambda: calcular_posiciones(arbol), repeticiones)
+            tiempos["generar_df_hoja3"], df_hoja3 = medir(generar_df_hoja3, repeticiones)
+
+            def exportar():
+                with pd.ExcelWriter(BytesIO(), engine="openpyxl") as writer:
+                    df_hoja3.to_excel(writer, index=False, sheet_name="KPIs")
+
+            tiempos["exportar_excel"], _ = medir(exportar, repeticiones)
+        finally:
+            borrar_bd(ruta)
+            configurar_ruta_bd(None)
+    return {
+        "cargos": cargos,
+        "filas": len(df),
+        "profundidad": profundidad,
+        "ramificacion": ramificacion,
+        "repeticiones": repeticiones,
+        "pasos": {paso: round(tiempos[paso], 4) for paso in PASOS},
+    }
+
+def nombres_con_errata(cargos, cantidad, semilla=0):
+    """Toma `cantidad` cargos al azar y les cambia, quita o agrega una letra en una posición al azar."""
+    rng = random.Random(semilla)
+    nombres = []
+    for nombre in rng.sample(cargos, cantidad):
+        i = rng.randrange(len(nombre))
+        letra = rng.choice("abcdefghijklmnopqrstuvwxyz")
+        nombres.append(rng.choice([
+            nombre[:i] + letra + nombre[i + 1:],
+            nombre[:i] + nombre[i + 1:],
+            nombre[:i] + letra + nombre[i:],
+        ]))
+    return nombres
+
+def medir_emparejamiento(repeticiones):
+    """Empareja NOMBRES_EMPAREJAMIENTO nombres con errata contra una organización de CARGOS_EMPAREJAMIENTO cargos."""
+    df = generar_organizacion(CARGOS_EMPAREJAMIENTO)
+    cargos = list(dict.fromkeys(df["Cargo"]))
+    nombres = nombres_con_errata(cargos, NOMBRES_EMPAREJAMIENTO)
+    segundos, (enlazados, ambiguos) = medir(lambda: emparejar_nombres_jefe(cargos, nombres), repeticiones)
+    return {
+        "cargos": len(cargos),
+        "nombres": len(nombres),
+        "enlazados": len(enlazados),
+        "ambiguos": len(ambiguos),
+        "repeticiones": repeticiones,
+        "segundos": round(segundos, 4),
+    }
+
+def leer_baselines():
+    if not os.path.exists(ARCHIVO_BASELINES):
+        return {}
+    with open(ARCHIVO_BASELINES, encoding="utf-8") as archivo:
+        return json.load(archivo)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tamanos", nargs="+", default=["1k", "10k"], help="cantidad de cargos (p.ej. 1k 10k 100k)")
+    parser.add_argument("--profundidad", type=int, default=6)
+    parser.add_argument("--ramificacion", type=float)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--tolerancia", type=float, default=1.5, help="razón máxima tiempo/línea base antes de fallar")
+    parser.add_argument("--guardar", action="store_true", help="guarda los tiempos medidos como nueva línea base")
+    parser.add_argument("--sin-emparejamiento", action="store_true", help="omite la medición de emparejar_nombres_jefe")
+    args = parser.parse_args(argv)
+
+    baselines = leer_baselines()
+    regresiones = []
+    for tamano in args.tamanos:
+        cargos = leer_tamano(tamano)
+        clave = f"{cargos // 1000}k" if cargos % 1000 == 0 else str(cargos)
+        medicion = medir_tamano(cargos, args.profundidad, args.ramificacion, args.repeticiones)
+        base = baselines.get("tamanos", {}).get(clave, {}).get("pasos", {})
+        print(f"{clave}: {medicion['cargos']} cargos, {medicion['filas']} filas")
+        for paso, segundos in medicion["pasos"].items():
+            linea = f"    {paso:<32} {segundos:9.3f} s"
+            if paso in base:
+                razon = segundos / base[paso] if base[paso] else float("inf")
+                linea += f"   base {base[paso]:.3f} s ({razon:.2f}x)"
+                # Los pasos de pocos milisegundos varían demasiado para compararlos con una razón
+                if razon > args.tolerancia and segundos - base[paso] > 0.01:
+                    linea += "  REGRESIÓN"
+                    regresiones.append(f"{clave}/{paso}")
+            print(linea)
+        if args.guardar:
+            baselines.setdefault("tamanos", {})[clave] = medicion
+
+    if not args.sin_emparejamiento:
+        medicion = medir_emparejamiento(args.repeticiones)
+        base = baselines.get("emparejamiento", {}).get("segundos")
+        print(
+            f"emparejamiento: {medicion['nombres']} nombres con errata contra {medicion['cargos']} cargos "
+            f"({medicion['enlazados']} enlazados, {medicion['ambiguos']} ambiguos)"
+        )
+        linea = f"    {'emparejar_nombres_jefe':<32} {medicion['segundos']:9.3f} s"
+        if base:
+            razon = medicion["segundos"] / base
+            linea += f"   base {base:.3f} s ({razon:.2f}x)"
+            if razon > args.tolerancia and medicion["segundos"] - base > 0.01:
+                linea += "  REGRESIÓN"
+                regresiones.append("emparejamiento")
+        if medicion["segundos"] > LIMITE_EMPAREJAMIENTO:
+            linea += f"  SUPERA {LIMITE_EMPAREJAMIENTO:.0f} s"
+            regresiones.append("emparejamiento (límite)")
+        print(linea)
+        if args.guardar:
+            baselines["emparejamiento"] = medicion
+
+    if args.guardar:
+        baselines["entorno"] = {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+        }
+        with open(ARCHIVO_BASELINES, "w", encoding="utf-8") as archivo:
+            json.dump(baselines, archivo, ensure_ascii=False, indent=2)
+        print(f"Líneas base guardadas en {ARCHIVO_BASELINES}")
+    if regresiones:
+        print(f"ERROR: pasos más lentos que la línea base: {', '.join(regresiones)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
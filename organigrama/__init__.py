@@ -0,0 +1,55 @@
+"""Núcleo sin interfaz de la calibración de KPIs: base de datos, ingesta, pesos, validación y exportación.
+
+No depende de Streamlit ni de LangChain, así que se puede usar desde scripts o por línea de comandos
+(`python -m organigrama ARCHIVO`).
+"""
+from .arbol import calcular_posiciones, construir_arbol_organizacional
+from .bd import (
+    DB_NAME,
+    al_cambiar_bd,
+    bd_abierta,
+    cerrar_conexion_bd,
+    conectar_bd,
+    configurar_ruta_bd,
+    designar_raices,
+    es_asignacion_ciclica,
+    init_database,
+    marcar_raices,
+    obtener_revision_bd,
+    reconstruir_jerarquia,
+    registrar_cambio_bd,
+    ruta_bd,
+)
+from .busqueda import LIMITE_RESULTADOS, buscar_en_organizacion, expresion_fts
+from .consultas import CONSULTAS, consulta, registrar_consulta
+from .diario import (
+    TABLAS_DIARIO,
+    actualizar_con_diario,
+    aplicar_inverso_diario,
+    configurar_sesion_diario,
+    eliminar_con_diario,
+    insertar_con_diario,
+    nuevo_grupo_diario,
+)
+from .exportar import generar_df_hoja3
+from .fuente import (
+    TAMANO_LOTE,
+    columnas_fuente,
+    contexto_cargo,
+    guardar_fuente,
+    leer_archivo_por_lotes,
+    leer_kpis_fuente,
+    lotes_de_dataframe,
+)
+from .ingesta import asignar_indicadores_estrategicos_a_ceo, insert_data, sincronizar_nuevos_kpis
+from .pesos import calcular_rebalanceo_pesos, rebalancear_pesos_kpis
+from .texto import (
+    buscar_columna_por_nombre,
+    buscar_en_indice,
+    construir_indice_nombres,
+    emparejar_nombres_jefe,
+    normalizar_nombre,
+    normalizar_texto,
+)
+from .traza import finalizar_traza, iniciar_traza, tramo, trazado
+from .validacion import detectar_ciclos, validar_organizacion
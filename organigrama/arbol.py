@@ -0,0 +1,105 @@
+"""Árbol jerárquico de la organización y posiciones del organigrama."""
+from .bd import conectar_bd
+from .consultas import consulta
+from .traza import trazado
+from .validacion import detectar_ciclos
+
+@trazado
+def construir_arbol_organizacional():
+    """Construye el árbol jerárquico de la organización desde la BD"""
+    with conectar_bd() as conn:
+        cursor = conn.cursor()
+
+        # Obtener todos los cargos con sus jefes
+        cursor.execute(consulta("cargos_arbol"))
+        cargos = cursor.fetchall()
+
+    # Crear diccionario de cargos por ID
+    cargo_map = {}
+    for id_cargo, nombre_cargo, fk_jefe, nivel_cargo, es_raiz in cargos:
+        cargo_map[id_cargo] = {
+            "name": nombre_cargo,
+            "id": id_cargo,
+            "fk_jefe": fk_jefe,
+            "nivel": nivel_cargo,
+            "es_raiz": bool(es_raiz),
+            "children": []
+        }
+
+    # Romper ciclos heredados de bases antiguas: el primer cargo de cada ciclo pasa a ser huérfano
+    padres = {
+        id_cargo: node["fk_jefe"]
+        for id_cargo, node in cargo_map.items()
+        if node["fk_jefe"] in cargo_map
+    }
+    ciclos, _ = detectar_ciclos(padres)
+    cortes = {ciclo[0] for ciclo in ciclos}
+
+    # Las raíces son los cargos designados (es_raiz); los demás sin jefe quedan huérfanos
+    raices = []
+    orfanos = []
+
+    for id_cargo, node in cargo_map.items():
+        if node["es_raiz"] and node["fk_jefe"] is None:
+            raices.append(node)
+        elif id_cargo in cortes:
+            orfanos.append(node)
+        elif node["fk_jefe"] is None:
+            orfanos.append(node)
+        else:
+            # Agregar como hijo al jefe
+            if node["fk_jefe"] in cargo_map:
+                cargo_map[node["fk_jefe"]]["children"].append(node)
+            else:
+                # Si el jefe no existe, agregar como huérfano
+                orfanos.append(node)
+
+    # Con una sola raíz los huérfanos cuelgan de ella; con varias (holding) o ninguna se arma un
+    # bosque bajo un nodo virtual que no se dibuja
+    if len(raices) == 1:
+        raices[0]["children"].extend(orfanos)
+        return raices[0]
+    return {"name": "Organización", "id": None, "bosque": True, "children": raices + orfanos}
+
+def obtener_id_nodo(nodo):
+    return nodo.get("id") if nodo.get("id") is not None else nodo["name"]
+
+@trazado
+def calcular_posiciones(arbol, espaciado_h=280, alto_nivel=220, desfase_resumen=110):
+    """Ubica cada cargo (`cargo_<id>`) y su resumen de KPIs (`cargo_<id>_kpis`) en el lienzo.
+
+    Las hojas se reparten a distancia uniforme y cada jefe queda centrado sobre sus subordinados.
+    En un bosque cada árbol se ubica a continuación del anterior y el nodo virtual no tiene posición.
+    Devuelve ({id_nodo: (x, y)}, ancho del lienzo).
+    """
+    posiciones = {}
+    contador_hojas = {"value": 0}
+
+    def asignar_posiciones(nodo, depth=0):
+        hijos = nodo.get("children", [])
+        if not hijos:
+            contador_hojas["value"] += 1
+            centro = contador_hojas["value"]
+        else:
+            centros_hijos = [asignar_posiciones(hijo, depth + 1) for hijo in hijos]
+            centro = sum(centros_hijos) / len(centros_hijos)
+
+        cargo_node_id = f"cargo_{obtener_id_nodo(nodo)}"
+        x_pos = centro * espaciado_h
+        posiciones[cargo_node_id] = (x_pos, depth * alto_nivel)
+        posiciones[f"{cargo_node_id}_kpis"] = (x_pos, depth * alto_nivel + desfase_resumen)
+        return centro
+
+    for nodo in arbol["children"] if arbol.get("bosque") else [arbol]:
+        asignar_posiciones(nodo)
+    if not posiciones:
+        return posiciones, espaciado_h
+
+    # Ajustar para centrar el organigrama en pantalla
+    min_x = min(pos[0] for pos in posiciones.values())
+    shift = -(min_x - espaciado_h)
+    for key in list(posiciones.keys()):
+        x, y = posiciones[key]
+        posiciones[key] = (x + shift, y)
+    max_x = max(pos[0] for pos in posiciones.values())
+    return posiciones, int(max_x + espaciado_h)
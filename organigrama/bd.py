@@ -0,0 +1,510 @@
+"""Acceso a la base de datos SQLite: conexiones compartidas, esquema, revisión y jerarquía."""
+import json
+import os
+import threading
+import time
+import uuid
+import sqlite3 as sql
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+from .consultas import consulta
+from .texto import normalizar_nombre
+from .traza import desinstrumentar_conexion, instrumentar_conexion
+
+DB_NAME = "organigrama_kpis.db"
+
+# Nombres (normalizados) que identifican a la raíz cuando ningún cargo tiene nivel "Presidencia"
+TITULOS_RAIZ = {"ceo", "presidente", "presidencia", "presidente ejecutivo", "gerente general", "director general"}
+
+# Las conexiones abiertas se comparten en un LRU, una por archivo de BD
+MAX_CONEXIONES_ABIERTAS = 32
+INACTIVIDAD_MAXIMA_S = 30 * 60
+_conexiones = OrderedDict()
+_conexiones_lock = threading.Lock()
+_resolver_ruta = None
+_escuchas_cambio = []
+
+def configurar_ruta_bd(resolver):
+    """Registra la función que decide la BD por defecto (p.ej. una por sesión en la app)."""
+    global _resolver_ruta
+    _resolver_ruta = resolver
+
+def ruta_bd():
+    """Ruta de la BD por defecto: la del resolver configurado o DB_NAME."""
+    return _resolver_ruta() if _resolver_ruta is not None else DB_NAME
+
+def al_cambiar_bd(escucha):
+    """Registra `escucha(ruta)`, llamada en cada escritura registrada y al cerrar la conexión de una BD.
+
+    `ruta` es None si la conexión no pertenece al pool (se debe asumir que cualquier BD cambió).
+    """
+    _escuchas_cambio.append(escucha)
+
+def _notificar_cambio(ruta):
+    for escucha in _escuchas_cambio:
+        escucha(ruta)
+
+def _ruta_de_conexion(conn):
+    with _conexiones_lock:
+        return next((ruta for ruta, entrada in _conexiones.items() if entrada["conn"] is conn), None)
+
+def _abrir_conexion(ruta):
+    """Devuelve la entrada del pool para `ruta`, abriéndola si hace falta y desalojando las inactivas."""
+    ahora = time.monotonic()
+    with _conexiones_lock:
+        entrada = _conexiones.get(ruta)
+        if entrada is not None:
+            _conexiones.move_to_end(ruta)
+            entrada["ultimo_uso"] = ahora
+            return entrada
+
+        # Desalojo: primero las inactivas, luego las menos usadas si se supera el máximo
+        for otra in list(_conexiones):
+            if len(_conexiones) < MAX_CONEXIONES_ABIERTAS and ahora - _conexiones[otra]["ultimo_uso"] < INACTIVIDAD_MAXIMA_S:
+                continue
+            candidata = _conexiones[otra]
+            if candidata["lock"].acquire(blocking=False):
+                try:
+                    candidata["conn"].close()
+                finally:
+                    candidata["lock"].release()
+                del _conexiones[otra]
+
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        conn = sql.connect(ruta, timeout=30.0, check_same_thread=False)
+        conn.execute("PRAGMA foreign_keys = ON")
+        entrada = {"conn": conn, "lock": threading.RLock(), "anidadas": 0, "ultimo_uso": ahora}
+        _conexiones[ruta] = entrada
+        return entrada
+
+@contextmanager
+def conectar_bd(ruta=None):
+    """Presta la conexión abierta de la BD `ruta` (por defecto `ruta_bd()`; una por archivo, en un LRU).
+
+    Al salir se revierte cualquier transacción que no se haya confirmado, como ocurría al cerrar
+    una conexión propia (solo al salir del uso más externo si hay usos anidados en el mismo hilo).
+    Si hay una traza activa (`organigrama.traza`), las consultas del préstamo se cronometran.
+    """
+    entrada = _abrir_conexion(ruta or ruta_bd())
+    with entrada["lock"]:
+        conn = entrada["conn"]
+        entrada["anidadas"] += 1
+        instrumentada = entrada["anidadas"] == 1 and instrumentar_conexion(conn)
+        try:
+            yield conn
+        finally:
+            entrada["anidadas"] -= 1
+            if not entrada["anidadas"] and conn.in_transaction:
+                conn.rollback()
+            if instrumentada:
+                desinstrumentar_conexion(conn)
+            entrada["ultimo_uso"] = time.monotonic()
+
+def bd_abierta(ruta):
+    """True si la BD de `ruta` tiene una conexión abierta en el pool."""
+    with _conexiones_lock:
+        return ruta in _conexiones
+
+def cerrar_conexion_bd(ruta=None):
+    """Cierra y saca del pool la conexión de `ruta` (necesario antes de borrar el archivo)."""
+    ruta = ruta or ruta_bd()
+    with _conexiones_lock:
+        entrada = _conexiones.pop(ruta, None)
+    if entrada is not None:
+        with entrada["lock"]:
+            entrada["conn"].close()
+    _notificar_cambio(ruta)
+
+def init_database(ruta=None):
+    """Inicializa la base de datos SOLO si no existe"""
+    with conectar_bd(ruta) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        
+        cursor = conn.cursor()
+        
+        # Verificar si las tablas ya existen
+        cursor.execute("""
+        SELECT name FROM sqlite_master 
+        WHERE type='table' AND name='Cargos'
+        """)
+        
+        if cursor.fetchone() is None:
+            # Las tablas NO existen, crearlas
+            cursor.executescript("""
+            DROP TABLE IF EXISTS CargosKpis;
+            DROP TABLE IF EXISTS Kpis;
+            DROP TABLE IF EXISTS IndicadoresEstrategicos;
+            DROP TABLE IF EXISTS Cargos;
+
+            CREATE TABLE IF NOT EXISTS Cargos (
+                id_cargo INTEGER PRIMARY KEY AUTOINCREMENT,
+                nombre_cargo TEXT UNIQUE NOT NULL,
+                nivel_cargo TEXT,
+                fk_jefe INTEGER,
+                es_raiz INTEGER NOT NULL DEFAULT 0,
+                CONSTRAINT fk_jefe_fk FOREIGN KEY (fk_jefe)
+                    REFERENCES Cargos(id_cargo)
+                    ON UPDATE CASCADE
+                    ON DELETE SET NULL,
+                CONSTRAINT no_self_ref CHECK (fk_jefe IS NULL OR fk_jefe <> id_cargo)
+            );
+
+            CREATE TABLE IF NOT EXISTS IndicadoresEstrategicos (
+                id_kpiEs INTEGER PRIMARY KEY AUTOINCREMENT,
+                nombre_kpiEs TEXT UNIQUE NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS Kpis (
+                id_kpi INTEGER PRIMARY KEY AUTOINCREMENT,
+                nombre_kpi TEXT UNIQUE NOT NULL,
+                formula_kpi TEXT,
+                fk_kpiEs INTEGER,
+                CONSTRAINT fk_kpiEs FOREIGN KEY (fk_kpiEs)
+                    REFERENCES IndicadoresEstrategicos(id_kpiEs)
+                    ON UPDATE CASCADE
+                    ON DELETE CASCADE
+            );
+
+            CREATE TABLE IF NOT EXISTS CargosKpis (
+                id_cargoKpi INTEGER PRIMARY KEY AUTOINCREMENT,
+                fk_cargo INTEGER,
+                fk_kpi INTEGER,
+                peso_kpi INTEGER,
+                peso_bloqueado INTEGER NOT NULL DEFAULT 0,
+                CONSTRAINT fk_cargo FOREIGN KEY (fk_cargo)
+                    REFERENCES Cargos(id_cargo)
+                    ON UPDATE CASCADE
+                    ON DELETE CASCADE,
+                CONSTRAINT fk_kpi FOREIGN KEY (fk_kpi)
+                    REFERENCES Kpis(id_kpi)
+                    ON UPDATE CASCADE
+                    ON DELETE CASCADE,
+                UNIQUE(fk_cargo, fk_kpi)
+            );
+            """)
+            conn.commit()
+            creada = True  # Base de datos recién creada
+        else:
+            # Las tablas ya existen
+            creada = False  # Base de datos ya existía
+
+        _migrar_esquema(conn)
+        return creada
+
+def _migrar_esquema(conn):
+    """Agrega a bases existentes las columnas y tablas incorporadas en versiones recientes."""
+    columnas_ck = {row[1] for row in conn.execute("PRAGMA table_info(CargosKpis)")}
+    if "peso_bloqueado" not in columnas_ck:
+        conn.execute("ALTER TABLE CargosKpis ADD COLUMN peso_bloqueado INTEGER NOT NULL DEFAULT 0")
+
+    # Raíces de la organización (una o varias, p.ej. en un holding); las bases antiguas se designan al migrar
+    columnas_cargos = {row[1] for row in conn.execute("PRAGMA table_info(Cargos)")}
+    designar = "es_raiz" not in columnas_cargos
+    if designar:
+        conn.execute("ALTER TABLE Cargos ADD COLUMN es_raiz INTEGER NOT NULL DEFAULT 0")
+
+    # Índices de apoyo para validaciones, agregados y recorridos de la jerarquía
+    conn.executescript("""
+    CREATE INDEX IF NOT EXISTS idx_cargos_jefe ON Cargos(fk_jefe);
+    CREATE INDEX IF NOT EXISTS idx_cargos_raiz ON Cargos(es_raiz, nombre_cargo);
+    CREATE INDEX IF NOT EXISTS idx_cargoskpis_cargo_peso ON CargosKpis(fk_cargo, peso_kpi);
+    CREATE INDEX IF NOT EXISTS idx_cargoskpis_kpi ON CargosKpis(fk_kpi);
+    CREATE INDEX IF NOT EXISTS idx_kpis_indicador ON Kpis(fk_kpiEs);
+    """)
+
+    # Tabla de clausura (ancestro, descendiente, profundidad) mantenida por triggers en cada cambio de fk_jefe
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS CargosJerarquia (
+        ancestro INTEGER NOT NULL,
+        descendiente INTEGER NOT NULL,
+        profundidad INTEGER NOT NULL,
+        PRIMARY KEY (ancestro, descendiente)
+    ) WITHOUT ROWID;
+
+    CREATE INDEX IF NOT EXISTS idx_jerarquia_descendiente ON CargosJerarquia(descendiente, profundidad);
+
+    CREATE TRIGGER IF NOT EXISTS trg_jerarquia_insert
+    AFTER INSERT ON Cargos
+    BEGIN
+        INSERT INTO CargosJerarquia (ancestro, descendiente, profundidad)
+        VALUES (NEW.id_cargo, NEW.id_cargo, 0);
+        INSERT INTO CargosJerarquia (ancestro, descendiente, profundidad)
+        SELECT ancestro, NEW.id_cargo, profundidad + 1
+        FROM CargosJerarquia
+        WHERE descendiente = NEW.fk_jefe;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_jerarquia_ciclo
+    BEFORE UPDATE OF fk_jefe ON Cargos
+    WHEN NEW.fk_jefe IS NOT NULL
+    BEGIN
+        SELECT RAISE(ABORT, 'La asignación crea un ciclo en la cadena de mando')
+        WHERE EXISTS (
+            SELECT 1 FROM CargosJerarquia
+            WHERE ancestro = NEW.id_cargo AND descendiente = NEW.fk_jefe
+        );
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_jerarquia_update
+    AFTER UPDATE OF fk_jefe ON Cargos
+    WHEN OLD.fk_jefe IS NOT NEW.fk_jefe
+    BEGIN
+        -- Desconectar el subárbol de sus ancestros anteriores
+        DELETE FROM CargosJerarquia
+        WHERE descendiente IN (SELECT descendiente FROM CargosJerarquia WHERE ancestro = NEW.id_cargo)
+          AND ancestro IN (
+              SELECT ancestro FROM CargosJerarquia
+              WHERE descendiente = NEW.id_cargo AND ancestro <> NEW.id_cargo
+          );
+        -- Colgar el subárbol de los ancestros del nuevo jefe
+        INSERT INTO CargosJerarquia (ancestro, descendiente, profundidad)
+        SELECT sup.ancestro, sub.descendiente, sup.profundidad + sub.profundidad + 1
+        FROM CargosJerarquia sup
+        JOIN CargosJerarquia sub ON sub.ancestro = NEW.id_cargo
+        WHERE sup.descendiente = NEW.fk_jefe;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_jerarquia_delete
+    AFTER DELETE ON Cargos
+    BEGIN
+        DELETE FROM CargosJerarquia WHERE descendiente = OLD.id_cargo;
+        DELETE FROM CargosJerarquia WHERE ancestro = OLD.id_cargo;
+    END;
+    """)
+
+    # Archivo fuente guardado por lotes (organigrama.fuente): columnas crudas y claves normalizadas
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS FuenteFilas (
+        orden INTEGER PRIMARY KEY,
+        cargo TEXT,
+        jefe TEXT,
+        nivel TEXT,
+        indicador TEXT,
+        formula TEXT,
+        alineado TEXT,
+        peso,
+        frecuencia TEXT,
+        fuente TEXT,
+        responsable TEXT,
+        meta TEXT,
+        sentido TEXT,
+        area TEXT,
+        departamento TEXT,
+        alineado_a TEXT,
+        observaciones TEXT,
+        cargo_norm TEXT NOT NULL DEFAULT '',
+        cargo_clave TEXT,
+        indicador_norm TEXT NOT NULL DEFAULT ''
+    );
+    CREATE INDEX IF NOT EXISTS idx_fuente_cargo ON FuenteFilas(cargo_clave, orden);
+    CREATE INDEX IF NOT EXISTS idx_fuente_indicador ON FuenteFilas(indicador_norm, cargo_norm, orden);
+    CREATE INDEX IF NOT EXISTS idx_fuente_indicador_crudo ON FuenteFilas(indicador, orden);
+    """)
+
+    # Búsqueda de texto (FTS5) en nombres de cargo, KPIs con su fórmula e indicadores estratégicos. Son
+    # tablas de contenido externo: guardan solo el índice y los triggers lo mantienen al día
+    crear_busqueda = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'CargosFts'").fetchone() is None
+    conn.executescript("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS CargosFts USING fts5(
+        nombre_cargo,
+        content='Cargos', content_rowid='id_cargo',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS KpisFts USING fts5(
+        nombre_kpi, formula_kpi,
+        content='Kpis', content_rowid='id_kpi',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS IndicadoresFts USING fts5(
+        nombre_kpiEs,
+        content='IndicadoresEstrategicos', content_rowid='id_kpiEs',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_busqueda_cargos_insert
+    AFTER INSERT ON Cargos
+    BEGIN
+        INSERT INTO CargosFts (rowid, nombre_cargo) VALUES (NEW.id_cargo, NEW.nombre_cargo);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_busqueda_cargos_update
+    AFTER UPDATE OF nombre_cargo ON Cargos
+    BEGIN
+        INSERT INTO CargosFts (CargosFts, rowid, nombre_cargo) VALUES ('delete', OLD.id_cargo, OLD.nombre_cargo);
+        INSERT INTO CargosFts (rowid, nombre_cargo) VALUES (NEW.id_cargo, NEW.nombre_cargo);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_busqueda_cargos_delete
+    AFTER DELETE ON Cargos
+    BEGIN
+        INSERT INTO CargosFts (CargosFts, rowid, nombre_cargo) VALUES ('delete', OLD.id_cargo, OLD.nombre_cargo);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_busqueda_kpis_insert
+    AFTER INSERT ON Kpis
+    BEGIN
+        INSERT INTO KpisFts (rowid, nombre_kpi, formula_kpi) VALUES (NEW.id_kpi, NEW.nombre_kpi, NEW.formula_kpi);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_busqueda_kpis_update
+    AFTER UPDATE OF nombre_kpi, formula_kpi ON Kpis
+    BEGIN
+        INSERT INTO KpisFts (KpisFts, rowid, nombre_kpi, formula_kpi)
+        VALUES ('delete', OLD.id_kpi, OLD.nombre_kpi, OLD.formula_kpi);
+        INSERT INTO KpisFts (rowid, nombre_kpi, formula_kpi) VALUES (NEW.id_kpi, NEW.nombre_kpi, NEW.formula_kpi);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_busqueda_kpis_delete
+    AFTER DELETE ON Kpis
+    BEGIN
+        INSERT INTO KpisFts (KpisFts, rowid, nombre_kpi, formula_kpi)
+        VALUES ('delete', OLD.id_kpi, OLD.nombre_kpi, OLD.formula_kpi);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_busqueda_indicadores_insert
+    AFTER INSERT ON IndicadoresEstrategicos
+    BEGIN
+        INSERT INTO IndicadoresFts (rowid, nombre_kpiEs) VALUES (NEW.id_kpiEs, NEW.nombre_kpiEs);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_busqueda_indicadores_update
+    AFTER UPDATE OF nombre_kpiEs ON IndicadoresEstrategicos
+    BEGIN
+        INSERT INTO IndicadoresFts (IndicadoresFts, rowid, nombre_kpiEs) VALUES ('delete', OLD.id_kpiEs, OLD.nombre_kpiEs);
+        INSERT INTO IndicadoresFts (rowid, nombre_kpiEs) VALUES (NEW.id_kpiEs, NEW.nombre_kpiEs);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_busqueda_indicadores_delete
+    AFTER DELETE ON IndicadoresEstrategicos
+    BEGIN
+        INSERT INTO IndicadoresFts (IndicadoresFts, rowid, nombre_kpiEs) VALUES ('delete', OLD.id_kpiEs, OLD.nombre_kpiEs);
+    END;
+    """)
+    if crear_busqueda:
+        # Bases existentes: indexar lo que ya tenían
+        for tabla in ("CargosFts", "KpisFts", "IndicadoresFts"):
+            conn.execute(f"INSERT INTO {tabla} ({tabla}) VALUES ('rebuild')")
+
+    # Revisión de la BD: cada escritura la incrementa para invalidar los resultados cacheados
+    conn.execute("CREATE TABLE IF NOT EXISTS Metadatos (clave TEXT PRIMARY KEY, valor TEXT)")
+    conn.executemany(
+        "INSERT OR IGNORE INTO Metadatos (clave, valor) VALUES (?, ?)",
+        [("id_bd", uuid.uuid4().hex), ("revision", "0")],
+    )
+
+    # Diario de cambios de KPIs: solo admite inserciones; deshacer agrega los cambios inversos
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS DiarioCambios (
+        id_cambio INTEGER PRIMARY KEY AUTOINCREMENT,
+        grupo TEXT NOT NULL,
+        descripcion TEXT,
+        sesion TEXT,
+        tabla TEXT NOT NULL,
+        id_fila INTEGER NOT NULL,
+        operacion TEXT NOT NULL CHECK (operacion IN ('insert', 'update', 'delete')),
+        antes TEXT,
+        despues TEXT,
+        creado TEXT NOT NULL DEFAULT (datetime('now'))
+    );
+    CREATE INDEX IF NOT EXISTS idx_diario_grupo ON DiarioCambios(grupo);
+
+    CREATE TRIGGER IF NOT EXISTS trg_diario_sin_update
+    BEFORE UPDATE ON DiarioCambios
+    BEGIN
+        SELECT RAISE(ABORT, 'El diario de cambios solo admite inserciones');
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_diario_sin_delete
+    BEFORE DELETE ON DiarioCambios
+    BEGIN
+        SELECT RAISE(ABORT, 'El diario de cambios solo admite inserciones');
+    END;
+    """)
+
+    hay_cargos = conn.execute(consulta("hay_cargos")).fetchone()
+    hay_jerarquia = conn.execute("SELECT 1 FROM CargosJerarquia LIMIT 1").fetchone()
+    if hay_cargos and not hay_jerarquia:
+        reconstruir_jerarquia(conn)
+    if hay_cargos and designar and designar_raices(conn):
+        registrar_cambio_bd(conn)
+    conn.commit()
+
+def registrar_cambio_bd(conn):
+    """Incrementa la revisión de la BD dentro de la transacción de escritura en curso y avisa a las escuchas."""
+    conn.execute(consulta("incrementar_revision_bd"))
+    _notificar_cambio(_ruta_de_conexion(conn))
+
+def obtener_revision_bd(ruta=None):
+    """Devuelve un identificador de la revisión actual de la BD (cambia con cada escritura o reinicio)."""
+    with conectar_bd(ruta) as conn:
+        valores = dict(conn.execute(consulta("revision_bd")))
+    return f"{valores.get('id_bd', '')}:{valores.get('revision', '0')}"
+
+def reconstruir_jerarquia(conn):
+    """Recalcula por completo la tabla de clausura a partir de Cargos.fk_jefe (ignora enlaces en ciclo)."""
+    filas = conn.execute("SELECT id_cargo, fk_jefe FROM Cargos").fetchall()
+    padres = {id_cargo: fk_jefe for id_cargo, fk_jefe in filas}
+    hijos = defaultdict(list)
+    raices = []
+    for id_cargo, fk_jefe in filas:
+        if fk_jefe is not None and fk_jefe in padres:
+            hijos[fk_jefe].append(id_cargo)
+        else:
+            raices.append(id_cargo)
+
+    # Los cargos atrapados en un ciclo no cuelgan de ninguna raíz: solo conservan su fila propia
+    cierre = [(id_cargo, id_cargo, 0) for id_cargo in padres]
+    for raiz in raices:
+        camino = []
+        pila = [(raiz, 0)]
+        while pila:
+            nodo, nivel = pila.pop()
+            del camino[nivel:]
+            for profundidad, ancestro in enumerate(reversed(camino), 1):
+                cierre.append((ancestro, nodo, profundidad))
+            camino.append(nodo)
+            pila.extend((hijo, nivel + 1) for hijo in hijos[nodo])
+
+    conn.execute("DELETE FROM CargosJerarquia")
+    conn.executemany(
+        "INSERT INTO CargosJerarquia (ancestro, descendiente, profundidad) VALUES (?, ?, ?)",
+        cierre,
+    )
+    conn.commit()
+
+def designar_raices(conn):
+    """Marca como raíces los cargos sin jefe que encabezan la organización y devuelve sus ids.
+
+    Se toman los de nivel "Presidencia"; si no hay, los que se llaman exactamente como un título
+    de TITULOS_RAIZ (sin acentos ni mayúsculas, así "Asistente del CEO" no cuenta) y, si tampoco,
+    el único cargo sin jefe cuando hay uno solo. Los demás se designan a mano con `marcar_raices`.
+    """
+    candidatos = conn.execute(consulta("candidatos_raiz")).fetchall()
+    raices = [id_cargo for id_cargo, _, nivel in candidatos if normalizar_nombre(nivel) == "presidencia"]
+    if not raices:
+        raices = [id_cargo for id_cargo, nombre, _ in candidatos if normalizar_nombre(nombre) in TITULOS_RAIZ]
+    if not raices and len(candidatos) == 1:
+        raices = [candidatos[0][0]]
+    if raices:
+        marcar_raices(conn, raices)
+    return raices
+
+def marcar_raices(conn, ids_cargos, es_raiz=True):
+    """Designa (o deja de designar) raíces a `ids_cargos`; una raíz no tiene jefe, así que se le quita.
+
+    No confirma la transacción ni registra el cambio: lo hace quien llama.
+    """
+    ids = json.dumps([int(id_cargo) for id_cargo in ids_cargos])
+    conn.execute(consulta("marcar_raices" if es_raiz else "desmarcar_raices"), (ids,))
+
+def es_asignacion_ciclica(cursor, id_cargo, id_jefe):
+    """Indica si asignar `id_jefe` como jefe de `id_cargo` cerraría un ciclo en la cadena de mando."""
+    cursor.execute(
+        consulta("es_ancestro"),
+        (int(id_cargo), int(id_jefe)),
+    )
+    return cursor.fetchone() is not None
@@ -0,0 +1,31 @@
+"""Búsqueda de texto completo (FTS5) en cargos, KPIs con su fórmula e indicadores estratégicos.
+
+Los índices CargosFts, KpisFts e IndicadoresFts se crean en `bd._migrar_esquema` y los mantienen
+triggers en cada cambio de las tablas, así que no hace falta reconstruirlos. Ignoran acentos y
+mayúsculas ("nomina" encuentra "Nómina").
+"""
+import re
+
+from .bd import conectar_bd
+from .consultas import consulta
+from .traza import trazado
+
+LIMITE_RESULTADOS = 50
+
+def expresion_fts(texto):
+    """'tasa conv' -> '"tasa"* "conv"*': cada palabra como prefijo y todas obligatorias ('' si no hay palabras)."""
+    return " ".join(f'"{palabra}"*' for palabra in re.findall(r"\w+", texto or ""))
+
+@trazado
+def buscar_en_organizacion(texto, limite=LIMITE_RESULTADOS):
+    """Cargos cuyo nombre, algún KPI (nombre o fórmula) o el indicador estratégico de un KPI coincide con `texto`.
+
+    Devuelve [(id_cargo, nombre_cargo, tipo, coincidencia)] con tipo 'Cargo', 'KPI' o 'Indicador
+    estratégico', en ese orden y luego por relevancia (bm25). `coincidencia` marca entre « » las
+    palabras encontradas.
+    """
+    expresion = expresion_fts(texto)
+    if not expresion:
+        return []
+    with conectar_bd() as conn:
+        return conn.execute(consulta("buscar_en_organizacion"), (expresion, expresion, expresion, limite)).fetchall()
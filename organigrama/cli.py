@@ -0,0 +1,117 @@
+"""Línea de comandos: carga un archivo, valida la organización y exporta el archivo actualizado.
+
+Uso: python -m organigrama ARCHIVO [--bd RUTA] [--salida archivo_actualizado.xlsx] [--reiniciar] [--traza traza.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from .bd import DB_NAME, cerrar_conexion_bd, configurar_ruta_bd, init_database
+from .exportar import generar_df_hoja3
+from .fuente import guardar_fuente, leer_archivo_por_lotes
+from .ingesta import asignar_indicadores_estrategicos_a_ceo, insert_data, sincronizar_nuevos_kpis
+from .traza import finalizar_traza, iniciar_traza, tramo
+from .validacion import validar_organizacion
+
+def borrar_bd(ruta):
+    """Cierra y elimina la BD junto con sus archivos -wal y -shm."""
+    cerrar_conexion_bd(ruta)
+    for sufijo in ("", "-wal", "-shm"):
+        if os.path.exists(ruta + sufijo):
+            os.remove(ruta + sufijo)
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m organigrama",
+        description="Carga un archivo de estructura organizacional y genera el archivo actualizado de KPIs.",
+    )
+    parser.add_argument("archivo", help="archivo fuente .xlsx o .csv")
+    parser.add_argument("--bd", default=DB_NAME, help=f"base de datos SQLite a usar (por defecto {DB_NAME})")
+    parser.add_argument("--salida", default="archivo_actualizado.xlsx", help="archivo Excel de salida")
+    parser.add_argument("--reiniciar", action="store_true", help="borra la base de datos antes de cargar")
+    parser.add_argument("--reporte", help="guarda el reporte de validación en este archivo JSON")
+    parser.add_argument("--traza", help="guarda los tramos y el tiempo de cada consulta SQL en este archivo JSON")
+    return parser
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    configurar_ruta_bd(lambda: args.bd)
+    contexto = {}
+
+    def inicializar():
+        if args.reiniciar:
+            borrar_bd(args.bd)
+        return "BD creada" if init_database() else "BD existente"
+
+    def cargar():
+        resumen = guardar_fuente(leer_archivo_por_lotes(args.archivo), os.path.basename(args.archivo))
+        return f"{resumen['filas']} filas"
+
+    def insertar():
+        resumen = insert_data()
+        if resumen["omitido"]:
+            return f"omitido, la BD ya contiene {resumen['omitido']} cargos"
+        detalle = f"{len(resumen['enlazados'])} jefes enlazados, {len(resumen['ambiguos'])} ambiguos"
+        if resumen["ciclos_rechazados"]:
+            detalle += f", {resumen['ciclos_rechazados']} relaciones en ciclo omitidas"
+        return detalle + f", {len(resumen['raices'])} raíz(ces) designada(s)"
+
+    def sincronizar():
+        resumen = sincronizar_nuevos_kpis()
+        if resumen is None:
+            return "sin columna 'Indicador'"
+        return f"{len(resumen['kpis'])} KPIs y {len(resumen['indicadores'])} indicadores nuevos"
+
+    def asignar_ceo():
+        resultado = asignar_indicadores_estrategicos_a_ceo()
+        if not resultado["raices"]:
+            raise RuntimeError("No hay ningún cargo raíz (CEO) designado en la BD")
+        return (
+            f"{resultado['asignados']} asignaciones de {resultado['indicadores']} indicadores "
+            f"a {len(resultado['raices'])} raíz(ces)"
+        )
+
+    def validar():
+        contexto["reporte"] = validar_organizacion()
+        if args.reporte:
+            with open(args.reporte, "w", encoding="utf-8") as archivo:
+                json.dump(contexto["reporte"], archivo, ensure_ascii=False, indent=2)
+        totales = contexto["reporte"]["totales"]
+        return ", ".join(f"{clave}={valor}" for clave, valor in totales.items())
+
+    def exportar():
+        df_hoja3 = generar_df_hoja3()
+        df_hoja3.to_excel(args.salida, index=False, sheet_name="KPIs")
+        return f"{len(df_hoja3)} filas en {args.salida}"
+
+    pasos = [
+        ("Inicializar BD", inicializar),
+        ("Leer archivo", cargar),
+        ("Insertar datos", insertar),
+        ("Sincronizar KPIs", sincronizar),
+        ("Indicadores al CEO", asignar_ceo),
+        ("Validar", validar),
+        ("Exportar", exportar),
+    ]
+    if args.traza:
+        iniciar_traza("cli")
+    inicio_total = time.perf_counter()
+    try:
+        for numero, (nombre, paso) in enumerate(pasos, 1):
+            inicio = time.perf_counter()
+            try:
+                with tramo(nombre):
+                    detalle = paso()
+            except Exception as e:
+                print(f"[{numero}/{len(pasos)}] {nombre} falló: {e}", file=sys.stderr)
+                return 1
+            print(f"[{numero}/{len(pasos)}] {nombre}: {detalle} ({time.perf_counter() - inicio:.2f} s)")
+    finally:
+        registro = finalizar_traza()
+        if registro is not None:
+            with open(args.traza, "w", encoding="utf-8") as archivo:
+                json.dump(registro, archivo, ensure_ascii=False, indent=2)
+    print(f"Listo en {time.perf_counter() - inicio_total:.2f} s")
+    return 0
@@ -0,0 +1,509 @@
+"""Registro central de las consultas SQL de la app y del núcleo, cada una con un nombre.
+
+El código ejecuta `consulta(nombre)` en lugar de escribir el SQL en línea, así cada sentencia se
+puede auditar: `benchmarks/auditar_consultas.py` corre EXPLAIN QUERY PLAN sobre todas las
+registradas contra una BD sintética grande y falla si una consulta `caliente` (las que corren en
+cada rerun o interacción) recorre completa una tabla que no esté en `escaneos_permitidos`.
+
+Quedan fuera el esquema (DDL y PRAGMA), los helpers del diario, que arman el SQL con el nombre de
+la tabla, y las inserciones masivas de la ingesta.
+"""
+
+CONSULTAS = {}
+
+def registrar_consulta(nombre, sql, caliente=False, escaneos_permitidos=()):
+    """Agrega `sql` al registro con `nombre` y lo devuelve."""
+    if nombre in CONSULTAS:
+        raise ValueError(f"La consulta '{nombre}' ya está registrada")
+    CONSULTAS[nombre] = {
+        "sql": sql,
+        "caliente": caliente,
+        "escaneos_permitidos": frozenset(escaneos_permitidos),
+    }
+    return sql
+
+def consulta(nombre):
+    """SQL de la consulta registrada con `nombre`."""
+    return CONSULTAS[nombre]["sql"]
+
+# --- Metadatos y jerarquía -------------------------------------------------------------------
+
+# Metadatos tiene dos filas: recorrerla es más barato que buscar cada clave
+registrar_consulta("revision_bd", """
+SELECT clave, valor FROM Metadatos WHERE clave IN ('id_bd', 'revision')
+""", caliente=True, escaneos_permitidos=("Metadatos",))
+
+registrar_consulta("incrementar_revision_bd", """
+UPDATE Metadatos SET valor = CAST(valor AS INTEGER) + 1 WHERE clave = 'revision'
+""", caliente=True)
+
+registrar_consulta("renovar_id_bd", """
+UPDATE Metadatos SET valor = ? WHERE clave = 'id_bd'
+""")
+
+registrar_consulta("hay_cargos", """
+SELECT 1 FROM Cargos LIMIT 1
+""")
+
+registrar_consulta("es_ancestro", """
+SELECT 1 FROM CargosJerarquia WHERE ancestro = ? AND descendiente = ?
+""", caliente=True)
+
+registrar_consulta("subordinados", """
+SELECT c.id_cargo, c.nombre_cargo, j.profundidad
+FROM CargosJerarquia j
+JOIN Cargos c ON c.id_cargo = j.descendiente
+WHERE j.ancestro = ? AND j.profundidad > 0
+ORDER BY j.profundidad, c.nombre_cargo
+""", caliente=True)
+
+registrar_consulta("cadena_de_mando", """
+SELECT c.id_cargo, c.nombre_cargo, j.profundidad
+FROM CargosJerarquia j
+JOIN Cargos c ON c.id_cargo = j.ancestro
+WHERE j.descendiente = ? AND j.profundidad > 0
+ORDER BY j.profundidad
+""", caliente=True)
+
+# Cargos de los subárboles de una lista de cargos, pasada como arreglo JSON en un solo parámetro
+registrar_consulta("descendientes_de_cargos", """
+SELECT descendiente FROM CargosJerarquia
+WHERE ancestro IN (SELECT value FROM json_each(?))
+""", caliente=True)
+
+# --- Cargos ------------------------------------------------------------------------------------
+
+registrar_consulta("cargos_arbol", """
+SELECT id_cargo, nombre_cargo, fk_jefe, nivel_cargo, es_raiz
+FROM Cargos
+ORDER BY id_cargo
+""")
+
+registrar_consulta("cargos_jefes_niveles", """
+SELECT id_cargo, fk_jefe, nivel_cargo FROM Cargos
+""")
+
+registrar_consulta("cargos_con_hijos", """
+SELECT DISTINCT c1.id_cargo, c1.nombre_cargo
+FROM Cargos c1
+WHERE EXISTS (
+    SELECT 1 FROM Cargos c2 WHERE c2.fk_jefe = c1.id_cargo
+)
+ORDER BY c1.nombre_cargo
+""")
+
+registrar_consulta("nombre_cargo_por_id", """
+SELECT nombre_cargo FROM Cargos WHERE id_cargo = ?
+""", caliente=True)
+
+registrar_consulta("jefe_de_cargo", """
+SELECT fk_jefe FROM Cargos WHERE id_cargo = ?
+""", caliente=True)
+
+registrar_consulta("id_cargo_por_nombre", """
+SELECT id_cargo FROM Cargos WHERE nombre_cargo = ?
+""", caliente=True)
+
+registrar_consulta("subordinados_directos", """
+SELECT id_cargo FROM Cargos WHERE fk_jefe = ?
+""", caliente=True)
+
+registrar_consulta("actualizar_jefe_cargo", """
+UPDATE Cargos
+SET fk_jefe = ?
+WHERE id_cargo = ?
+""", caliente=True)
+
+registrar_consulta("eliminar_cargo_sin_dependencias", """
+DELETE FROM Cargos
+WHERE id_cargo = ?
+  AND NOT EXISTS (SELECT 1 FROM Cargos WHERE fk_jefe = ?)
+  AND NOT EXISTS (SELECT 1 FROM CargosKpis WHERE fk_cargo = ?)
+""", caliente=True)
+
+registrar_consulta("candidatos_jefe", """
+SELECT id_cargo, nombre_cargo, nivel_cargo
+FROM Cargos
+ORDER BY
+    CASE WHEN nivel_cargo = 'Presidencia' THEN 0 ELSE 1 END,
+    nombre_cargo
+""")
+
+# --- Raíces (CEO) --------------------------------------------------------------------------------
+# `es_raiz` se fija al cargar el archivo (bd.designar_raices) o a mano en el paso de jefes
+
+registrar_consulta("raices", """
+SELECT id_cargo, nombre_cargo
+FROM Cargos
+WHERE es_raiz = 1
+ORDER BY nombre_cargo
+""", caliente=True)
+
+registrar_consulta("quitar_jefe_raices", """
+UPDATE Cargos
+SET fk_jefe = NULL
+WHERE es_raiz = 1 AND fk_jefe IS NOT NULL
+""", caliente=True)
+
+registrar_consulta("cargos_sin_jefe", """
+SELECT id_cargo, nombre_cargo, nivel_cargo
+FROM Cargos
+WHERE fk_jefe IS NULL AND es_raiz = 0
+ORDER BY nombre_cargo
+""", caliente=True)
+
+registrar_consulta("candidatos_raiz", """
+SELECT id_cargo, nombre_cargo, nivel_cargo
+FROM Cargos
+WHERE fk_jefe IS NULL
+""")
+
+registrar_consulta("marcar_raices", """
+UPDATE Cargos
+SET es_raiz = 1, fk_jefe = NULL
+WHERE id_cargo IN (SELECT value FROM json_each(?))
+""", caliente=True)
+
+registrar_consulta("desmarcar_raices", """
+UPDATE Cargos
+SET es_raiz = 0
+WHERE id_cargo IN (SELECT value FROM json_each(?))
+""", caliente=True)
+
+# --- Niveles jerárquicos -----------------------------------------------------------------------
+
+registrar_consulta("asignar_nivel_presidencia", """
+UPDATE Cargos
+SET nivel_cargo = 'Presidencia'
+WHERE es_raiz = 1 AND nivel_cargo IS NOT 'Presidencia'
+""", caliente=True)
+
+registrar_consulta("actualizar_nivel_cargo", """
+UPDATE Cargos
+SET nivel_cargo = ?
+WHERE id_cargo = ?
+""", caliente=True)
+
+registrar_consulta("niveles_existentes", """
+SELECT DISTINCT nivel_cargo
+FROM Cargos
+WHERE nivel_cargo IS NOT NULL
+  AND nivel_cargo != 'NULL'
+  AND nivel_cargo != 'N/A'
+  AND TRIM(nivel_cargo) != ''
+ORDER BY nivel_cargo
+""", caliente=True, escaneos_permitidos=("Cargos",))
+
+registrar_consulta("cargos_sin_nivel", """
+SELECT c.id_cargo, c.nombre_cargo, COALESCE(jefe.nombre_cargo, ''), c.fk_jefe
+FROM Cargos c
+LEFT JOIN Cargos jefe ON c.fk_jefe = jefe.id_cargo
+WHERE (c.nivel_cargo IS NULL
+   OR c.nivel_cargo = 'NULL'
+   OR c.nivel_cargo = 'N/A'
+   OR TRIM(c.nivel_cargo) = '')
+  AND c.es_raiz = 0
+ORDER BY c.nombre_cargo
+""", caliente=True, escaneos_permitidos=("Cargos",))
+
+registrar_consulta("rango_niveles", """
+SELECT c.nivel_cargo, AVG(d.profundidad)
+FROM Cargos c
+JOIN (
+    SELECT descendiente, MAX(profundidad) AS profundidad
+    FROM CargosJerarquia
+    GROUP BY descendiente
+) d ON d.descendiente = c.id_cargo
+WHERE c.nivel_cargo IS NOT NULL
+  AND c.nivel_cargo NOT IN ('NULL', 'N/A')
+  AND TRIM(c.nivel_cargo) != ''
+GROUP BY c.nivel_cargo
+""")
+
+# --- KPIs ----------------------------------------------------------------------------------------
+
+registrar_consulta("indicadores_estrategicos", """
+SELECT id_kpiEs, nombre_kpiEs
+FROM IndicadoresEstrategicos
+ORDER BY nombre_kpiEs
+""")
+
+registrar_consulta("kpis_por_cargo", """
+SELECT ck.id_cargoKpi,
+       ck.fk_cargo,
+       k.nombre_kpi,
+       ck.peso_kpi,
+       COALESCE(k.formula_kpi, ''),
+       COALESCE(ies.nombre_kpiEs, '')
+FROM CargosKpis ck
+JOIN Kpis k ON ck.fk_kpi = k.id_kpi
+LEFT JOIN IndicadoresEstrategicos ies ON k.fk_kpiEs = ies.id_kpiEs
+ORDER BY ck.fk_cargo, k.nombre_kpi
+""")
+
+registrar_consulta("kpis_cargo", """
+SELECT ck.id_cargoKpi,
+       k.nombre_kpi,
+       k.formula_kpi,
+       ck.peso_kpi,
+       k.id_kpi,
+       ies.nombre_kpiEs,
+       k.fk_kpiEs,
+       ck.peso_bloqueado
+FROM CargosKpis ck
+JOIN Kpis k ON ck.fk_kpi = k.id_kpi
+LEFT JOIN IndicadoresEstrategicos ies ON k.fk_kpiEs = ies.id_kpiEs
+WHERE ck.fk_cargo = ?
+ORDER BY k.nombre_kpi
+""", caliente=True)
+
+registrar_consulta("id_kpi_por_nombre", """
+SELECT id_kpi FROM Kpis WHERE nombre_kpi = ?
+""", caliente=True)
+
+registrar_consulta("crear_kpi_de_indicador", """
+INSERT INTO Kpis (nombre_kpi, fk_kpiEs)
+VALUES (?, ?)
+""")
+
+registrar_consulta("asignar_kpi_a_cargo", """
+INSERT OR IGNORE INTO CargosKpis (fk_cargo, fk_kpi, peso_kpi)
+VALUES (?, ?, ?)
+""")
+
+registrar_consulta("pesos_kpis_cargo", """
+SELECT id_cargoKpi, fk_cargo, peso_kpi AS peso, peso_bloqueado AS bloqueado
+FROM CargosKpis
+WHERE fk_cargo = ?
+""", caliente=True)
+
+registrar_consulta("pesos_kpis_subarbol", """
+SELECT ck.id_cargoKpi, ck.fk_cargo, ck.peso_kpi AS peso, ck.peso_bloqueado AS bloqueado
+FROM CargosJerarquia j
+JOIN CargosKpis ck ON ck.fk_cargo = j.descendiente
+WHERE j.ancestro = ?
+""", caliente=True)
+
+registrar_consulta("actualizar_peso_kpi", """
+UPDATE CargosKpis SET peso_kpi = ? WHERE id_cargoKpi = ?
+""", caliente=True)
+
+registrar_consulta("anotar_pesos_en_diario", """
+INSERT INTO DiarioCambios (grupo, descripcion, sesion, tabla, id_fila, operacion, antes, despues)
+VALUES (?, ?, ?, 'CargosKpis', ?, 'update', ?, ?)
+""", caliente=True)
+
+# --- Roll-up y cascada ----------------------------------------------------------------------------
+
+registrar_consulta("rollup_kpis", """
+WITH por_cargo AS (
+    SELECT fk_cargo, COUNT(*) AS kpis, COALESCE(SUM(peso_kpi), 0) AS peso
+    FROM CargosKpis
+    GROUP BY fk_cargo
+),
+indicadores_por_cargo AS (
+    SELECT DISTINCT ck.fk_cargo, k.fk_kpiEs
+    FROM CargosKpis ck
+    JOIN Kpis k ON k.id_kpi = ck.fk_kpi
+    WHERE k.fk_kpiEs IS NOT NULL
+),
+totales AS (
+    SELECT j.ancestro,
+           COUNT(*) AS cargos,
+           COALESCE(SUM(pc.kpis), 0) AS kpis,
+           COALESCE(SUM(pc.peso), 0) AS peso
+    FROM CargosJerarquia j
+    LEFT JOIN por_cargo pc ON pc.fk_cargo = j.descendiente
+    GROUP BY j.ancestro
+),
+indicadores AS (
+    SELECT j.ancestro, GROUP_CONCAT(DISTINCT ipc.fk_kpiEs) AS lista
+    FROM CargosJerarquia j
+    JOIN indicadores_por_cargo ipc ON ipc.fk_cargo = j.descendiente
+    GROUP BY j.ancestro
+)
+SELECT t.ancestro, t.cargos, t.kpis, t.peso, i.lista
+FROM totales t
+LEFT JOIN indicadores i ON i.ancestro = t.ancestro
+""")
+
+registrar_consulta("mapa_cascada", """
+SELECT ies.id_kpiEs,
+       ies.nombre_kpiEs,
+       k.id_kpi,
+       k.nombre_kpi,
+       ck.fk_cargo AS id_cargo,
+       c.nombre_cargo,
+       (
+           SELECT MAX(j.profundidad) FROM CargosJerarquia j
+           WHERE j.descendiente = ck.fk_cargo
+       ) AS profundidad
+FROM IndicadoresEstrategicos ies
+LEFT JOIN Kpis k ON k.fk_kpiEs = ies.id_kpiEs
+LEFT JOIN CargosKpis ck ON ck.fk_kpi = k.id_kpi
+LEFT JOIN Cargos c ON c.id_cargo = ck.fk_cargo
+ORDER BY ies.nombre_kpiEs, profundidad, c.nombre_cargo
+""")
+
+# --- Búsqueda de texto (FTS5) --------------------------------------------------------------------
+# Cargos que coinciden por su nombre, por el nombre o la fórmula de un KPI asignado o por el indicador
+# estratégico de uno de sus KPIs. Los tres parámetros de MATCH son la misma expresión FTS5.
+# Una fila por cargo y tipo de coincidencia: con MIN(rango) SQLite toma `coincidencia` de la fila
+# mejor puntuada del grupo, así que un cargo con varios KPIs coincidentes muestra un solo fragmento
+registrar_consulta("buscar_en_organizacion", """
+SELECT m.id_cargo, c.nombre_cargo, m.tipo, m.coincidencia
+FROM (
+    SELECT id_cargo, prioridad, tipo, coincidencia, MIN(rango) AS rango
+    FROM (
+        SELECT CargosFts.rowid AS id_cargo, 0 AS prioridad, 'Cargo' AS tipo,
+               highlight(CargosFts, 0, '«', '»') AS coincidencia, bm25(CargosFts) AS rango
+        FROM CargosFts
+        WHERE CargosFts MATCH ?
+        UNION ALL
+        SELECT ck.fk_cargo, 1, 'KPI',
+               highlight(KpisFts, 0, '«', '»') || COALESCE(' = ' || highlight(KpisFts, 1, '«', '»'), ''),
+               bm25(KpisFts)
+        FROM KpisFts
+        JOIN CargosKpis ck ON ck.fk_kpi = KpisFts.rowid
+        WHERE KpisFts MATCH ?
+        UNION ALL
+        SELECT ck.fk_cargo, 2, 'Indicador estratégico',
+               highlight(IndicadoresFts, 0, '«', '»'), bm25(IndicadoresFts)
+        FROM IndicadoresFts
+        JOIN Kpis k ON k.fk_kpiEs = IndicadoresFts.rowid
+        JOIN CargosKpis ck ON ck.fk_kpi = k.id_kpi
+        WHERE IndicadoresFts MATCH ?
+    )
+    GROUP BY id_cargo, prioridad
+) m
+JOIN Cargos c ON c.id_cargo = m.id_cargo
+ORDER BY m.prioridad, m.rango, c.nombre_cargo
+LIMIT ?
+""", caliente=True)
+
+# --- Archivo fuente (FuenteFilas) ---------------------------------------------------------------
+
+registrar_consulta("columnas_fuente", """
+SELECT valor FROM Metadatos WHERE clave = 'fuente_columnas'
+""")
+
+registrar_consulta("guardar_columnas_fuente", """
+INSERT OR REPLACE INTO Metadatos (clave, valor) VALUES ('fuente_columnas', ?)
+""")
+
+registrar_consulta("contexto_cargo_fuente", """
+SELECT area, departamento, jefe, nivel
+FROM FuenteFilas
+WHERE cargo_clave = ?
+ORDER BY orden
+""", caliente=True)
+
+registrar_consulta("kpis_fuente", """
+SELECT indicador AS "Indicador", formula AS "Fórmula", alineado AS "Alineado (archivo)"
+FROM FuenteFilas
+WHERE orden IN (
+    SELECT MIN(orden) FROM FuenteFilas
+    WHERE indicador_norm != ''
+    GROUP BY indicador_norm
+)
+ORDER BY orden
+""")
+
+# --- Exportación y validación ---------------------------------------------------------------------
+
+# Espacios que quita str.strip() (con el que se normalizan las claves de FuenteFilas)
+_ESPACIOS = "char(32, 9, 10, 11, 12, 13, 160)"
+
+# Cada KPI de cada cargo toma las columnas extra de la primera fila del archivo con ese indicador y
+# cargo o, si no hay, de la primera con ese indicador
+registrar_consulta("hoja3", f"""
+SELECT
+    h.nombre_kpi,
+    h.formula_kpi,
+    h.peso_kpi,
+    h.nombre_cargo,
+    h.nombre_jefe,
+    h.nivel_cargo,
+    h.nombre_kpiEs,
+    fx.frecuencia,
+    fx.fuente,
+    fx.responsable,
+    fx.meta,
+    fx.sentido,
+    fx.area,
+    fx.departamento,
+    fx.alineado_a,
+    fx.observaciones
+FROM (
+    SELECT
+        k.nombre_kpi,
+        k.formula_kpi,
+        ck.peso_kpi,
+        c.nombre_cargo,
+        jefe.nombre_cargo AS nombre_jefe,
+        c.nivel_cargo,
+        ies.nombre_kpiEs,
+        COALESCE(
+            (
+                SELECT f.orden FROM FuenteFilas f
+                WHERE f.indicador_norm = TRIM(k.nombre_kpi, {_ESPACIOS})
+                  AND f.cargo_norm = TRIM(c.nombre_cargo, {_ESPACIOS})
+                ORDER BY f.orden LIMIT 1
+            ),
+            (
+                SELECT f.orden FROM FuenteFilas f
+                WHERE f.indicador_norm = TRIM(k.nombre_kpi, {_ESPACIOS})
+                ORDER BY f.orden LIMIT 1
+            )
+        ) AS orden_fuente
+    FROM Kpis k
+    LEFT JOIN CargosKpis ck ON ck.fk_kpi = k.id_kpi
+    LEFT JOIN Cargos c ON ck.fk_cargo = c.id_cargo
+    LEFT JOIN Cargos jefe ON c.fk_jefe = jefe.id_cargo
+    LEFT JOIN IndicadoresEstrategicos ies ON k.fk_kpiEs = ies.id_kpiEs
+) h
+LEFT JOIN FuenteFilas fx ON fx.orden = h.orden_fuente
+ORDER BY h.nombre_kpi, h.nombre_cargo
+""")
+
+registrar_consulta("contar_cargos", """
+SELECT COUNT(*) FROM Cargos
+""")
+
+registrar_consulta("validar_pesos", """
+SELECT c.id_cargo,
+       c.nombre_cargo,
+       COUNT(ck.fk_cargo),
+       COALESCE(SUM(ck.peso_kpi), 0)
+FROM Cargos c
+LEFT JOIN CargosKpis ck ON ck.fk_cargo = c.id_cargo
+GROUP BY c.id_cargo
+HAVING COUNT(ck.fk_cargo) = 0 OR COALESCE(SUM(ck.peso_kpi), 0) <> 100
+ORDER BY c.nombre_cargo
+""")
+
+# Cargos que no cuelgan de su jefe en la tabla de clausura: o el jefe no existe, o el enlace quedó
+# en un ciclo heredado de una BD anterior a trg_jerarquia_ciclo (que `reconstruir_jerarquia`
+# descarta, junto con todo lo que cuelga de él). Sin ORDER BY: ordenar por nombre obligaría a
+# recorrer Cargos por su índice de nombres; las pocas filas se ordenan en Python
+registrar_consulta("validar_enlaces_jefe", """
+SELECT c.id_cargo, c.nombre_cargo, c.fk_jefe, jefe.id_cargo IS NOT NULL AS jefe_existe
+FROM Cargos c
+LEFT JOIN Cargos jefe ON jefe.id_cargo = c.fk_jefe
+WHERE c.fk_jefe IS NOT NULL
+  AND NOT EXISTS (
+      SELECT 1 FROM CargosJerarquia j
+      WHERE j.ancestro = c.fk_jefe AND j.descendiente = c.id_cargo
+  )
+""")
+
+registrar_consulta("validar_kpis_sin_indicador", """
+SELECT k.id_kpi, k.nombre_kpi, COUNT(ck.fk_kpi)
+FROM Kpis k
+LEFT JOIN IndicadoresEstrategicos ies ON k.fk_kpiEs = ies.id_kpiEs
+LEFT JOIN CargosKpis ck ON ck.fk_kpi = k.id_kpi
+WHERE ies.id_kpiEs IS NULL
+GROUP BY k.id_kpi
+ORDER BY k.nombre_kpi
+""")
+
@@ -0,0 +1,129 @@
+"""Diario de cambios de KPIs: escrituras que anotan su inverso para poder deshacerlas."""
+import json
+import uuid
+import sqlite3 as sql
+
+from .bd import conectar_bd, registrar_cambio_bd
+
+# Tablas cuyas ediciones se anotan en el diario de cambios, con su llave primaria
+TABLAS_DIARIO = {"CargosKpis": "id_cargoKpi", "Kpis": "id_kpi"}
+# Filas que ON DELETE CASCADE borraría sin anotarlas al eliminar una fila de la tabla: (tabla, llave foránea)
+DEPENDIENTES_DIARIO = {"Kpis": ("CargosKpis", "fk_kpi")}
+_resolver_sesion = None
+
+def nuevo_grupo_diario():
+    """Identificador de un grupo de cambios del diario (una acción del usuario)."""
+    return uuid.uuid4().hex
+
+def configurar_sesion_diario(resolver):
+    """Registra la función que identifica la sesión que firma los cambios del diario."""
+    global _resolver_sesion
+    _resolver_sesion = resolver
+
+def sesion_diario():
+    """Sesión con la que se anotan los cambios (vacía fuera de la app)."""
+    return _resolver_sesion() if _resolver_sesion is not None else ""
+
+def _leer_fila(cursor, tabla, id_fila):
+    cursor.execute(f"SELECT * FROM {tabla} WHERE {TABLAS_DIARIO[tabla]} = ?", (id_fila,))
+    fila = cursor.fetchone()
+    return dict(zip([columna[0] for columna in cursor.description], fila)) if fila else None
+
+def _anotar_en_diario(cursor, grupo, descripcion, tabla, id_fila, operacion, antes, despues):
+    cursor.execute("""
+    INSERT INTO DiarioCambios (grupo, descripcion, sesion, tabla, id_fila, operacion, antes, despues)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        grupo,
+        descripcion,
+        sesion_diario(),
+        tabla,
+        int(id_fila),
+        operacion,
+        None if antes is None else json.dumps(antes, ensure_ascii=False),
+        None if despues is None else json.dumps(despues, ensure_ascii=False),
+    ))
+
+def actualizar_con_diario(cursor, grupo, descripcion, tabla, id_fila, valores):
+    """UPDATE de una fila que anota en el diario los valores anteriores y nuevos de las columnas tocadas."""
+    actual = _leer_fila(cursor, tabla, id_fila)
+    if actual is None:
+        return 0
+    antes = {columna: actual[columna] for columna in valores}
+    asignaciones = ", ".join(f"{columna} = ?" for columna in valores)
+    cursor.execute(
+        f"UPDATE {tabla} SET {asignaciones} WHERE {TABLAS_DIARIO[tabla]} = ?",
+        (*valores.values(), id_fila),
+    )
+    if cursor.rowcount:
+        _anotar_en_diario(cursor, grupo, descripcion, tabla, id_fila, "update", antes, dict(valores))
+    return cursor.rowcount
+
+def eliminar_con_diario(cursor, grupo, descripcion, tabla, id_fila):
+    """DELETE de una fila que guarda en el diario la fila completa para poder reinsertarla."""
+    actual = _leer_fila(cursor, tabla, id_fila)
+    if actual is None:
+        return 0
+    cursor.execute(f"DELETE FROM {tabla} WHERE {TABLAS_DIARIO[tabla]} = ?", (id_fila,))
+    _anotar_en_diario(cursor, grupo, descripcion, tabla, id_fila, "delete", actual, None)
+    return cursor.rowcount
+
+def insertar_con_diario(cursor, grupo, descripcion, tabla, valores):
+    """INSERT que anota la fila creada en el diario; devuelve su id."""
+    columnas = ", ".join(valores)
+    cursor.execute(
+        f"INSERT INTO {tabla} ({columnas}) VALUES ({', '.join('?' * len(valores))})",
+        tuple(valores.values()),
+    )
+    id_fila = cursor.lastrowid
+    _anotar_en_diario(cursor, grupo, descripcion, tabla, id_fila, "insert", None, _leer_fila(cursor, tabla, id_fila))
+    return id_fila
+
+def aplicar_inverso_diario(grupo, descripcion):
+    """Aplica en una transacción la operación inversa de cada cambio del grupo (del último al primero).
+
+    La reversión se anota a su vez como un grupo nuevo, así que rehacer es revertir la reversión.
+    Lanza ValueError si alguna fila cambió después del grupo original o si revertir una inserción
+    borraría en cascada filas agregadas después (p. ej. otras asignaciones de un KPI creado en el
+    grupo). Devuelve el grupo nuevo.
+    """
+    inverso = nuevo_grupo_diario()
+    with conectar_bd() as conn:
+        conn.execute("PRAGMA foreign_keys = ON")
+        cursor = conn.cursor()
+        cursor.execute("""
+        SELECT tabla, id_fila, operacion, antes, despues
+        FROM DiarioCambios
+        WHERE grupo = ?
+        ORDER BY id_cambio DESC
+        """, (grupo,))
+        for tabla, id_fila, operacion, antes, despues in cursor.fetchall():
+            antes = json.loads(antes) if antes else None
+            despues = json.loads(despues) if despues else None
+            actual = _leer_fila(cursor, tabla, id_fila)
+            if operacion == "update":
+                if actual is None or any(actual[columna] != valor for columna, valor in despues.items()):
+                    raise ValueError("La fila cambió después de esta acción; no se puede revertir.")
+                actualizar_con_diario(cursor, inverso, descripcion, tabla, id_fila, antes)
+            elif operacion == "insert":
+                if actual is None:
+                    raise ValueError("La fila creada ya no existe; no se puede revertir.")
+                # Las filas dependientes del propio grupo ya se revirtieron (se recorre del último al primero)
+                if tabla in DEPENDIENTES_DIARIO:
+                    dependiente, llave = DEPENDIENTES_DIARIO[tabla]
+                    cursor.execute(f"SELECT COUNT(*) FROM {dependiente} WHERE {llave} = ?", (id_fila,))
+                    referencias = cursor.fetchone()[0]
+                    if referencias:
+                        raise ValueError(
+                            f"La fila creada la usan {referencias} fila(s) de {dependiente} agregadas después; "
+                            "no se puede revertir sin borrarlas."
+                        )
+                eliminar_con_diario(cursor, inverso, descripcion, tabla, id_fila)
+            else:
+                try:
+                    insertar_con_diario(cursor, inverso, descripcion, tabla, antes)
+                except sql.IntegrityError as e:
+                    raise ValueError(f"No se puede restaurar la fila eliminada: {e}") from e
+        registrar_cambio_bd(conn)
+        conn.commit()
+    return inverso
@@ -0,0 +1,100 @@
+"""Generación del archivo actualizado a partir de la base de datos."""
+import pandas as pd
+
+from .bd import conectar_bd
+from .consultas import consulta
+from .texto import normalizar_texto
+from .traza import trazado
+
+@trazado
+def generar_df_hoja3():
+    """Genera el DataFrame requerido para la Archivo Actualizado a partir de la base de datos.
+
+    Las columnas que no guarda el modelo (Frecuencia, Meta, Área...) salen de la fila del archivo
+    fuente (FuenteFilas) con el mismo indicador y cargo, o de la primera con ese indicador. Las
+    columnas de texto repetitivas quedan como `category` (ver `compactar_df`).
+    """
+
+    columnas = [
+        "Indicador",
+        "Fórmula",
+        "Frecuencia",
+        "Fuente",
+        "Responsable",
+        "Meta",
+        "Sentido",
+        "Área",
+        "Departamento",
+        "Cargo",
+        "Responde al Cargo",
+        "Nivel Jerárquico",
+        "Alineado a",
+        "Observaciones",
+        "Alineado (archivo)",
+        "Peso",
+    ]
+
+    with conectar_bd() as conn:
+        cursor = conn.cursor()
+        cursor.execute(consulta("hoja3"))
+        registros = cursor.fetchall()
+
+    data = []
+    for (
+        indicador,
+        formula,
+        peso,
+        cargo,
+        responde,
+        nivel,
+        alineado_archivo,
+        frecuencia,
+        fuente,
+        responsable,
+        meta,
+        sentido,
+        area,
+        departamento,
+        alineado_a,
+        observaciones,
+    ) in registros:
+        fila = {
+            "Indicador": normalizar_texto(indicador),
+            "Fórmula": normalizar_texto(formula),
+            "Frecuencia": normalizar_texto(frecuencia),
+            "Fuente": normalizar_texto(fuente),
+            "Responsable": normalizar_texto(responsable),
+            "Meta": normalizar_texto(meta),
+            "Sentido": normalizar_texto(sentido),
+            "Área": normalizar_texto(area),
+            "Departamento": normalizar_texto(departamento),
+            "Cargo": normalizar_texto(cargo),
+            "Responde al Cargo": normalizar_texto(responde),
+            "Nivel Jerárquico": normalizar_texto(nivel),
+            "Alineado a": normalizar_texto(alineado_a),
+            "Observaciones": normalizar_texto(observaciones),
+            "Alineado (archivo)": normalizar_texto(alineado_archivo),
+            "Peso": peso if peso is not None else "",
+        }
+        data.append(fila)
+
+    if not data:
+        return pd.DataFrame(columns=columnas)
+
+    return compactar_df(pd.DataFrame(data, columns=columnas))
+
+def compactar_df(df, proporcion_unicos=0.5):
+    """Convierte a `category` las columnas de solo texto cuyos valores distintos no pasan de `proporcion_unicos`.
+
+    Cargo, jefe, nivel, área, frecuencia o indicador se repiten en casi todas las filas, así que cada
+    valor se guarda una vez y las filas solo llevan un código. Modifica y devuelve `df`.
+    """
+    for columna in df.columns:
+        serie = df[columna]
+        if (
+            serie.dtype == object
+            and pd.api.types.infer_dtype(serie, skipna=False) == "string"
+            and serie.nunique() <= proporcion_unicos * len(serie)
+        ):
+            df[columna] = serie.astype("category")
+    return df
@@ -0,0 +1,161 @@
+"""Archivo fuente guardado por lotes en la tabla FuenteFilas de la BD en lugar de mantenerlo en memoria.
+
+El archivo se lee en lotes de `TAMANO_LOTE` filas (CSV con `chunksize`, Excel con openpyxl en modo
+solo lectura) y cada lote se escribe en FuenteFilas con las columnas que usan la ingesta, la
+exportación y el contexto de MARIA, más claves ya normalizadas para buscar por cargo o indicador.
+Quien carga el archivo solo conserva el resumen que devuelve `guardar_fuente`.
+"""
+import json
+
+import pandas as pd
+
+from .bd import conectar_bd, registrar_cambio_bd
+from .consultas import consulta
+from .texto import buscar_columna_por_nombre
+from .traza import trazado
+
+TAMANO_LOTE = 50_000
+
+# Columna del archivo -> columna de FuenteFilas
+COLUMNAS_FUENTE = {
+    "Cargo": "cargo",
+    "Responde al Cargo": "jefe",
+    "Nivel Jerárquico": "nivel",
+    "Indicador": "indicador",
+    "Fórmula": "formula",
+    "Alineado (archivo)": "alineado",
+    "Peso": "peso",
+    "Frecuencia": "frecuencia",
+    "Fuente": "fuente",
+    "Responsable": "responsable",
+    "Meta": "meta",
+    "Sentido": "sentido",
+    "Área": "area",
+    "Departamento": "departamento",
+    "Alineado a": "alineado_a",
+    "Observaciones": "observaciones",
+}
+COLUMNAS_CLAVE = ["cargo_norm", "cargo_clave", "indicador_norm"]
+
+def lotes_de_dataframe(df, tamano_lote=TAMANO_LOTE):
+    """Parte un DataFrame ya cargado en lotes de `tamano_lote` filas."""
+    for inicio in range(0, len(df), tamano_lote):
+        yield df.iloc[inicio:inicio + tamano_lote]
+
+def leer_archivo_por_lotes(archivo, nombre=None, tamano_lote=TAMANO_LOTE):
+    """Lee un CSV o XLSX (ruta o archivo abierto) en DataFrames de a lo sumo `tamano_lote` filas."""
+    nombre = (nombre or str(archivo)).lower()
+    if nombre.endswith(".csv"):
+        yield from pd.read_csv(archivo, chunksize=tamano_lote)
+        return
+
+    from openpyxl import load_workbook
+
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = libro.worksheets[0].iter_rows(values_only=True)
+        encabezado = next(filas, None)
+        if encabezado is None:
+            return
+        columnas = [str(valor) if valor is not None else f"Unnamed: {i}" for i, valor in enumerate(encabezado)]
+        lote = []
+        for fila in filas:
+            if all(valor is None for valor in fila):
+                continue
+            lote.append(fila)
+            if len(lote) == tamano_lote:
+                yield pd.DataFrame(lote, columns=columnas)
+                lote = []
+        if lote:
+            yield pd.DataFrame(lote, columns=columnas)
+    finally:
+        libro.close()
+
+def _preparar_lote(lote, columnas, inicio):
+    """Filas de FuenteFilas (orden, columnas..., claves) para un lote del archivo."""
+    datos = pd.DataFrame(index=lote.index)
+    for columna_archivo, columna in columnas.items():
+        serie = lote[columna_archivo]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            serie = serie.astype(str)
+        datos[columna] = serie.astype(object).where(serie.notna(), None)
+    for columna in COLUMNAS_FUENTE.values():
+        if columna not in datos:
+            datos[columna] = None
+
+    def normalizada(columna):
+        return datos[columna].astype(str).str.strip().where(datos[columna].notna(), "")
+
+    datos["cargo_norm"] = normalizada("cargo")
+    datos["cargo_clave"] = datos["cargo_norm"].str.lower()
+    datos["indicador_norm"] = normalizada("indicador")
+    datos.insert(0, "orden", range(inicio, inicio + len(datos)))
+    datos = datos.astype(object).where(datos.notna(), None)
+    return datos.itertuples(index=False, name=None)
+
+@trazado
+def guardar_fuente(lotes, nombre=None):
+    """Reemplaza el contenido de FuenteFilas por las filas de `lotes` (DataFrames con las columnas del archivo).
+
+    Devuelve el resumen que se guarda en lugar del archivo: `nombre`, `filas` y `columnas` (las de
+    COLUMNAS_FUENTE que trae el archivo). Lanza ValueError si falta la columna 'Cargo' o 'Responde al Cargo'.
+    """
+    columnas_tabla = ["orden", *COLUMNAS_FUENTE.values(), *COLUMNAS_CLAVE]
+    insertar = (
+        f"INSERT INTO FuenteFilas ({', '.join(columnas_tabla)}) "
+        f"VALUES ({', '.join('?' * len(columnas_tabla))})"
+    )
+    filas = 0
+    columnas = None
+    with conectar_bd() as conn:
+        conn.execute("DELETE FROM FuenteFilas")
+        for lote in lotes:
+            if columnas is None:
+                columnas = {}
+                for columna_archivo, columna in COLUMNAS_FUENTE.items():
+                    encontrada = buscar_columna_por_nombre(list(lote.columns), columna_archivo)
+                    if encontrada is not None:
+                        columnas[encontrada] = columna
+                encontradas = set(columnas.values())
+                faltantes = [titulo for titulo in ("Cargo", "Responde al Cargo") if COLUMNAS_FUENTE[titulo] not in encontradas]
+                if faltantes:
+                    raise ValueError(f"Al archivo le faltan las columnas: {', '.join(faltantes)}")
+            conn.executemany(insertar, _preparar_lote(lote, columnas, filas))
+            filas += len(lote)
+        columnas_archivo = [titulo for titulo, columna in COLUMNAS_FUENTE.items() if columna in (columnas or {}).values()]
+        conn.execute(consulta("guardar_columnas_fuente"), (json.dumps(columnas_archivo, ensure_ascii=False),))
+        registrar_cambio_bd(conn)
+        conn.commit()
+    return {"nombre": nombre, "filas": filas, "columnas": columnas_archivo}
+
+def columnas_fuente():
+    """Columnas de COLUMNAS_FUENTE que traía el último archivo guardado (vacío si no hay)."""
+    with conectar_bd() as conn:
+        fila = conn.execute(consulta("columnas_fuente")).fetchone()
+    return json.loads(fila[0]) if fila else []
+
+def leer_kpis_fuente():
+    """KPIs del archivo guardado (primera fila de cada indicador) con las columnas del archivo original.
+
+    Sirve de entrada a `sincronizar_nuevos_kpis`; sin columna 'Indicador' en el archivo devuelve un
+    DataFrame sin ella.
+    """
+    if "Indicador" not in columnas_fuente():
+        return pd.DataFrame()
+    with conectar_bd() as conn:
+        return pd.read_sql_query(consulta("kpis_fuente"), conn)
+
+@trazado
+def contexto_cargo(nombre_cargo):
+    """Área, departamento, jefe y nivel del cargo según la primera fila del archivo que los trae."""
+    clave = str(nombre_cargo).strip().lower()
+    if not clave:
+        return {}
+    contexto = {}
+    with conectar_bd() as conn:
+        filas = conn.execute(consulta("contexto_cargo_fuente"), (clave,)).fetchall()
+    for posicion, etiqueta in enumerate(["Área", "Departamento", "Responde al Cargo", "Nivel Jerárquico"]):
+        valor = next((fila[posicion] for fila in filas if fila[posicion] is not None), None)
+        if valor is not None:
+            contexto[etiqueta] = str(valor).strip()
+    return contexto
@@ -0,0 +1,326 @@
+"""Carga del archivo fuente en la base de datos y sincronizaciones posteriores."""
+import json
+import sqlite3 as sql
+
+import pandas as pd
+
+from .bd import conectar_bd, designar_raices, registrar_cambio_bd
+from .consultas import consulta
+from .fuente import guardar_fuente, leer_kpis_fuente, lotes_de_dataframe
+from .pesos import calcular_rebalanceo_pesos
+from .texto import buscar_columna_por_nombre, emparejar_nombres_jefe, normalizar_texto
+from .traza import trazado
+
+@trazado
+def insert_data(df=None):
+    """Inserta en la BD la organización del archivo guardado en FuenteFilas SOLO si es necesario.
+
+    Con `df` primero se guarda ese DataFrame como archivo fuente (`fuente.guardar_fuente`). Devuelve un
+    resumen con `omitido` (cargos ya existentes), `enlazados` ({nombre: (cargo, similitud)}), `ambiguos`
+    (cola de revisión), `ciclos_rechazados` y `raices` (ids de los cargos designados como raíz).
+    """
+    if df is not None:
+        guardar_fuente(lotes_de_dataframe(df))
+
+    resumen = {"omitido": 0, "enlazados": {}, "ambiguos": [], "ciclos_rechazados": 0, "raices": []}
+    with conectar_bd() as conn:
+        conn.execute("PRAGMA foreign_keys = ON")
+        cursor = conn.cursor()
+        
+        # Verificar si ya hay datos
+        cursor.execute(consulta("contar_cargos"))
+        count = cursor.fetchone()[0]
+        
+        if count > 0:
+            resumen["omitido"] = count
+            return resumen
+
+        # Resolver nombres de jefe que no coinciden exactamente con ningún cargo del archivo
+        cargos_archivo = [row[0] for row in cursor.execute("""
+        SELECT cargo FROM FuenteFilas WHERE cargo IS NOT NULL GROUP BY cargo ORDER BY MIN(orden)
+        """)]
+        jefes_archivo = pd.Series([row[0] for row in cursor.execute("""
+        SELECT jefe FROM FuenteFilas WHERE jefe IS NOT NULL GROUP BY jefe ORDER BY MIN(orden)
+        """)], dtype=object)
+        sin_cargo = jefes_archivo[~jefes_archivo.isin(set(cargos_archivo))]
+        enlazados, ambiguos = emparejar_nombres_jefe(cargos_archivo, sin_cargo)
+        resumen["enlazados"] = enlazados
+        resumen["ambiguos"] = ambiguos
+
+        # Los enlaces se aplican al leer FuenteFilas, que conserva los nombres tal como venían
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS EnlacesJefe (nombre TEXT PRIMARY KEY, cargo TEXT NOT NULL)")
+        cursor.execute("DELETE FROM temp.EnlacesJefe")
+        cursor.executemany(
+            "INSERT INTO temp.EnlacesJefe (nombre, cargo) VALUES (?, ?)",
+            [(nombre, cargo) for nombre, (cargo, _) in enlazados.items()],
+        )
+        
+        # Insertar datos base: cargos (con el nivel de su primera fila) y luego los jefes que no son
+        # cargos del archivo. Cada SELECT ya viene sin repetidos para no gastar ids AUTOINCREMENT en
+        # filas ignoradas
+        cursor.execute("""
+        WITH cargos AS (
+            SELECT cargo AS nombre, MIN(orden) AS orden
+            FROM FuenteFilas WHERE cargo IS NOT NULL GROUP BY cargo
+        ),
+        jefes AS (
+            SELECT COALESCE(e.cargo, f.jefe) AS nombre, MIN(f.orden) AS orden
+            FROM FuenteFilas f LEFT JOIN temp.EnlacesJefe e ON e.nombre = f.jefe
+            WHERE f.jefe IS NOT NULL GROUP BY 1
+        )
+        INSERT OR IGNORE INTO Cargos (nombre_cargo, nivel_cargo)
+        SELECT n.nombre, CASE WHEN n.grupo = 0 THEN COALESCE(f.nivel, 'N/A') ELSE 'N/A' END
+        FROM (
+            SELECT nombre, orden, 0 AS grupo FROM cargos
+            UNION ALL
+            SELECT nombre, orden, 1 FROM jefes WHERE nombre NOT IN (SELECT nombre FROM cargos)
+        ) n
+        JOIN FuenteFilas f ON f.orden = n.orden
+        ORDER BY n.grupo, n.orden
+        """)
+        
+        cursor.execute("""
+        INSERT OR IGNORE INTO IndicadoresEstrategicos (nombre_kpiEs)
+        SELECT alineado FROM FuenteFilas WHERE alineado IS NOT NULL GROUP BY alineado ORDER BY MIN(orden)
+        """)
+        
+        cursor.execute("""
+        INSERT OR IGNORE INTO Kpis (nombre_kpi, formula_kpi)
+        SELECT f.indicador, f.formula
+        FROM FuenteFilas f
+        JOIN (SELECT MIN(orden) AS orden FROM FuenteFilas WHERE indicador IS NOT NULL GROUP BY indicador) p
+          ON p.orden = f.orden
+        ORDER BY f.orden
+        """)
+        
+        conn.commit()
+        
+        #Insertar fks
+        # Actualizar FK (los triggers de CargosJerarquia rechazan las relaciones que cierran ciclos); si
+        # un cargo aparece con varios jefes queda el de su última fila, como al recorrer el archivo
+        pares_jefe = cursor.execute("""
+        SELECT f.cargo, COALESCE(e.cargo, f.jefe) AS jefe
+        FROM FuenteFilas f LEFT JOIN temp.EnlacesJefe e ON e.nombre = f.jefe
+        WHERE f.cargo IS NOT NULL AND f.jefe IS NOT NULL
+        GROUP BY f.cargo, 2
+        HAVING f.cargo != jefe
+        ORDER BY MAX(f.orden)
+        """).fetchall()
+        ciclos_rechazados = 0
+        for cargo, jefe in pares_jefe:
+            try:
+                cursor.execute("""
+                UPDATE Cargos
+                SET fk_jefe = (SELECT id_cargo FROM Cargos WHERE nombre_cargo = ?)
+                WHERE nombre_cargo = ?;
+                """, (jefe, cargo))
+            except sql.IntegrityError:
+                ciclos_rechazados += 1
+        
+        conn.commit()
+        resumen["ciclos_rechazados"] = ciclos_rechazados
+        resumen["raices"] = designar_raices(conn)
+        conn.commit()
+        
+        # Alineación de cada KPI: la de su última fila con "Alineado (archivo)"
+        cursor.execute("""
+        UPDATE Kpis
+        SET fk_kpiEs = (
+            SELECT ies.id_kpiEs
+            FROM FuenteFilas f
+            JOIN IndicadoresEstrategicos ies ON ies.nombre_kpiEs = f.alineado
+            WHERE f.indicador = Kpis.nombre_kpi
+            ORDER BY f.orden DESC
+            LIMIT 1
+        )
+        WHERE nombre_kpi IN (SELECT indicador FROM FuenteFilas WHERE alineado IS NOT NULL)
+        """)
+        conn.commit()
+        
+        # Peso de la primera fila de cada par cargo-KPI
+        cursor.execute("""
+        INSERT OR IGNORE INTO CargosKpis (fk_cargo, fk_kpi, peso_kpi)
+        SELECT c.id_cargo, k.id_kpi, f.peso
+        FROM FuenteFilas f
+        JOIN (SELECT MIN(orden) AS orden FROM FuenteFilas GROUP BY cargo, indicador) p ON p.orden = f.orden
+        JOIN Cargos c ON c.nombre_cargo = f.cargo
+        JOIN Kpis k ON k.nombre_kpi = f.indicador
+        ORDER BY f.orden
+        """)
+        cursor.execute("DROP TABLE IF EXISTS temp.EnlacesJefe")
+        registrar_cambio_bd(conn)
+        conn.commit()
+    return resumen
+
+def _columna_texto(df, columna):
+    """Valores de `columna` como texto sin espacios ("" para nulos o si la columna no existe)."""
+    if not columna:
+        return pd.Series("", index=df.index)
+    return df[columna].astype(object).where(df[columna].notna(), "").astype(str).str.strip()
+
+@trazado
+def sincronizar_nuevos_kpis(df=None):
+    """Inserta en la BD los KPIs del archivo (por defecto el guardado en FuenteFilas) que aún no existen.
+
+    Los KPIs se comparan sin mayúsculas ni espacios extremos y, si se repiten en el archivo, gana la
+    primera fila. Devuelve None si el archivo no trae la columna 'Indicador'; si no, un resumen con
+    `kpis` ([{id_kpi, nombre, formula, id_kpiEs}] creados), `indicadores` ([{id_kpiEs, nombre}]
+    creados) y `existentes` (KPIs del archivo que ya estaban en la BD).
+    """
+    if df is None:
+        df = leer_kpis_fuente()
+    columnas_fuente = list(df.columns)
+    col_indicador = buscar_columna_por_nombre(columnas_fuente, "Indicador")
+
+    if not col_indicador:
+        return None
+
+    col_formula = buscar_columna_por_nombre(columnas_fuente, "Fórmula")
+    col_alineado_archivo = buscar_columna_por_nombre(columnas_fuente, "Alineado (archivo)")
+
+    fuente = pd.DataFrame({
+        "nombre_kpi": _columna_texto(df, col_indicador),
+        "formula_kpi": _columna_texto(df, col_formula),
+        "nombre_kpiEs": _columna_texto(df, col_alineado_archivo),
+    })
+    fuente = fuente[fuente["nombre_kpi"] != ""]
+    fuente = fuente.assign(clave=fuente["nombre_kpi"].str.lower()).drop_duplicates("clave")
+    resumen = {"kpis": [], "indicadores": [], "existentes": 0}
+
+    with conectar_bd() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT nombre_kpi FROM Kpis")
+        existentes = {normalizar_texto(row[0]).lower() for row in cursor.fetchall() if row[0]}
+        es_nuevo = ~fuente["clave"].isin(existentes)
+        resumen["existentes"] = int((~es_nuevo).sum())
+        nuevos = fuente[es_nuevo]
+        if nuevos.empty:
+            return resumen
+
+        # Indicadores de los KPIs nuevos: los que faltan se crean en un solo executemany
+        nombres_indicadores = [nombre for nombre in nuevos["nombre_kpiEs"].unique() if nombre]
+        cursor.execute(
+            "SELECT nombre_kpiEs FROM IndicadoresEstrategicos WHERE nombre_kpiEs IN (SELECT value FROM json_each(?))",
+            (json.dumps(nombres_indicadores),),
+        )
+        indicadores_previos = {row[0] for row in cursor.fetchall()}
+        cursor.executemany(
+            "INSERT OR IGNORE INTO IndicadoresEstrategicos (nombre_kpiEs) VALUES (?)",
+            [(nombre,) for nombre in nombres_indicadores if nombre not in indicadores_previos],
+        )
+        cursor.execute(
+            "SELECT nombre_kpiEs, id_kpiEs FROM IndicadoresEstrategicos WHERE nombre_kpiEs IN (SELECT value FROM json_each(?))",
+            (json.dumps(nombres_indicadores),),
+        )
+        id_por_indicador = dict(cursor.fetchall())
+        resumen["indicadores"] = [
+            {"id_kpiEs": id_por_indicador[nombre], "nombre": nombre}
+            for nombre in nombres_indicadores
+            if nombre not in indicadores_previos
+        ]
+
+        # KPIs nuevos: una tabla temporal y un solo INSERT ... SELECT
+        cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS KpisNuevos (
+            orden INTEGER PRIMARY KEY,
+            nombre_kpi TEXT NOT NULL,
+            formula_kpi TEXT,
+            fk_kpiEs INTEGER
+        )
+        """)
+        try:
+            cursor.executemany(
+                "INSERT INTO KpisNuevos (orden, nombre_kpi, formula_kpi, fk_kpiEs) VALUES (?, ?, ?, ?)",
+                [
+                    (orden, nombre, formula or None, id_por_indicador.get(indicador))
+                    for orden, (nombre, formula, indicador) in enumerate(
+                        nuevos[["nombre_kpi", "formula_kpi", "nombre_kpiEs"]].itertuples(index=False, name=None)
+                    )
+                ],
+            )
+            cursor.execute("""
+            INSERT INTO Kpis (nombre_kpi, formula_kpi, fk_kpiEs)
+            SELECT nombre_kpi, formula_kpi, fk_kpiEs FROM KpisNuevos ORDER BY orden
+            """)
+            cursor.execute("""
+            SELECT k.id_kpi, k.nombre_kpi, k.formula_kpi, k.fk_kpiEs
+            FROM KpisNuevos n
+            JOIN Kpis k ON k.nombre_kpi = n.nombre_kpi
+            ORDER BY n.orden
+            """)
+            resumen["kpis"] = [
+                {"id_kpi": id_kpi, "nombre": nombre, "formula": formula, "id_kpiEs": id_kpiEs}
+                for id_kpi, nombre, formula, id_kpiEs in cursor.fetchall()
+            ]
+        finally:
+            cursor.execute("DROP TABLE IF EXISTS temp.KpisNuevos")
+
+        registrar_cambio_bd(conn)
+        conn.commit()
+
+    return resumen
+
+@trazado
+def asignar_indicadores_estrategicos_a_ceo():
+    """Asigna los indicadores estratégicos como KPIs a cada raíz (CEO) con peso distribuido equitativamente.
+
+    Devuelve `raices` (ids de las raíces designadas; vacío si no hay), `indicadores` disponibles y `asignados` nuevos.
+    """
+    with conectar_bd() as conn:
+        cursor = conn.cursor()
+        
+        # Raíces designadas (una por empresa en un holding)
+        cursor.execute(consulta("raices"))
+        raices = [row[0] for row in cursor.fetchall()]
+        
+        if not raices:
+            return {"raices": [], "indicadores": 0, "asignados": 0}
+        
+        # Obtener todos los indicadores estratégicos
+        cursor.execute(consulta("indicadores_estrategicos"))
+        indicadores = cursor.fetchall()
+        
+        if not indicadores:
+            return {"raices": raices, "indicadores": 0, "asignados": 0}
+        
+        # Peso inicial equitativo; luego se cuadran en 100 solo los KPIs recién asignados
+        peso_unitario = 100 // len(indicadores)
+        
+        # Para cada indicador estratégico, crear un KPI que lo represente
+        kpis_indicadores = []
+        for id_kpiEs, nombre_indicador in indicadores:
+            # Buscar si ya existe un KPI con este nombre
+            cursor.execute(consulta("id_kpi_por_nombre"), (nombre_indicador,))
+            resultado = cursor.fetchone()
+            
+            if resultado:
+                kpis_indicadores.append(resultado[0])
+            else:
+                # Crear un KPI nuevo con el nombre del indicador estratégico
+                cursor.execute(consulta("crear_kpi_de_indicador"), (nombre_indicador, id_kpiEs))
+                kpis_indicadores.append(cursor.lastrowid)
+        
+        # Insertar en CargosKpis si no existe
+        nuevos = []
+        for id_raiz in raices:
+            for id_kpi in kpis_indicadores:
+                try:
+                    cursor.execute(consulta("asignar_kpi_a_cargo"), (id_raiz, id_kpi, peso_unitario))
+                    if cursor.rowcount:
+                        nuevos.append((cursor.lastrowid, id_raiz, peso_unitario, False))
+                except:
+                    pass
+
+        # Los KPIs que la raíz ya tenía conservan los pesos calibrados: solo los nuevos se reparten 100
+        df_nuevos = pd.DataFrame(nuevos, columns=["id_cargoKpi", "fk_cargo", "peso", "bloqueado"])
+        pesos_nuevos, _ = calcular_rebalanceo_pesos(df_nuevos)
+        cursor.executemany(
+            consulta("actualizar_peso_kpi"),
+            [(int(pesos_nuevos[idx]), int(df_nuevos.at[idx, "id_cargoKpi"])) for idx in pesos_nuevos.index],
+        )
+        
+        if nuevos:
+            registrar_cambio_bd(conn)
+        conn.commit()
+
+    return {"raices": raices, "indicadores": len(indicadores), "asignados": len(nuevos)}
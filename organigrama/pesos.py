@@ -0,0 +1,112 @@
+"""Cálculo y aplicación del rebalanceo de pesos de KPIs por cargo."""
+import json
+
+import numpy as np
+import pandas as pd
+
+from .bd import conectar_bd, registrar_cambio_bd
+from .consultas import consulta
+from .diario import nuevo_grupo_diario, sesion_diario
+from .traza import trazado
+
+def calcular_rebalanceo_pesos(df, objetivo=100):
+    """Normaliza proporcionalmente los pesos de cada cargo a `objetivo` con redondeo de mayor residuo.
+
+    Espera las columnas `fk_cargo`, `peso` y `bloqueado`. Las filas bloqueadas conservan su
+    peso y el resto se reparte el remanente. Devuelve la serie de pesos nuevos (mismo índice
+    que `df`, solo para las filas recalculadas) y el conjunto de cargos que no se pueden cuadrar.
+    """
+    if df.empty:
+        return pd.Series(dtype="int64"), set()
+
+    cargos = df["fk_cargo"]
+    pesos = pd.to_numeric(df["peso"], errors="coerce").fillna(0).clip(lower=0)
+    bloqueado = df["bloqueado"].fillna(False).astype(bool)
+    libre = ~bloqueado
+
+    suma_bloqueada = pesos.where(bloqueado, 0).groupby(cargos).transform("sum")
+    suma_libre = pesos.where(libre, 0).groupby(cargos).transform("sum")
+    filas_libres = libre.groupby(cargos).transform("sum")
+    disponible = objetivo - suma_bloqueada
+
+    # Sin filas libres, o con bloqueos que ya superan el objetivo, no hay solución
+    conflicto = (disponible < 0) | ((filas_libres == 0) & (disponible != 0))
+
+    # Proporcional al peso actual; si todos los libres pesan 0 se reparte en partes iguales
+    cuota = np.where(
+        suma_libre > 0,
+        pesos * disponible / suma_libre.where(suma_libre > 0, 1),
+        disponible / filas_libres.where(filas_libres > 0, 1),
+    )
+    cuota = pd.Series(np.round(cuota, 9), index=df.index).where(libre & ~conflicto, 0)
+    piso = np.floor(cuota)
+    residuo = cuota - piso
+
+    faltante = disponible - piso.groupby(cargos).transform("sum")
+    orden = (
+        pd.DataFrame({"cargo": cargos, "residuo": residuo, "peso": pesos})[libre & ~conflicto]
+        .sort_values(["cargo", "residuo", "peso"], ascending=[True, False, False], kind="stable")
+    )
+    posicion = orden.groupby("cargo").cumcount().reindex(df.index)
+    extra = (libre & ~conflicto & (posicion < faltante)).astype(int)
+
+    nuevos = (piso + extra)[libre & ~conflicto].astype(int)
+    return nuevos, set(cargos[conflicto].unique().tolist())
+
+@trazado
+def rebalancear_pesos_kpis(cargo_id, incluir_subarbol=False, descripcion_diario=None):
+    """Rebalancea a 100 los pesos de un cargo (o de todo su subárbol) respetando filas bloqueadas.
+
+    Con `descripcion_diario` los pesos anteriores se anotan en el diario; el grupo anotado se
+    devuelve en `grupo` para poder deshacer la acción.
+    """
+    with conectar_bd() as conn:
+        conn.execute("PRAGMA foreign_keys = ON")
+        if incluir_subarbol:
+            df = pd.read_sql_query(
+                consulta("pesos_kpis_subarbol"),
+                conn,
+                params=(int(cargo_id),),
+            )
+        else:
+            df = pd.read_sql_query(
+                consulta("pesos_kpis_cargo"),
+                conn,
+                params=(int(cargo_id),),
+            )
+
+        nuevos, conflictos = calcular_rebalanceo_pesos(df)
+        anteriores = pd.to_numeric(df.loc[nuevos.index, "peso"], errors="coerce")
+        cambiados = df.loc[nuevos.index[nuevos.ne(anteriores)], "id_cargoKpi"]
+        conn.executemany(
+            consulta("actualizar_peso_kpi"),
+            [(int(nuevos[idx]), int(id_ck)) for idx, id_ck in cambiados.items()],
+        )
+        grupo = None
+        if descripcion_diario and len(cambiados):
+            grupo = nuevo_grupo_diario()
+            sesion = sesion_diario()
+            previos = df.loc[cambiados.index, "peso"]
+            previos = dict(zip(cambiados.index, previos.astype(object).where(previos.notna(), None).tolist()))
+            conn.executemany(consulta("anotar_pesos_en_diario"), [
+                (
+                    grupo,
+                    descripcion_diario,
+                    sesion,
+                    int(id_ck),
+                    json.dumps({"peso_kpi": previos[idx]}),
+                    json.dumps({"peso_kpi": int(nuevos[idx])}),
+                )
+                for idx, id_ck in cambiados.items()
+            ])
+        # Sin filas cambiadas no se invalidan los datos cacheados por revisión
+        if len(cambiados):
+            registrar_cambio_bd(conn)
+        conn.commit()
+
+    return {
+        "cargos": int(df["fk_cargo"].nunique()),
+        "actualizados": int(len(cambiados)),
+        "conflictos": sorted(conflictos),
+        "grupo": grupo,
+    }
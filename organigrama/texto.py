@@ -0,0 +1,194 @@
+"""Normalización de textos y búsqueda aproximada de nombres de cargos."""
+import bisect
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+
+def normalizar_texto(valor):
+    """Devuelve un string sin espacios o vacío si el valor es nulo/NaN."""
+    if valor is None:
+        return ""
+    try:
+        if pd.isna(valor):  
+            return ""
+    except Exception:
+        pass
+    return str(valor).strip()
+
+def buscar_columna_por_nombre(columnas, nombre_objetivo):
+    """Devuelve el nombre real de la columna que coincide (ignorando mayúsculas/espacios)."""
+    objetivo = nombre_objetivo.strip().lower()
+    for col in columnas:
+        if col.strip().lower() == objetivo:
+            return col
+    return None
+
+def normalizar_nombre(valor):
+    """Normaliza un nombre para compararlo: sin acentos, en minúsculas, sin signos y con espacios simples."""
+    texto = unicodedata.normalize("NFKD", normalizar_texto(valor))
+    texto = "".join(ch for ch in texto if not unicodedata.combining(ch)).lower()
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", texto)).strip()
+
+def _trigramas(texto):
+    """Devuelve el conjunto de trigramas de un texto normalizado (con relleno para inicio y fin)."""
+    relleno = f"  {texto} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+def construir_indice_nombres(registros):
+    """Construye un índice de búsqueda por prefijo de palabra y por trigramas sobre pares (id, nombre)."""
+    indice = {"ids": [], "nombres": [], "normalizados": [], "total_trigramas": [], "trigramas": defaultdict(list), "palabras": []}
+    for pos, (id_registro, nombre) in enumerate(registros):
+        normalizado = normalizar_nombre(nombre)
+        trigramas = _trigramas(normalizado)
+        indice["ids"].append(id_registro)
+        indice["nombres"].append(nombre)
+        indice["normalizados"].append(normalizado)
+        indice["total_trigramas"].append(len(trigramas))
+        for trigrama in trigramas:
+            indice["trigramas"][trigrama].append(pos)
+        indice["palabras"].extend((palabra, pos) for palabra in set(normalizado.split()))
+    indice["trigramas"] = dict(indice["trigramas"])
+    indice["palabras"].sort()
+    return indice
+
+def _posiciones_por_prefijo(indice, prefijo):
+    """Posiciones de los nombres con alguna palabra que empieza por `prefijo` (búsqueda binaria)."""
+    palabras = indice["palabras"]
+    posiciones = set()
+    i = bisect.bisect_left(palabras, (prefijo,))
+    while i < len(palabras) and palabras[i][0].startswith(prefijo):
+        posiciones.add(palabras[i][1])
+        i += 1
+    return posiciones
+
+def buscar_en_indice(indice, consulta, limite=50, permitido=None, similitud_minima=0.35):
+    """Busca en el índice por prefijo y similitud de trigramas; devuelve (id, nombre, similitud), los mejores primero."""
+    consulta_norm = normalizar_nombre(consulta)
+    if not consulta_norm:
+        resultados = []
+        for id_registro, nombre in zip(indice["ids"], indice["nombres"]):
+            if permitido is None or permitido(id_registro):
+                resultados.append((id_registro, nombre, 1.0))
+                if len(resultados) >= limite:
+                    break
+        return resultados
+
+    # Coincidencia difusa: coeficiente de Dice sobre trigramas compartidos
+    trigramas_consulta = _trigramas(consulta_norm)
+    compartidos = Counter()
+    for trigrama in trigramas_consulta:
+        compartidos.update(indice["trigramas"].get(trigrama, ()))
+    similitud = {
+        pos: 2 * total / (len(trigramas_consulta) + indice["total_trigramas"][pos])
+        for pos, total in compartidos.items()
+    }
+
+    # Coincidencia por prefijo: cada palabra de la consulta inicia alguna palabra del nombre
+    por_prefijo = None
+    for palabra in consulta_norm.split():
+        posiciones = _posiciones_por_prefijo(indice, palabra)
+        por_prefijo = posiciones if por_prefijo is None else por_prefijo & posiciones
+
+    candidatos = set(por_prefijo) | {pos for pos, valor in similitud.items() if valor >= similitud_minima}
+    orden = sorted(
+        candidatos,
+        key=lambda pos: (pos not in por_prefijo, -similitud.get(pos, 0.0), indice["nombres"][pos]),
+    )
+    resultados = []
+    for pos in orden:
+        id_registro = indice["ids"][pos]
+        if permitido is None or permitido(id_registro):
+            resultados.append((id_registro, indice["nombres"][pos], round(similitud.get(pos, 0.0), 3)))
+            if len(resultados) >= limite:
+                break
+    return resultados
+
+def emparejar_nombres_jefe(cargos, nombres_sin_cargo, umbral_auto=0.92, umbral_revision=0.85, margen=0.05, max_candidatos=50):
+    """Empareja nombres de "Responde al Cargo" que no existen como "Cargo" con el cargo más parecido.
+
+    Primero compara nombres normalizados (acentos, mayúsculas, signos y espacios). Si no hay
+    coincidencia exacta, cuenta con el índice de trigramas cuántos de los trigramas menos frecuentes
+    del nombre comparte cada cargo y se queda con los `max_candidatos` que más comparten. De esos,
+    solo los que difieren del nombre en a lo sumo una palabra se puntúan por trigramas y distancia
+    de edición.
+    Devuelve (enlazados, ambiguos): {nombre: (cargo, similitud)} y [{"nombre", "candidatos"}].
+    """
+    indice = construir_indice_nombres((nombre, nombre) for nombre in cargos)
+    por_normalizado = defaultdict(list)
+    for nombre, normalizado in zip(indice["nombres"], indice["normalizados"]):
+        por_normalizado[normalizado].append(nombre)
+    por_trigrama = indice["trigramas"]
+    arreglos_por_trigrama = {}
+    sin_posiciones = np.empty(0, dtype=np.int64)
+    trigramas_por_pos = {}
+    palabras_por_pos = {}
+
+    enlazados = {}
+    ambiguos = []
+    for nombre in nombres_sin_cargo:
+        normalizado = normalizar_nombre(nombre)
+        if not normalizado:
+            continue
+        exactos = por_normalizado.get(normalizado, [])
+        if len(exactos) == 1:
+            enlazados[nombre] = (exactos[0], 1.0)
+            continue
+
+        # Filtro por prefijo: con Dice >= umbral el candidato comparte alguno de estos trigramas.
+        # Las coincidencias se cuentan solo sobre ellos, que tienen las listas más cortas del índice
+        trigramas = _trigramas(normalizado)
+        minimo = math.ceil(umbral_revision * len(trigramas) / (2 - umbral_revision))
+        raros = sorted(trigramas, key=lambda t: len(por_trigrama.get(t, ())))[: len(trigramas) - minimo + 1]
+        listas = []
+        for trigrama in raros:
+            if trigrama in por_trigrama:
+                if trigrama not in arreglos_por_trigrama:
+                    arreglos_por_trigrama[trigrama] = np.array(por_trigrama[trigrama], dtype=np.int64)
+                listas.append(arreglos_por_trigrama[trigrama])
+        compartidos = np.bincount(np.concatenate(listas) if listas else sin_posiciones)
+        posiciones = np.flatnonzero(compartidos)
+        if len(posiciones) > max_candidatos:
+            posiciones = posiciones[np.argpartition(-compartidos[posiciones], max_candidatos)[:max_candidatos]]
+
+        # Se tolera una palabra distinta entre el nombre y el cargo
+        palabras = set(normalizado.split())
+        puntajes = []
+        for pos in posiciones.tolist():
+            if pos not in palabras_por_pos:
+                palabras_por_pos[pos] = set(indice["normalizados"][pos].split())
+            if len(palabras - palabras_por_pos[pos]) > 1:
+                continue
+            if pos not in trigramas_por_pos:
+                trigramas_por_pos[pos] = _trigramas(indice["normalizados"][pos])
+            otros = trigramas_por_pos[pos]
+            puntajes.append((2 * len(trigramas & otros) / (len(trigramas) + len(otros)), pos))
+        puntajes.sort(reverse=True)
+
+        candidatos = []
+        for dice, pos in puntajes[:10]:
+            # ratio() es la parte cara: se omite si sus cotas no superan a Dice ni al umbral
+            comparador = SequenceMatcher(None, normalizado, indice["normalizados"][pos])
+            cota = comparador.real_quick_ratio()
+            if cota > dice and cota >= umbral_revision:
+                edicion = comparador.ratio()
+            else:
+                edicion = 0.0
+            similitud = round(max(dice, edicion), 3)
+            if similitud >= umbral_revision:
+                candidatos.append((indice["nombres"][pos], similitud))
+        candidatos.sort(key=lambda item: (-item[1], item[0]))
+        candidatos = candidatos[:5]
+        if not candidatos:
+            continue
+
+        segundo = candidatos[1][1] if len(candidatos) > 1 else 0.0
+        if candidatos[0][1] >= umbral_auto and candidatos[0][1] - segundo >= margen:
+            enlazados[nombre] = candidatos[0]
+        else:
+            ambiguos.append({"nombre": nombre, "candidatos": candidatos})
+    return enlazados, ambiguos
@@ -0,0 +1,145 @@
+"""Trazas de rendimiento: tramos con tiempo (anidables) y tiempo por consulta SQL.
+
+Solo se registra algo mientras hay una traza activa en el contexto actual (`iniciar_traza`); sin
+ella `tramo` y `trazado` no hacen más que comprobar una variable de contexto.
+"""
+import functools
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Cada cuántas instrucciones de la VM de SQLite se marca el avance de la consulta en curso
+INSTRUCCIONES_POR_MARCA = 100
+MAX_CONSULTAS_POR_TRAZA = 2000
+
+# Literales que se reemplazan por ? para agrupar las ejecuciones de una misma sentencia
+_LITERALES_SQL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+_traza_activa = ContextVar("traza_activa", default=None)
+
+def iniciar_traza(etiqueta):
+    """Activa una traza nueva en el contexto actual (reemplaza la anterior si quedó abierta)."""
+    traza = {
+        "etiqueta": etiqueta,
+        "inicio": time.time(),
+        "_t0": time.perf_counter(),
+        "tramos": [],
+        "consultas": [],
+        "_pila": [],
+        "_consulta": None,
+    }
+    _traza_activa.set(traza)
+    return traza
+
+def traza_activa():
+    return _traza_activa.get()
+
+def finalizar_traza():
+    """Cierra la traza activa y la devuelve como diccionario serializable a JSON (None si no había)."""
+    traza = _traza_activa.get()
+    if traza is None:
+        return None
+    _traza_activa.set(None)
+    _cerrar_consulta(traza)
+    duracion = (time.perf_counter() - traza["_t0"]) * 1000
+    return {
+        "etiqueta": traza["etiqueta"],
+        "inicio": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(traza["inicio"])),
+        "duracion_ms": round(duracion, 2),
+        "sql_ms": round(sum(consulta["duracion_ms"] for consulta in traza["consultas"]), 2),
+        "tramos": traza["tramos"],
+        "consultas": traza["consultas"][:MAX_CONSULTAS_POR_TRAZA],
+        "consultas_omitidas": max(0, len(traza["consultas"]) - MAX_CONSULTAS_POR_TRAZA),
+    }
+
+@contextmanager
+def tramo(nombre):
+    """Mide el bloque como un tramo de la traza activa; las consultas SQL se atribuyen al tramo más interno."""
+    traza = _traza_activa.get()
+    if traza is None:
+        yield
+        return
+    registro = {
+        "nombre": nombre,
+        "nivel": len(traza["_pila"]),
+        "inicio_ms": round((time.perf_counter() - traza["_t0"]) * 1000, 2),
+        "duracion_ms": 0.0,
+        "sql_ms": 0.0,
+        "consultas": 0,
+    }
+    traza["tramos"].append(registro)
+    traza["_pila"].append(registro)
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        _cerrar_consulta(traza)
+        registro["duracion_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+        traza["_pila"].pop()
+
+def trazado(func):
+    """Decorador: registra cada llamada a `func` como un tramo con su nombre."""
+    @functools.wraps(func)
+    def envoltura(*args, **kwargs):
+        if _traza_activa.get() is None:
+            return func(*args, **kwargs)
+        with tramo(func.__name__):
+            return func(*args, **kwargs)
+
+    return envoltura
+
+def _cerrar_consulta(traza):
+    """Asigna su duración a la consulta en curso: desde que empezó hasta su última marca de avance."""
+    consulta = traza["_consulta"]
+    if consulta is None:
+        return
+    traza["_consulta"] = None
+    duracion = (consulta.pop("_ultima_marca") - consulta.pop("_inicio")) * 1000
+    consulta["duracion_ms"] = round(duracion, 3)
+    consulta["instrucciones"] = consulta.pop("_marcas") * INSTRUCCIONES_POR_MARCA
+    traza["consultas"].append(consulta)
+    for registro in traza["_pila"][-1:]:
+        registro["sql_ms"] = round(registro["sql_ms"] + duracion, 3)
+        registro["consultas"] += 1
+
+def instrumentar_conexion(conn):
+    """Activa el registro de consultas en `conn` si hay una traza activa; devuelve si lo hizo.
+
+    set_trace_callback marca el inicio de cada sentencia y set_progress_handler su avance, así que
+    la duración incluye la lectura de filas pero no el trabajo de Python entre sentencias (las que
+    no llegan a INSTRUCCIONES_POR_MARCA cuentan 0 ms). El texto guardado lleva los literales como ?.
+    """
+    traza = _traza_activa.get()
+    if traza is None:
+        return False
+
+    def al_ejecutar(sentencia):
+        _cerrar_consulta(traza)
+        ahora = time.perf_counter()
+        traza["_consulta"] = {
+            "sql": _LITERALES_SQL.sub("?", re.sub(r"\s+", " ", sentencia)).strip()[:300],
+            "tramo": traza["_pila"][-1]["nombre"] if traza["_pila"] else None,
+            "_inicio": ahora,
+            "_ultima_marca": ahora,
+            "_marcas": 0,
+        }
+
+    def al_avanzar():
+        consulta = traza["_consulta"]
+        if consulta is not None:
+            consulta["_marcas"] += 1
+            consulta["_ultima_marca"] = time.perf_counter()
+        return 0
+
+    conn.set_trace_callback(al_ejecutar)
+    conn.set_progress_handler(al_avanzar, INSTRUCCIONES_POR_MARCA)
+    return True
+
+def desinstrumentar_conexion(conn):
+    """Quita los callbacks de `instrumentar_conexion` y cierra la consulta en curso."""
+    traza = _traza_activa.get()
+    if traza is not None:
+        _cerrar_consulta(traza)
+    conn.set_trace_callback(None)
+    conn.set_progress_handler(None, 0)
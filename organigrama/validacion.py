@@ -0,0 +1,94 @@
+"""Validaciones de consistencia de la organización y sus KPIs."""
+import time
+
+from .bd import conectar_bd
+from .consultas import consulta
+from .traza import trazado
+
+def detectar_ciclos(padres):
+    """Recorre cada cadena de mando una sola vez y devuelve los ciclos y los cargos que quedan fuera del árbol."""
+    estado = {}  # 1 = en el recorrido actual, 2 = resuelto
+    fuera_del_arbol = set()
+    ciclos = []
+    for inicio in padres:
+        if inicio in estado:
+            continue
+        camino = []
+        nodo = inicio
+        while nodo in padres and nodo not in estado:
+            estado[nodo] = 1
+            camino.append(nodo)
+            nodo = padres[nodo]
+        if estado.get(nodo) == 1:
+            ciclos.append(camino[camino.index(nodo):])
+            fuera_del_arbol.update(camino)
+        elif nodo in fuera_del_arbol:
+            fuera_del_arbol.update(camino)
+        for visitado in camino:
+            estado[visitado] = 2
+    return ciclos, fuera_del_arbol
+
+@trazado
+def validar_organizacion():
+    """Ejecuta todas las validaciones de la organización y devuelve un reporte estructurado.
+
+    trg_jerarquia_ciclo impide crear ciclos nuevos, pero una BD anterior al trigger puede traerlos en
+    fk_jefe. Esos cargos (y los que cuelgan de ellos) no tienen su enlace con el jefe en la tabla de
+    clausura; los ciclos se buscan solo entre ellos.
+    """
+    inicio = time.perf_counter()
+    with conectar_bd() as conn:
+        cursor = conn.cursor()
+        total_cargos = cursor.execute(consulta("contar_cargos")).fetchone()[0]
+
+        # Pesos que no suman 100 y cargos sin KPIs en una sola agregación
+        cursor.execute(consulta("validar_pesos"))
+        pesos_invalidos = []
+        cargos_sin_kpis = []
+        for id_cargo, nombre, total_kpis, total_peso in cursor.fetchall():
+            if total_kpis == 0:
+                cargos_sin_kpis.append({"id_cargo": id_cargo, "nombre_cargo": nombre})
+            else:
+                pesos_invalidos.append(
+                    {"id_cargo": id_cargo, "nombre_cargo": nombre, "kpis": total_kpis, "total_peso": total_peso}
+                )
+
+        # Jefes inexistentes y cargos fuera del árbol en una sola pasada por la tabla de clausura
+        cursor.execute(consulta("validar_enlaces_jefe"))
+        jefes_inexistentes = []
+        fuera_del_arbol = []
+        for id_cargo, nombre, fk_jefe, jefe_existe in sorted(cursor.fetchall(), key=lambda fila: fila[1]):
+            fila = {"id_cargo": id_cargo, "nombre_cargo": nombre, "fk_jefe": fk_jefe}
+            (fuera_del_arbol if jefe_existe else jefes_inexistentes).append(fila)
+
+        cursor.execute(consulta("validar_kpis_sin_indicador"))
+        kpis_sin_indicador = [
+            {"id_kpi": id_kpi, "nombre_kpi": nombre, "cargos_asignados": asignados}
+            for id_kpi, nombre, asignados in cursor.fetchall()
+        ]
+
+    nombres = {fila["id_cargo"]: fila["nombre_cargo"] for fila in fuera_del_arbol}
+    ciclos, _ = detectar_ciclos({fila["id_cargo"]: fila["fk_jefe"] for fila in fuera_del_arbol})
+
+    return {
+        "generado": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "duracion_ms": round((time.perf_counter() - inicio) * 1000, 1),
+        "totales": {
+            "cargos": total_cargos,
+            "pesos_invalidos": len(pesos_invalidos),
+            "cargos_sin_kpis": len(cargos_sin_kpis),
+            "jefes_inexistentes": len(jefes_inexistentes),
+            "ciclos": len(ciclos),
+            "cargos_fuera_del_arbol": len(fuera_del_arbol),
+            "kpis_sin_indicador": len(kpis_sin_indicador),
+        },
+        "pesos_invalidos": pesos_invalidos,
+        "cargos_sin_kpis": cargos_sin_kpis,
+        "jefes_inexistentes": jefes_inexistentes,
+        "ciclos": [
+            [{"id_cargo": id_cargo, "nombre_cargo": nombres[id_cargo]} for id_cargo in ciclo]
+            for ciclo in ciclos
+        ],
+        "cargos_fuera_del_arbol": fuera_del_arbol,
+        "kpis_sin_indicador": kpis_sin_indicador,
+    }
@@ -0,0 +1,19 @@
+"""Fixtures compartidas: cada prueba trabaja sobre una BD SQLite temporal propia."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from organigrama.bd import cerrar_conexion_bd, configurar_ruta_bd, init_database  # noqa: E402
+
+@pytest.fixture
+def bd_temporal(tmp_path):
+    """Configura una BD vacía con el esquema actual y devuelve su ruta."""
+    ruta = str(tmp_path / "prueba.db")
+    configurar_ruta_bd(lambda: ruta)
+    init_database()
+    yield ruta
+    cerrar_conexion_bd(ruta)
+    configurar_ruta_bd(None)
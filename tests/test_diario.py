@@ -0,0 +1,45 @@
+"""Deshacer acciones del diario sin borrar en cascada cambios posteriores."""
+import pytest
+
+from organigrama.bd import conectar_bd
+from organigrama.diario import aplicar_inverso_diario, insertar_con_diario, nuevo_grupo_diario
+
+def _asignar(grupo, id_cargo, id_kpi):
+    with conectar_bd() as conn:
+        insertar_con_diario(conn.cursor(), grupo, "Asignar", "CargosKpis",
+                            {"fk_cargo": id_cargo, "fk_kpi": id_kpi, "peso_kpi": 10})
+        conn.commit()
+
+@pytest.fixture
+def kpi_creado(bd_temporal):
+    """Crea un KPI asignado al cargo 1 en un grupo y lo asigna al cargo 2 en otro posterior."""
+    with conectar_bd() as conn:
+        conn.executescript("""
+        INSERT INTO Cargos (id_cargo, nombre_cargo, es_raiz) VALUES (1, 'CEO', 1);
+        INSERT INTO Cargos (id_cargo, nombre_cargo, fk_jefe) VALUES (2, 'Gerente', 1);
+        """)
+        crear = nuevo_grupo_diario()
+        id_kpi = insertar_con_diario(conn.cursor(), crear, "Crear KPI", "Kpis", {"nombre_kpi": "Tasa de conversión"})
+        conn.commit()
+    _asignar(crear, 1, id_kpi)
+    asignar = nuevo_grupo_diario()
+    _asignar(asignar, 2, id_kpi)
+    return crear, asignar, id_kpi
+
+def _asignaciones(id_kpi):
+    with conectar_bd() as conn:
+        return sorted(fila[0] for fila in conn.execute("SELECT fk_cargo FROM CargosKpis WHERE fk_kpi = ?", (id_kpi,)))
+
+def test_deshacer_crear_kpi_usado_despues_se_rechaza(kpi_creado):
+    crear, _, id_kpi = kpi_creado
+    with pytest.raises(ValueError):
+        aplicar_inverso_diario(crear, "Deshacer: Crear KPI")
+    assert _asignaciones(id_kpi) == [1, 2]
+
+def test_deshacer_en_orden_borra_el_kpi(kpi_creado):
+    crear, asignar, id_kpi = kpi_creado
+    aplicar_inverso_diario(asignar, "Deshacer: Asignar")
+    aplicar_inverso_diario(crear, "Deshacer: Crear KPI")
+    assert _asignaciones(id_kpi) == []
+    with conectar_bd() as conn:
+        assert conn.execute("SELECT 1 FROM Kpis WHERE id_kpi = ?", (id_kpi,)).fetchone() is None
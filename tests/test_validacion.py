@@ -0,0 +1,44 @@
+"""Validación de la organización sobre BD heredadas con ciclos en fk_jefe."""
+from organigrama.bd import conectar_bd, init_database
+from organigrama.validacion import validar_organizacion
+
+def _crear_ciclo_heredado():
+    """Arma A <-> B (con C bajo B) como lo dejaría una BD anterior a trg_jerarquia_ciclo."""
+    with conectar_bd() as conn:
+        conn.executescript("""
+        DROP TRIGGER trg_jerarquia_ciclo;
+        DROP TRIGGER trg_jerarquia_update;
+        INSERT INTO Cargos (id_cargo, nombre_cargo, es_raiz) VALUES (1, 'CEO', 1);
+        INSERT INTO Cargos (id_cargo, nombre_cargo, fk_jefe) VALUES (2, 'Gerente A', 1);
+        INSERT INTO Cargos (id_cargo, nombre_cargo, fk_jefe) VALUES (3, 'Gerente B', 2);
+        INSERT INTO Cargos (id_cargo, nombre_cargo, fk_jefe) VALUES (4, 'Analista C', 3);
+        UPDATE Cargos SET fk_jefe = 3 WHERE id_cargo = 2;
+        DELETE FROM CargosJerarquia;
+        """)
+        conn.commit()
+    # Al abrir la BD heredada se recrean los triggers y se reconstruye la tabla de clausura
+    init_database()
+
+def test_reporta_ciclo_heredado(bd_temporal):
+    _crear_ciclo_heredado()
+    with conectar_bd() as conn:
+        enlaces = conn.execute(
+            "SELECT ancestro, descendiente FROM CargosJerarquia WHERE descendiente IN (2, 3) ORDER BY 1, 2"
+        ).fetchall()
+    assert enlaces == [(2, 2), (3, 3)]
+
+    reporte = validar_organizacion()
+    assert reporte["totales"]["ciclos"] == 1
+    assert sorted(item["nombre_cargo"] for item in reporte["ciclos"][0]) == ["Gerente A", "Gerente B"]
+    assert {item["id_cargo"] for item in reporte["cargos_fuera_del_arbol"]} == {2, 3, 4}
+
+def test_organizacion_sin_ciclos(bd_temporal):
+    with conectar_bd() as conn:
+        conn.executescript("""
+        INSERT INTO Cargos (id_cargo, nombre_cargo, es_raiz) VALUES (1, 'CEO', 1);
+        INSERT INTO Cargos (id_cargo, nombre_cargo, fk_jefe) VALUES (2, 'Gerente A', 1);
+        """)
+        conn.commit()
+    reporte = validar_organizacion()
+    assert reporte["ciclos"] == []
+    assert reporte["cargos_fuera_del_arbol"] == []